@@ -22,10 +22,14 @@ def score_to_n_unpacked_and_n_containers_and_container_score(
 with st.sidebar:
     file = st.file_uploader("Upload File")
     allow_rotate = st.checkbox("Allow Rotate", True)
+    placement = st.selectbox("Placement", ["exact", "height_map"])
     max_iter = int(st.number_input("Max Iteration", min_value=1, value=10000))
     temparature = float(
         st.number_input("Temparature", min_value=0.0, value=0.0, step=1.0)
     )
+    max_fps = float(
+        st.number_input("Max Frames per Second", min_value=0.1, value=5.0)
+    )
 
 size = 750
 padding = 20
@@ -40,7 +44,7 @@ container_score_holder = st.empty()
 image_holder = st.empty()
 if reset and file is not None:
     request = excel_to_bin_packing_request(file)
-    solver = BinPackingSolver(request)
+    solver = BinPackingSolver(request, placement=placement)
     st.session_state["solver"] = solver
     st.session_state["image"] = solver.render(size, padding)
     (
@@ -71,13 +75,16 @@ try:
     to_json = col1.button("Response to JSON string")
     if to_json:
         with open("data/response.json", "w") as f:
-            json_str = bin_packing_to_json(
-                use_solver.request, use_solver.response, f
+            bin_packing_to_json(
+                use_solver.request,
+                use_solver.response,
+                f,
+                return_string=False,
             )
     if calculate:
         stop = col3.button("Stop")
         for score, image in use_solver.loop_render(
-            max_iter, temparature, size, padding
+            max_iter, temparature, size, padding, max_fps=max_fps
         ):
             (
                 n_unpacked,
@@ -14,10 +14,14 @@ def score_to_num_unpacked_and_top_height(score: float) -> tuple[int, float]:
 with st.sidebar:
     file = st.file_uploader("Upload File")
     allow_rotate = st.checkbox("Allow Rotate", True)
+    placement = st.selectbox("Placement", ["exact", "height_map"])
     max_iter = int(st.number_input("Max Iteration", min_value=1, value=10000))
     temparature = float(
         st.number_input("Temparature", min_value=0.0, value=0.0, step=1.0)
     )
+    max_fps = float(
+        st.number_input("Max Frames per Second", min_value=0.1, value=5.0)
+    )
 
 size = 750
 padding = 20
@@ -32,7 +36,7 @@ weight_holder = st.empty()
 image_holder = st.empty()
 if reset and file is not None:
     request = excel_to_request(file)
-    solver = StripPackingSolver(request)
+    solver = StripPackingSolver(request, placement=placement)
     st.session_state["solver"] = solver
     st.session_state["score"] = solver.opt_score
     st.session_state["image"] = solver.render(size, padding)
@@ -59,7 +63,12 @@ try:
     if calculate:
         stop = col3.button("Stop")
         for score, image in use_solver.loop_render(
-            max_iter, allow_rotate, temparature, size, padding
+            max_iter,
+            allow_rotate,
+            temparature,
+            size,
+            padding,
+            max_fps=max_fps,
         ):
             num_unpacked, top_height = score_to_num_unpacked_and_top_height(
                 st.session_state["score"]
@@ -0,0 +1,175 @@
+import itertools
+import logging
+from typing import Literal, Optional
+
+import numpy as np
+from pulp import (
+    PULP_CBC_CMD,
+    LpAffineExpression,
+    LpBinary,
+    LpInteger,
+    LpMinimize,
+    LpProblem,
+    LpSolutionIntegerFeasible,
+    LpSolutionOptimal,
+    LpVariable,
+    lpSum,
+)
+
+from src.block_table import sku_types
+from src.interface import BinPackingRequest
+from src.utils import FloatArray
+
+VOLUME_CAPACITY_RATIO = 0.7
+AREA_CAPACITY_RATIO = 1.0
+WEIGHT_CAPACITY_RATIO = 1.0
+
+GreedyStrategy = Literal["first_fit", "best_fit"]
+
+
+def __capacities(request: BinPackingRequest) -> FloatArray:
+    """Volume, weight and base area capacities, one row per container."""
+    return np.array(
+        [
+            [
+                container.volume * VOLUME_CAPACITY_RATIO,
+                container.weight_capacity * WEIGHT_CAPACITY_RATIO,
+                container.base_area * AREA_CAPACITY_RATIO,
+            ]
+            for container in request.containers
+        ],
+        np.float64,
+    ).reshape(-1, 3)
+
+
+def __demands(request: BinPackingRequest) -> FloatArray:
+    """Volume, weight and base area demands, one row per block. Only
+    unstackable blocks use base area, since nothing is put on them."""
+    return np.array(
+        [
+            [
+                block.volume,
+                block.weight,
+                0.0 if block.stackable else block.base_area,
+            ]
+            for block in request.blocks
+        ],
+        np.float64,
+    ).reshape(-1, 3)
+
+
+def greedy_assignment(
+    request: BinPackingRequest, strategy: GreedyStrategy = "first_fit"
+) -> list[int]:
+    """Container index of every block by first-fit or best-fit decreasing.
+
+    Unstackable blocks go first, then blocks by decreasing volume. Each
+    block goes to the first container (``"first_fit"``) or the container
+    with the least volume left (``"best_fit"``) among those with room for
+    it in every capacity. A block fitting nowhere goes to the container
+    with the most volume left.
+    """
+    demands = __demands(request)
+    remaining = __capacities(request)
+    order = np.lexsort((-demands[:, 0], demands[:, 2] == 0))
+    container_idxs = [0] * request.n_blocks
+    for i in order.tolist():
+        fits = np.all(remaining >= demands[i], axis=1)
+        if not fits.any():
+            j = int(np.argmax(remaining[:, 0]))
+        elif strategy == "first_fit":
+            j = int(np.argmax(fits))
+        else:
+            j = int(np.argmin(np.where(fits, remaining[:, 0], np.inf)))
+        remaining[j] -= demands[i]
+        container_idxs[i] = j
+    return container_idxs
+
+
+def milp_assignment(
+    request: BinPackingRequest,
+    time_limit: float,
+    warm_start: Optional[list[int]] = None,
+    logger: Optional[logging.Logger] = None,
+) -> Optional[list[int]]:
+    """Container index of every block minimizing the containers used.
+
+    Identical blocks are aggregated into SKU types, so the model has one
+    integer count per type and container instead of one binary per block
+    and container.
+
+    CBC stops after ``time_limit`` seconds; the best feasible assignment
+    found by then is returned, even if it is not proven optimal. Returns
+    ``None`` if no feasible assignment was found. ``warm_start`` is given
+    to CBC as the initial solution.
+    """
+    type_ids = sku_types(request.blocks)
+    type_blocks: dict[int, list[int]] = {}
+    for i, type_id in enumerate(type_ids):
+        type_blocks.setdefault(type_id, []).append(i)
+    n_types, n_containers = len(type_blocks), request.n_containers
+    all_demands = __demands(request)
+    demands = [all_demands[type_blocks[t][0]].tolist() for t in range(n_types)]
+    capacities = __capacities(request).tolist()
+    problem = LpProblem("Initialize", LpMinimize)
+    counts = {
+        (t, j): LpVariable(
+            f"count_type{t}_in_container{j}",
+            lowBound=0,
+            upBound=len(type_blocks[t]),
+            cat=LpInteger,
+        )
+        for t, j in itertools.product(range(n_types), range(n_containers))
+    }
+    use = [
+        LpVariable(f"use_container{j}", cat=LpBinary)
+        for j in range(n_containers)
+    ]
+    problem.setObjective(lpSum(use))
+    # affine expressions are built from term lists, which is much faster
+    # than summing products of variables
+    for j, capacity in enumerate(capacities):
+        for k in range(3):
+            terms = [
+                (counts[t, j], demand[k])
+                for t, demand in enumerate(demands)
+                if demand[k] > 0
+            ]
+            terms.append((use[j], -capacity[k]))
+            problem.addConstraint(LpAffineExpression(terms) <= 0)
+    for t in range(n_types):
+        problem.addConstraint(
+            LpAffineExpression(
+                [(counts[t, j], 1) for j in range(n_containers)]
+            )
+            == len(type_blocks[t])
+        )
+    if warm_start is not None:
+        for (t, j), variable in counts.items():
+            variable.setInitialValue(
+                sum(warm_start[i] == j for i in type_blocks[t])
+            )
+        for j, variable in enumerate(use):
+            variable.setInitialValue(int(j in warm_start))
+    solver = PULP_CBC_CMD(
+        timeLimit=time_limit,
+        gapRel=0.01,
+        warmStart=warm_start is not None,
+        msg=False,
+    )
+    problem.solve(solver)
+    if problem.sol_status not in (
+        LpSolutionOptimal,
+        LpSolutionIntegerFeasible,
+    ):
+        return None
+    if logger is not None and problem.sol_status != LpSolutionOptimal:
+        logger.info("MILP time limit reached, using a feasible assignment")
+    # blocks of a type are interchangeable, so they are dealt out in order
+    container_idxs = [0] * request.n_blocks
+    for t, block_idxs in type_blocks.items():
+        idxs = iter(block_idxs)
+        for j in range(n_containers):
+            for i in itertools.islice(idxs, round(counts[t, j].varValue or 0)):
+                container_idxs[i] = j
+    return container_idxs
@@ -0,0 +1,386 @@
+"""Solve a batch of request files in a process pool.
+
+    python -m src.batch "manifests/*.xlsx" --kind bin --output-dir out \\
+        --workers 8 --time-limit 60
+
+Inputs are directories (every Excel file in them) or glob patterns of
+Excel files with a block and a container sheet. Every input gets one JSON
+response in the output directory, at the path of the input relative to
+the common directory of all inputs. Responses are written to a temporary
+file and renamed, so a response is either complete or absent, and inputs
+with a valid response are skipped: a crashed run resumes where it stopped.
+A worker that dies, e.g. out of memory, only fails the input it was
+solving: the other inputs are retried in a new pool. With ``--cache``,
+requests solved before with the same parameters, in any run and in any
+block order, are answered from the result cache.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal, Optional
+
+import numpy as np
+
+from src.bin_packing_solver import BinPackingSolver
+from src.cache import ResultCache
+from src.converter import (
+    bin_packing_to_json,
+    read_bin_packing_request,
+    read_request,
+    strip_packing_to_json,
+)
+from src.interface import (
+    BinPackingRequest,
+    BinPackingResponse,
+    StripPackingRequest,
+    StripPackingResponse,
+)
+from src.logger import get_logger
+from src.placement import PlacementMode
+from src.solver import StripPackingSolver
+
+Kind = Literal["strip", "bin"]
+REQUEST_SUFFIXES = (".xlsx", ".xls")
+# inputs that were pending in this many broken pools are solved alone, so
+# an input that kills its worker does not keep failing the others
+MAX_POOL_CRASHES = 2
+
+
+@dataclass
+class JobResult:
+    path: str
+    seconds: float
+    score: Optional[float] = None
+    error: Optional[str] = None
+    # answered from the result cache, without a score
+    cached: bool = False
+
+
+def find_inputs(patterns: list[str]) -> list[Path]:
+    """Request files of directories and glob patterns, sorted and without
+    duplicates."""
+    paths: set[Path] = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(
+                path
+                for path in Path(pattern).iterdir()
+                if path.suffix.lower() in REQUEST_SUFFIXES
+            )
+        else:
+            paths.update(
+                Path(path) for path in glob.glob(pattern, recursive=True)
+            )
+    return sorted(paths)
+
+
+def input_root(paths: list[Path]) -> Path:
+    """The common directory of the inputs."""
+    if not paths:
+        return Path()
+    return Path(os.path.commonpath([path.resolve().parent for path in paths]))
+
+
+def output_path(output_dir: Path, path: Path, root: Path) -> Path:
+    """The response of an input, at the path of the input relative to
+    ``root``, so inputs with the same name in different directories do not
+    overwrite each other."""
+    relative = path.resolve().relative_to(root)
+    return output_dir / relative.with_name(f"{relative.stem}.json")
+
+
+def is_valid_output(path: Path) -> bool:
+    try:
+        with open(path) as f:
+            return isinstance(json.load(f), dict)
+    except (OSError, ValueError):
+        return False
+
+
+def __init_worker(verbose: bool) -> None:
+    # the solvers log every hundred iterations of every job
+    if not verbose:
+        logging.disable(logging.INFO)
+
+
+def solve_file(
+    path: Path,
+    output: Path,
+    kind: Kind,
+    time_limit: Optional[float],
+    max_iter: Optional[int],
+    temparature: float,
+    placement: PlacementMode,
+    seed: int,
+    cache_path: Optional[Path] = None,
+) -> JobResult:
+    """Solve one request file and write its response. Errors are returned
+    instead of raised, so one bad input does not stop the batch.
+
+    With ``cache_path``, the response is taken from the result cache in
+    that file if the request was solved with the same parameters before,
+    and stored in it otherwise.
+    """
+    start = time.time()
+    tmp = output.with_name(f"{output.name}.tmp")
+    params = {
+        "time_limit": time_limit,
+        "max_iter": max_iter,
+        "temparature": temparature,
+        "placement": placement,
+        "seed": seed,
+    }
+    # the optimal score, if the request is solved instead of cached
+    scores: list[float] = []
+
+    def solve_bin(request: BinPackingRequest) -> BinPackingResponse:
+        solver = BinPackingSolver(request, random.Random(seed), placement)
+        response = solver.solve(max_iter, temparature, time_limit=time_limit)
+        scores.append(solver.opt_score)
+        return response
+
+    def solve_strip(request: StripPackingRequest) -> StripPackingResponse:
+        solver = StripPackingSolver(request, random.Random(seed), placement)
+        response = solver.solve(
+            max_iter, True, temparature, time_limit=time_limit
+        )
+        scores.append(solver.opt_score)
+        return response
+
+    cache: Optional[ResultCache] = None
+    try:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        if cache_path is not None:
+            cache = ResultCache(cache_path)
+        with open(tmp, "w") as f:
+            if kind == "bin":
+                bin_request = read_bin_packing_request(path)
+                bin_response = (
+                    solve_bin(bin_request)
+                    if cache is None
+                    else cache.get_or_solve(bin_request, solve_bin, params)
+                )
+                bin_packing_to_json(
+                    bin_request, bin_response, f, return_string=False
+                )
+            else:
+                request = read_request(path)
+                response = (
+                    solve_strip(request)
+                    if cache is None
+                    else cache.get_or_solve(request, solve_strip, params)
+                )
+                strip_packing_to_json(request, response, f)
+        os.replace(tmp, output)
+    except Exception as e:
+        tmp.unlink(missing_ok=True)
+        return JobResult(
+            str(path), time.time() - start, error=f"{type(e).__name__}: {e}"
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+    if not scores:
+        return JobResult(str(path), time.time() - start, cached=True)
+    return JobResult(str(path), time.time() - start, scores[0])
+
+
+def __solve_alone(
+    job: tuple[Path, Path], arguments: tuple[Any, ...], verbose: bool
+) -> JobResult:
+    """Solve one input in a pool of its own, so a dying worker fails only
+    this input."""
+    path, output = job
+    start = time.time()
+    with ProcessPoolExecutor(
+        max_workers=1, initializer=__init_worker, initargs=(verbose,)
+    ) as executor:
+        try:
+            return executor.submit(
+                solve_file, path, output, *arguments
+            ).result()
+        except Exception as e:
+            return JobResult(
+                str(path),
+                time.time() - start,
+                error=f"{type(e).__name__}: {e}",
+            )
+
+
+def run_batch(
+    paths: list[Path],
+    output_dir: Path,
+    kind: Kind,
+    max_workers: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    max_iter: Optional[int] = None,
+    temparature: float = 0.0,
+    placement: PlacementMode = "exact",
+    seed: int = 0,
+    verbose: bool = False,
+    cache_path: Optional[Path] = None,
+) -> tuple[list[JobResult], int]:
+    """Solve the inputs without a valid response, through the result cache
+    in ``cache_path`` if given. Returns the results of the solved inputs
+    and the number of skipped ones."""
+    logger = get_logger("batch", sys.stderr)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    root = input_root(paths)
+    pending = [
+        (path, output_path(output_dir, path, root))
+        for path in paths
+        if not is_valid_output(output_path(output_dir, path, root))
+    ]
+    n_skipped = len(paths) - len(pending)
+    if n_skipped > 0:
+        logger.info(f"skipping {n_skipped} inputs with a response")
+    n_jobs = len(pending)
+    arguments = (
+        kind,
+        time_limit,
+        max_iter,
+        temparature,
+        placement,
+        seed,
+        cache_path,
+    )
+    results: list[JobResult] = []
+
+    def report(result: JobResult) -> None:
+        results.append(result)
+        if result.error is not None:
+            status = "failed"
+        else:
+            status = "cached" if result.cached else "solved"
+        logger.info(
+            f"[{len(results)}/{n_jobs}] {status} {result.path} "
+            f"in {result.seconds:.2f} seconds"
+        )
+
+    n_crashes = {job: 0 for job in pending}
+    alone: list[tuple[Path, Path]] = []
+    while pending:
+        crashed: list[tuple[Path, Path]] = []
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=__init_worker,
+            initargs=(verbose,),
+        ) as executor:
+            submitted = time.time()
+            futures = {
+                executor.submit(solve_file, path, output, *arguments): (
+                    path,
+                    output,
+                )
+                for path, output in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    report(future.result())
+                except BrokenProcessPool:
+                    # a worker died, e.g. out of memory, and took the pool
+                    # with it
+                    crashed.append(futures[future])
+                except Exception as e:
+                    report(
+                        JobResult(
+                            str(futures[future][0]),
+                            time.time() - submitted,
+                            error=f"{type(e).__name__}: {e}",
+                        )
+                    )
+        if crashed:
+            logger.info(f"a worker died, retrying {len(crashed)} inputs")
+        pending = []
+        for job in crashed:
+            n_crashes[job] += 1
+            if n_crashes[job] >= MAX_POOL_CRASHES:
+                alone.append(job)
+            else:
+                pending.append(job)
+    # each in a pool of its own, as many at a time as workers
+    with ThreadPoolExecutor(max_workers or os.cpu_count()) as threads:
+        for result in threads.map(
+            lambda job: __solve_alone(job, arguments, verbose), alone
+        ):
+            report(result)
+    return results, n_skipped
+
+
+def summarize(results: list[JobResult], n_skipped: int, seconds: float) -> str:
+    failures = [result for result in results if result.error is not None]
+    solve_seconds = [
+        result.seconds
+        for result in results
+        if result.error is None and not result.cached
+    ]
+    n_cached = sum(result.cached for result in results)
+    lines = [
+        f"{len(results) - len(failures)} solved ({n_cached} cached), "
+        f"{len(failures)} failed, "
+        f"{n_skipped} skipped in {seconds:.2f} seconds "
+        f"({len(results) / max(seconds, 1e-9):.2f} jobs/sec)"
+    ]
+    if solve_seconds:
+        p50, p95 = np.percentile(solve_seconds, [50, 95]).tolist()
+        lines.append(f"solve time: p50 {p50:.2f} s, p95 {p95:.2f} s")
+    lines.extend(
+        f"failed: {result.path}: {result.error}" for result in failures
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("inputs", nargs="+", help="directories or globs")
+    parser.add_argument("--kind", choices=["strip", "bin"], default="bin")
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--workers", type=int, help="default: CPU count")
+    parser.add_argument(
+        "--time-limit", type=float, help="seconds of annealing per job"
+    )
+    parser.add_argument("--max-iter", type=int)
+    parser.add_argument("--temparature", type=float, default=0.0)
+    parser.add_argument(
+        "--placement", choices=["exact", "height_map"], default="exact"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--cache", type=Path, help="SQLite file of the result cache"
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if args.time_limit is None and args.max_iter is None:
+        parser.error("one of --time-limit and --max-iter is required")
+
+    start = time.time()
+    results, n_skipped = run_batch(
+        find_inputs(args.inputs),
+        args.output_dir,
+        args.kind,
+        args.workers,
+        args.time_limit,
+        args.max_iter,
+        args.temparature,
+        args.placement,
+        args.seed,
+        args.verbose,
+        args.cache,
+    )
+    print(summarize(results, n_skipped, time.time() - start))
+    if any(result.error is not None for result in results):
+        sys.exit(1)
@@ -0,0 +1,374 @@
+"""Benchmarks of the placement kernel and the annealing solvers.
+
+Every case is a request generated at a fixed seed. A case reports the
+throughput of the placement kernel (blocks placed per second when the
+whole order is placed from scratch), the annealing iterations and
+placements per second, and the best score reached at fixed time
+checkpoints. Bin packing scores are split into the unstacked blocks, the
+used containers and the score of the packings, since the penalties of
+the first two dwarf the last. Results are written as JSON, and compared
+against a stored baseline to catch performance and quality regressions:
+
+    python -m src.benchmark --output baseline.json
+    python -m src.benchmark --baseline baseline.json --tolerance 0.2
+
+The comparison, printed to stderr, exits with status 1 if a throughput
+dropped or a score rose by more than the tolerance, or if more blocks
+were unstacked or more containers used than ``--count-tolerance`` allows.
+Scores of packings are only compared when both counts match.
+"""
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Literal, Union
+
+import numpy as np
+
+from src import kernel
+from src.assignment import greedy_assignment
+from src.bin_packing_solver import BinPackingSolver, split_score
+from src.data_generator import (
+    generate_bin_packing_request,
+    generate_strip_packing_request,
+)
+from src.interface import INF, BinPackingRequest, StripPackingRequest
+from src.placement import PlacementMode, new_placement_state
+from src.solver import StripPackingSolver
+
+BLOCK_SIZE = 10
+UNSTACKABLE_RATIO = 0.2
+# total container volume per block volume of bin packing cases
+CONTAINER_VOLUME_RATIO = 1.5
+
+CHECKPOINTS = (0.5, 1.0, 2.0, 5.0)
+QUICK_CHECKPOINTS = (0.25, 0.5, 1.0)
+KERNEL_TIME = 1.0
+TOLERANCE = 0.2
+COUNT_TOLERANCE = 0
+
+Kind = Literal["strip", "bin"]
+
+
+@dataclass(frozen=True)
+class BenchmarkCase:
+    kind: Kind
+    n_blocks: int
+    n_containers: int
+    # exact placement is quadratic in the blocks, large cases use height maps
+    placement: PlacementMode
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        return (
+            f"{self.kind}-{self.n_blocks}-blocks-{self.n_containers}-"
+            f"containers-{self.placement}"
+        )
+
+
+CASES = [
+    BenchmarkCase("strip", 10, 1, "exact"),
+    BenchmarkCase("strip", 100, 1, "exact"),
+    BenchmarkCase("strip", 500, 1, "height_map"),
+    BenchmarkCase("strip", 2000, 1, "height_map"),
+    BenchmarkCase("bin", 10, 1, "exact"),
+    BenchmarkCase("bin", 100, 5, "exact"),
+    BenchmarkCase("bin", 500, 20, "height_map"),
+    BenchmarkCase("bin", 2000, 50, "height_map"),
+]
+QUICK_CASES = [case for case in CASES if case.n_blocks <= 100]
+
+# metrics where a higher value is better, lower is better for the others
+HIGHER_IS_BETTER = (
+    "kernel_placements_per_sec",
+    "iterations_per_sec",
+    "placements_per_sec",
+)
+# counts of penalized blocks and containers, compared by absolute change
+COUNT_METRICS = ("unstacked_at_", "containers_at_")
+
+
+def generate_request(
+    case: BenchmarkCase,
+) -> Union[StripPackingRequest, BinPackingRequest]:
+    """The request of the case, with containers scaled to its blocks."""
+    n_unstackables = int(case.n_blocks * UNSTACKABLE_RATIO)
+    n_stackables = case.n_blocks - n_unstackables
+    if case.kind == "strip":
+        # room on the floor for every unstackable block, and a height that
+        # is never reached
+        width = BLOCK_SIZE * max(2, math.ceil(math.sqrt(case.n_blocks / 2)))
+        height = 2 * BLOCK_SIZE * case.n_blocks
+        return generate_strip_packing_request(
+            BLOCK_SIZE,
+            n_stackables,
+            n_unstackables,
+            (width, width, height),
+            case.seed,
+        )
+    # containers are about 2 x 1 x 1 times the container size
+    container_size = BLOCK_SIZE * (
+        CONTAINER_VOLUME_RATIO * case.n_blocks / (2 * case.n_containers)
+    ) ** (1 / 3)
+    return generate_bin_packing_request(
+        BLOCK_SIZE,
+        container_size,
+        n_stackables,
+        n_unstackables,
+        case.n_containers,
+        case.seed,
+    )
+
+
+def bench_kernel(
+    case: BenchmarkCase,
+    request: Union[StripPackingRequest, BinPackingRequest],
+    duration: float,
+) -> float:
+    """Blocks placed per second when orders are placed from scratch.
+
+    Strip packing places all blocks in one container, bin packing places
+    the blocks of the greedy assignment in their containers.
+    """
+    if isinstance(request, StripPackingRequest):
+        groups = [(request.container_shape, list(range(request.n_blocks)))]
+        has_ceiling = False
+    else:
+        container_idxs = greedy_assignment(request)
+        groups = [
+            (
+                container.shape,
+                [i for i, j in enumerate(container_idxs) if j == idx],
+            )
+            for idx, container in enumerate(request.containers)
+        ]
+        has_ceiling = True
+    orders = [
+        (
+            shape,
+            np.array(
+                [request.blocks[i].shape for i in block_idxs], np.float64
+            ).reshape(-1, 3),
+            np.array(
+                [request.blocks[i].stackable for i in block_idxs], np.bool_
+            ),
+        )
+        for shape, block_idxs in groups
+        if len(block_idxs) > 0
+    ]
+    states = [
+        new_placement_state(
+            case.placement,
+            shape,
+            len(shapes),
+            score_axis=2,
+            unstacked_penalty=INF,
+            has_ceiling=has_ceiling,
+        )
+        for shape, shapes, _ in orders
+    ]
+    n_placements = 0
+    start = time.perf_counter()
+    while True:
+        for state, (_, shapes, stackable) in zip(states, orders):
+            state.replay(0, shapes, stackable)
+            n_placements += len(shapes)
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return n_placements / elapsed
+
+
+def bench_annealing(
+    case: BenchmarkCase,
+    request: Union[StripPackingRequest, BinPackingRequest],
+    checkpoints: tuple[float, ...],
+    temparature: float,
+) -> dict[str, Any]:
+    """Anneal until the last checkpoint and record the best score at every
+    checkpoint, together with the iteration and placement throughput."""
+    rng = random.Random(case.seed)
+    start = time.perf_counter()
+    solver: Union[StripPackingSolver, BinPackingSolver]
+    if isinstance(request, StripPackingRequest):
+        solver = StripPackingSolver(request, rng, placement=case.placement)
+    else:
+        solver = BinPackingSolver(request, rng, placement=case.placement)
+    init_seconds = time.perf_counter() - start
+    best_score = solver.opt_score
+    scores: dict[str, float] = {}
+    n_iter = 0
+    start = time.perf_counter()
+    for checkpoint in checkpoints:
+        while time.perf_counter() - start < checkpoint:
+            if isinstance(solver, StripPackingSolver):
+                solver.transit(True, temparature)
+                best_score = min(best_score, solver.score)
+            else:
+                solver.transit(temparature)
+                best_score = min(best_score, solver.total_score)
+            n_iter += 1
+        if isinstance(solver, StripPackingSolver):
+            scores[f"score_at_{checkpoint:g}s"] = best_score
+        else:
+            n_unstacked, n_containers, score = split_score(best_score)
+            scores[f"unstacked_at_{checkpoint:g}s"] = n_unstacked
+            scores[f"containers_at_{checkpoint:g}s"] = n_containers
+            scores[f"score_at_{checkpoint:g}s"] = score
+    elapsed = time.perf_counter() - start
+    return {
+        "init_seconds": init_seconds,
+        "iterations_per_sec": n_iter / elapsed,
+        "placements_per_sec": solver.n_placements / elapsed,
+        **scores,
+    }
+
+
+def run(
+    cases: list[BenchmarkCase],
+    checkpoints: tuple[float, ...] = CHECKPOINTS,
+    kernel_time: float = KERNEL_TIME,
+    temparature: float = 0.0,
+) -> dict[str, Any]:
+    results = []
+    for case in cases:
+        print(f"running {case.name} ...", file=sys.stderr, flush=True)
+        request = generate_request(case)
+        metrics = {
+            "kernel_placements_per_sec": bench_kernel(
+                case, request, kernel_time
+            ),
+            **bench_annealing(case, request, checkpoints, temparature),
+        }
+        results.append({"case": asdict(case), "metrics": metrics})
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "numba": kernel.USE_NUMBA,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "checkpoints": list(checkpoints),
+        "temparature": temparature,
+        "results": results,
+    }
+
+
+def __compare_metric(
+    metric: str,
+    value: float,
+    metrics: dict[str, Any],
+    baseline: dict[str, Any],
+    tolerance: float,
+    count_tolerance: int,
+) -> tuple[str, bool]:
+    """The comparison line of a metric and whether it regressed."""
+    base = baseline[metric]
+    if metric.startswith(COUNT_METRICS):
+        regressed = value - base > count_tolerance
+        text = f"{base:g} -> {value:g} ({value - base:+g})"
+    elif metric.startswith("score_at_") and any(
+        metrics.get(prefix + metric[len("score_at_") :])
+        != baseline.get(prefix + metric[len("score_at_") :])
+        for prefix in COUNT_METRICS
+    ):
+        # packings of other blocks or containers are not comparable
+        return f"{base:.6g} -> {value:.6g} (counts differ)", False
+    else:
+        change = (value - base) / abs(base) if base != 0 else 0.0
+        if metric in HIGHER_IS_BETTER:
+            regressed = change < -tolerance
+        else:
+            regressed = change > tolerance
+        text = f"{base:.6g} -> {value:.6g} ({100 * change:+.1f}%)"
+    return text + ("  REGRESSION" if regressed else ""), regressed
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    tolerance: float,
+    count_tolerance: int = COUNT_TOLERANCE,
+) -> list[str]:
+    """Print the change of every metric against the baseline to stderr
+    and return the regressions. Relative changes beyond ``tolerance`` and
+    counts rising by more than ``count_tolerance`` are regressions."""
+    baseline_metrics = {
+        BenchmarkCase(**result["case"]).name: result["metrics"]
+        for result in baseline["results"]
+    }
+    regressions = []
+    for result in results["results"]:
+        name = BenchmarkCase(**result["case"]).name
+        if name not in baseline_metrics:
+            print(f"{name}: not in baseline", file=sys.stderr)
+            continue
+        print(name, file=sys.stderr)
+        metrics = result["metrics"]
+        for metric, value in metrics.items():
+            if metric not in baseline_metrics[name]:
+                continue
+            text, regressed = __compare_metric(
+                metric,
+                value,
+                metrics,
+                baseline_metrics[name],
+                tolerance,
+                count_tolerance,
+            )
+            print(f"  {metric}: {text}", file=sys.stderr)
+            if regressed:
+                regressions.append(f"{name} {metric}")
+    return regressions
+
+
+if __name__ == "__main__":
+    import logging
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--quick", action="store_true", help="small cases")
+    parser.add_argument("--output", help="JSON file of the results")
+    parser.add_argument("--baseline", help="JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument(
+        "--count-tolerance",
+        type=int,
+        default=COUNT_TOLERANCE,
+        help="unstacked blocks or used containers more than the baseline",
+    )
+    parser.add_argument("--kernel-time", type=float, default=KERNEL_TIME)
+    parser.add_argument("--temparature", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # the solvers log every hundred iterations
+    logging.disable(logging.INFO)
+    results = run(
+        QUICK_CASES if args.quick else CASES,
+        QUICK_CHECKPOINTS if args.quick else CHECKPOINTS,
+        args.kernel_time,
+        args.temparature,
+    )
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(
+            results, baseline, args.tolerance, args.count_tolerance
+        )
+        if regressions:
+            print(
+                f"{len(regressions)} regressions: {', '.join(regressions)}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
@@ -3,21 +3,19 @@ import math
 import random
 import sys
 import time
-from typing import Iterator
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Iterator, Optional, TypeAlias
 
 import numpy as np
-from pulp import (
-    PULP_CBC_CMD,
-    LpBinary,
-    LpMinimize,
-    LpProblem,
-    LpStatusOptimal,
-    LpVariable,
-    lpSum,
-)
 
+from src.assignment import greedy_assignment, milp_assignment
+from src.block_table import BlockTable, Snapshot
+from src.frames import loop_frames
+from src.instrumentation import JsonLinesSink, SolverStats
 from src.interface import (
     INF,
+    Acceptance,
     BinPackingRequest,
     BinPackingResponse,
     Block,
@@ -26,253 +24,452 @@ from src.interface import (
     Image,
 )
 from src.logger import get_logger
-from src.utils import calc_container_score_and_corner
+from src.operators import OperatorSelector
+from src.placement import PlacementMode, PlacementState, new_placement_state
+from src.transposition import TranspositionTable
+from src.utils import IntArray
 from src.visualizer import Visulalizer
 
-VOLUME_CAPACITY_RATIO = 0.7
-AREA_CAPACITY_RATIO = 1.0
-WEIGHT_CAPACITY_RATIO = 1.0
 BIG_NUMBER = 1e9
-WALLS = [
-    Block(
-        "wall1", (3 * INF, 3 * INF, 3 * INF), 0.0, (0, 0, 0), stackable=True
-    ),
-    Block(
-        "wall2", (3 * INF, 3 * INF, 3 * INF), 0.0, (0, 0, 0), stackable=True
-    ),
-    Block(
-        "wall3", (3 * INF, 3 * INF, 3 * INF), 0.0, (0, 0, 0), stackable=True
-    ),
-    Block(
-        "wall4", (3 * INF, 3 * INF, 3 * INF), 0.0, (0, 0, 0), stackable=True
-    ),
-    Block(
-        "wall5", (3 * INF, 3 * INF, 3 * INF), 0.0, (0, 0, 0), stackable=True
-    ),
-    Block(
-        "wall6", (3 * INF, 3 * INF, 3 * INF), 0.0, (0, 0, 0), stackable=True
-    ),
-]
-N_WALLS = len(WALLS)
 CONTAINER_USED_PENALTY = 1e5
 BLOCK_UNSTACKED_PENALTY = 1e10
 
 
+def split_score(score: float) -> tuple[int, int, float]:
+    """The unstacked blocks, the used containers and the score of the
+    packings in the containers, whose sum with the penalties is
+    ``score``."""
+    n_unstacked = int(score // BLOCK_UNSTACKED_PENALTY)
+    score -= BLOCK_UNSTACKED_PENALTY * n_unstacked
+    n_containers = int(score // CONTAINER_USED_PENALTY)
+    return (
+        n_unstacked,
+        n_containers,
+        score - CONTAINER_USED_PENALTY * n_containers,
+    )
+
+
+# what a container shows: its blocks in packing order, their orientations
+# and their corners
+ContainerKey: TypeAlias = tuple[tuple[int, ...], bytes, bytes]
+
+# ("swap", container index, position, position, 0),
+# ("rotate", container index, block index, axis, 0) or
+# ("shift", container index, position, container index, position)
+Move: TypeAlias = tuple[str, int, int, int, int]
+
+
+@dataclass(frozen=True)
+class BinPackingSnapshot(Snapshot):
+    # -1 for blocks not assigned to any container
+    container_indexes: IntArray
+
+
 class BinPackingSolver:
     def __init__(
         self,
         request: BinPackingRequest,
-        rng: random.Random = random.Random(),
+        rng: Optional[random.Random] = None,
+        placement: PlacementMode = "exact",
+        assignment: Optional[list[list[int]]] = None,
+        milp_time_limit: Optional[float] = None,
+        adaptive_operators: bool = True,
+        memo_size: int = 1 << 16,
+        metrics_sink: Optional[JsonLinesSink] = None,
     ) -> None:
         self.request = request
-        self.rng = rng
+        # a fresh stream per solver unless one is given
+        self.rng = rng if rng is not None else random.Random()
+        self.placement = placement
+        # seconds of MILP refinement of the greedy initial assignment
+        self.milp_time_limit = milp_time_limit
+        self.operators = OperatorSelector(
+            ["swap", "rotate", "shift"], adaptive_operators
+        )
+        self.__stats = SolverStats(self.operators.stats)
+        # periodic snapshots of the stats while solving, if given
+        self.metrics_sink = metrics_sink
+        # blocks placed in all evaluations, the cost of the operators
+        self.n_placements = 0
+        # corners of placed order prefixes, at most ``memo_size`` in total
+        # split evenly over the containers, disabled with a size of 0
+        self.memo_size = memo_size
         self.logger = get_logger(self.__class__.__name__, sys.stdout)
-        self.initialize()
+        self.initialize(assignment)
         self.visualizers = [
             Visulalizer(container.shape)
             for container in self.request.containers
         ]
+        # the image of the last render, reused by the next one, with its
+        # size and padding and what each container in it shows
+        self.__frame: Optional[Image] = None
+        self.__frame_size = (0, 0)
+        self.__frame_keys: list[Optional[ContainerKey]] = []
         self.temparature = 0.0
+        self.opt_score = self.total_score
+        self.opt_snapshot = self.__snapshot()
+        self.__materialized = (
+            self.opt_snapshot,
+            self.__materialize(self.opt_snapshot),
+        )
+
+    @property
+    def blocks(self) -> list[Block]:
+        """Copies of the blocks in their current orientations."""
+        return self.table.materialize()
 
     @property
     def response(self) -> BinPackingResponse:
-        container_indexes: list[int] = [-1] * self.request.n_blocks
-        corners: list[Corner] = [(INF, INF, INF)] * self.request.n_blocks
-        for container_idx, block_idxs, _corners in zip(
-            range(self.request.n_containers),
-            self.assigned_block_idxs,
-            self.assigned_corners,
+        return self.__materialize(self.__snapshot())
+
+    def __snapshot(self) -> BinPackingSnapshot:
+        container_indexes = np.full(self.request.n_blocks, -1, np.int64)
+        corners = np.full((self.request.n_blocks, 3), INF, np.float64)
+        for container_idx, (block_idxs, state) in enumerate(
+            zip(self.assigned_block_idxs, self.states)
         ):
-            for block_idx, corner in zip(block_idxs, _corners):
-                container_indexes[block_idx] = container_idx
-                corners[block_idx] = corner
-        return BinPackingResponse(self.blocks, corners, container_indexes)
-
-    def initialize(self) -> None:
-        self.blocks = [block.copy() for block in self.request.blocks]
-        self.assigned_block_idxs = self.initial_assignment()
-        self.assigned_corners: list[list[Corner]] = []
+            container_indexes[block_idxs] = container_idx
+            corners[block_idxs] = state.corner_array
+        return BinPackingSnapshot(
+            self.total_score,
+            self.table.orientations.copy(),
+            corners,
+            container_indexes,
+        )
+
+    def __materialize(
+        self, snapshot: BinPackingSnapshot
+    ) -> BinPackingResponse:
+        return BinPackingResponse(
+            self.table.materialize(snapshot.orientations),
+            [
+                (back, left, bottom)
+                for back, left, bottom in snapshot.corners.tolist()
+            ],
+            snapshot.container_indexes.tolist(),
+        )
+
+    def update_opt(self) -> None:
+        """Keep the current solution if it is the best so far. Done by
+        ``solve`` and ``loop_render``, and needed after moves made with
+        ``assign``, ``transit_container`` or ``transit_shift``."""
+        if self.total_score < self.opt_score:
+            self.opt_score = self.total_score
+            # replaced as a whole, so readers on other threads never see a
+            # partially updated solution
+            self.opt_snapshot = self.__snapshot()
+
+    def best_response(self) -> BinPackingResponse:
+        """The best solution so far. Safe to call while solving.
+
+        Blocks are only materialized when the best solution has changed
+        since the last call.
+        """
+        snapshot = self.opt_snapshot
+        materialized_snapshot, response = self.__materialized
+        if materialized_snapshot is not snapshot:
+            response = self.__materialize(snapshot)
+            self.__materialized = (snapshot, response)
+        return response
+
+    def initialize(self, assignment: Optional[list[list[int]]] = None) -> None:
+        """Place the blocks of the given assignment, or of the initial
+        assignment if omitted."""
+        self.table = BlockTable(self.request.blocks)
+        if assignment is None:
+            self.assigned_block_idxs = self.initial_assignment()
+        else:
+            self.assigned_block_idxs = [
+                block_idxs.copy() for block_idxs in assignment
+            ]
+        # one budget for the solver, not per container, so the memory
+        # does not grow with the containers
+        container_memo_size = self.memo_size // max(
+            self.request.n_containers, 1
+        )
+        self.memos = [
+            (
+                TranspositionTable(container_memo_size)
+                if container_memo_size > 0
+                else None
+            )
+            for _ in self.request.containers
+        ]
+        self.states = [
+            self.__init_state(container, memo)
+            for container, memo in zip(self.request.containers, self.memos)
+        ]
+        self.trials = [
+            self.__init_state(container, memo)
+            for container, memo in zip(self.request.containers, self.memos)
+        ]
+        self.best_trials = [
+            self.__init_state(container, memo)
+            for container, memo in zip(self.request.containers, self.memos)
+        ]
         self.assigned_scores: list[float] = []
         self.total_score = 0.0
         n_containers = 0
-        for container, block_idxs in zip(
-            self.request.containers, self.assigned_block_idxs
-        ):
+        for container_idx, block_idxs in enumerate(self.assigned_block_idxs):
             if len(block_idxs) > 0:
                 n_containers += 1
-            score, corners = self.__calc_score_and_corners(
-                container, block_idxs
-            )
+            score = self.__calc_score_and_corners(container_idx, block_idxs)
+            self.__accept(container_idx)
             self.total_score += score
-            self.assigned_corners.append(corners)
             self.assigned_scores.append(score)
         self.total_score += CONTAINER_USED_PENALTY * n_containers
 
     def render(self, size: int, padding: int) -> Image:
-        images: list[Image] = []
-        for visualizer, block_idxs, corners in zip(
-            self.visualizers, self.assigned_block_idxs, self.assigned_corners
-        ):
-            blocks = [self.blocks[idx] for idx in block_idxs]
-            image = visualizer.render(blocks, corners, size, padding)
-            images.append(image)
-        return np.concatenate(images)
+        """Render the current solution, container by container.
+
+        Only the containers whose blocks, order or orientations changed
+        since the last call are drawn again. The returned image is reused
+        by the next call, so copy it to keep it.
+        """
+        with self.__stats.timer("render"):
+            shapes = [
+                visualizer.image_shape(size, padding)
+                for visualizer in self.visualizers
+            ]
+            if self.__frame is None or self.__frame_size != (size, padding):
+                height = sum(shape[0] for shape in shapes)
+                self.__frame = np.empty((height, *shapes[0][1:]), np.uint8)
+                self.__frame_size = (size, padding)
+                self.__frame_keys = [None] * self.request.n_containers
+            all_blocks: Optional[list[Block]] = None
+            top = 0
+            for container_idx, visualizer in enumerate(self.visualizers):
+                block_idxs = self.assigned_block_idxs[container_idx]
+                state = self.states[container_idx]
+                height = shapes[container_idx][0]
+                key = (
+                    tuple(block_idxs),
+                    self.table.orientations[block_idxs].tobytes(),
+                    state.corner_array.tobytes(),
+                )
+                if self.__frame_keys[container_idx] != key:
+                    if all_blocks is None:
+                        all_blocks = self.blocks
+                    visualizer.render(
+                        [all_blocks[idx] for idx in block_idxs],
+                        state.corners,
+                        size,
+                        padding,
+                        self.__frame[top : top + height],
+                    )
+                    self.__frame_keys[container_idx] = key
+                top += height
+            return self.__frame
+
+    def render_snapshot(
+        self, snapshot: BinPackingSnapshot, size: int, padding: int
+    ) -> Image:
+        """Render a solution, container by container. Safe to call from
+        other threads, since snapshots are never modified."""
+        with self.__stats.timer("render"):
+            response = self.__materialize(snapshot)
+            images: list[Image] = []
+            for container_idx, visualizer in enumerate(self.visualizers):
+                idxs = np.flatnonzero(
+                    snapshot.container_indexes == container_idx
+                ).tolist()
+                image = visualizer.render(
+                    [response.blocks[idx] for idx in idxs],
+                    [response.corners[idx] for idx in idxs],
+                    size,
+                    padding,
+                )
+                images.append(image)
+            return np.concatenate(images)
+
+    def __init_state(
+        self, container: Container, memo: Optional[TranspositionTable]
+    ) -> PlacementState:
+        return new_placement_state(
+            self.placement,
+            container.shape,
+            self.request.n_blocks,
+            score_axis=0,
+            unstacked_penalty=BLOCK_UNSTACKED_PENALTY,
+            has_ceiling=True,
+            memo=memo,
+        )
+
+    @property
+    def stats(self) -> SolverStats:
+        """Timers and counters, up to date."""
+        self.__stats.n_placements = self.n_placements
+        self.__stats.memo_hits, self.__stats.memo_misses = self.memo_stats
+        self.__stats.opt_score = self.opt_score
+        return self.__stats
+
+    @property
+    def memo_stats(self) -> tuple[int, int]:
+        """Hits and misses of the memo tables of all containers."""
+        memos = [memo for memo in self.memos if memo is not None]
+        return (
+            sum(memo.n_hits for memo in memos),
+            sum(memo.n_misses for memo in memos),
+        )
+
+    @property
+    def assigned_corners(self) -> list[list[Corner]]:
+        return [state.corners for state in self.states]
 
     def __calc_score_and_corners(
-        self, container: Container, block_idxs: list[int]
-    ) -> tuple[float, list[Corner]]:
-        wall_and_blocks = WALLS.copy()
-        container_depth, container_width, container_height = container.shape
-        _corners: list[Corner] = [
-            (-3 * INF, -INF, -INF),
-            (-INF, -3 * INF, -INF),
-            (-INF, -INF, -3 * INF),
-            (container_depth, -INF, -INF),
-            (-INF, container_width, -INF),
-            (-INF, -INF, container_height),
-        ]
-        max_score = 0.0
-        n_unstacked = 0
-        for idx in block_idxs:
-            block = self.blocks[idx]
-            container_score, corner = calc_container_score_and_corner(
-                block, wall_and_blocks, _corners, N_WALLS - 1
-            )
-            if container_score >= INF:
-                n_unstacked += 1
-            else:
-                max_score = max(max_score, container_score)
-            wall_and_blocks.append(block)
-            _corners.append(corner)
-        score = max_score + BLOCK_UNSTACKED_PENALTY * n_unstacked
-        corners = _corners[N_WALLS:]
-        return score, corners
+        self,
+        container_idx: int,
+        block_idxs: list[int],
+        start: int = 0,
+        cutoff: float = math.inf,
+    ) -> float:
+        """Replay the container from position ``start`` into its trial
+        state, reusing the cached placements before it.
 
-    def initial_assignment(self) -> list[list[int]]:
-        problem = LpProblem("Initialize", LpMinimize)
-        assignment = {
-            (i, j): LpVariable(
-                f"assign_block{i}_to_container{j}", cat=LpBinary
-            )
-            for i, j in itertools.product(
-                range(self.request.n_blocks), range(self.request.n_containers)
+        Returns ``math.inf`` as soon as the score is known to exceed
+        ``cutoff``.
+        """
+        idxs = block_idxs[start:]
+        trial = self.trials[container_idx]
+        with self.__stats.timer("placement"):
+            placed = trial.replay(
+                start,
+                self.table.current_shapes(idxs),
+                self.table.stackable[idxs],
+                self.states[container_idx],
+                cutoff,
+                self.table.current_tokens(idxs),
             )
-        }
-        use = [
-            LpVariable(f"use_container{i}", cat=LpBinary)
-            for i in range(self.request.n_containers)
+        self.n_placements += trial.n_placed - start
+        if not placed:
+            return math.inf
+        return trial.score
+
+    def __calc_diff(
+        self, touched: list[tuple[int, int]], allowance: float = math.inf
+    ) -> tuple[float, dict[int, float]]:
+        """Replay the touched ``(container index, start)`` pairs and return
+        the total score difference with the new container scores.
+
+        Returns ``math.inf`` as soon as the difference is known to exceed
+        ``allowance``. The unchanged prefix of a container not replayed yet
+        bounds its score from below.
+        """
+        lower_bounds = [
+            self.states[container_idx].prefix_score(start)
+            - self.assigned_scores[container_idx]
+            for container_idx, start in touched
         ]
-        problem.setObjective(lpSum(use))
-        for j in range(self.request.n_containers):
-            problem.addConstraint(
-                lpSum(
-                    assignment[i, j] * self.request.blocks[i].volume
-                    for i in range(self.request.n_blocks)
-                )
-                <= use[j]
-                * self.request.containers[j].volume
-                * VOLUME_CAPACITY_RATIO
-            )
-            problem.addConstraint(
-                lpSum(
-                    assignment[i, j] * self.request.blocks[i].weight
-                    for i in range(self.request.n_blocks)
-                )
-                <= use[j]
-                * self.request.containers[j].weight_capacity
-                * WEIGHT_CAPACITY_RATIO
+        diff = 0.0
+        scores: dict[int, float] = {}
+        for n, (container_idx, start) in enumerate(touched):
+            cutoff = (
+                self.assigned_scores[container_idx]
+                + allowance
+                - diff
+                - sum(lower_bounds[n + 1 :])
             )
-            problem.addConstraint(
-                lpSum(
-                    assignment[i, j] * self.request.blocks[i].base_area
-                    for i in range(self.request.n_blocks)
-                    if not self.request.blocks[i].stackable
-                )
-                <= use[j]
-                * self.request.containers[j].base_area
-                * AREA_CAPACITY_RATIO
+            score = self.__calc_score_and_corners(
+                container_idx,
+                self.assigned_block_idxs[container_idx],
+                start,
+                cutoff,
             )
-        for i in range(self.request.n_blocks):
-            problem.addConstraint(
-                lpSum(
-                    assignment[i, j] for j in range(self.request.n_containers)
+            if math.isinf(score):
+                return math.inf, scores
+            scores[container_idx] = score
+            diff += score - self.assigned_scores[container_idx]
+        return diff, scores
+
+    def __accept_scores(self, scores: dict[int, float], diff: float) -> None:
+        for container_idx, score in scores.items():
+            self.__accept(container_idx)
+            self.assigned_scores[container_idx] = score
+        self.total_score += diff
+
+    def __accept(self, container_idx: int) -> None:
+        self.states[container_idx], self.trials[container_idx] = (
+            self.trials[container_idx],
+            self.states[container_idx],
+        )
+
+    def initial_assignment(self) -> list[list[int]]:
+        """Greedy first-fit decreasing assignment, refined by the MILP when
+        ``milp_time_limit`` is set."""
+        container_idxs = greedy_assignment(self.request)
+        if self.milp_time_limit is not None:
+            with self.__stats.timer("milp"):
+                refined = milp_assignment(
+                    self.request,
+                    self.milp_time_limit,
+                    warm_start=container_idxs,
+                    logger=self.logger,
                 )
-                == 1
-            )
-        solver = PULP_CBC_CMD(timeLimit=30, gapRel=0.01)
-        status = problem.solve(solver)
-        if status != LpStatusOptimal:
-            raise NotImplementedError
-        assigned_blocks = [
-            sorted(
-                [
-                    i
-                    for i in range(self.request.n_blocks)
-                    if assignment[i, j].varValue == 1
-                ],
-                key=lambda i: self.request.blocks[i].volume
-                + BIG_NUMBER * (not self.request.blocks[i].stackable),
-            )
-            for j in range(self.request.n_containers)
+            if refined is not None and len(set(refined)) <= len(
+                set(container_idxs)
+            ):
+                container_idxs = refined
+        assigned_blocks: list[list[int]] = [
+            [] for _ in range(self.request.n_containers)
         ]
+        for i in sorted(
+            range(self.request.n_blocks),
+            key=lambda i: self.request.blocks[i].volume
+            + BIG_NUMBER * (not self.request.blocks[i].stackable),
+        ):
+            assigned_blocks[container_idxs[i]].append(i)
         return assigned_blocks
 
-    def __rotate(self, temparature: float) -> bool:
-        container_idx = self.rng.choice(
-            [
-                idx
-                for idx in range(self.request.n_containers)
-                if len(self.assigned_block_idxs[idx]) > 0
-            ]
-        )
-        container = self.request.containers[container_idx]
+    def __choice_container(self) -> int:
+        return self.rng.choice(self.__used_containers())
+
+    def __rotate(
+        self, temparature: float, container_idx: Optional[int] = None
+    ) -> bool:
+        if container_idx is None:
+            container_idx = self.__choice_container()
         block_idxs = self.assigned_block_idxs[container_idx]
         block_idx = self.rng.choice(block_idxs)
-        axis = self.blocks[block_idx].choice_rotate_axis(self.rng)
-        self.blocks[block_idx].rotate(axis)
-        score, corners = self.__calc_score_and_corners(container, block_idxs)
-        diff = score - self.assigned_scores[container_idx]
-        if math.log(self.rng.random()) * temparature <= -diff:
-            self.assigned_corners[container_idx] = corners
-            self.assigned_scores[container_idx] = score
-            self.total_score += diff
+        axis = self.table.choice_rotate_axis(block_idx, self.rng)
+        if axis is None:
+            return False
+        self.table.rotate(block_idx, axis)
+        log_rnd = math.log(self.rng.random())
+        diff, scores = self.__calc_diff(
+            [(container_idx, block_idxs.index(block_idx))],
+            -log_rnd * temparature,
+        )
+        if log_rnd * temparature <= -diff:
+            self.__accept_scores(scores, diff)
             return True
-        self.blocks[block_idx].rotate(axis)
+        self.table.rotate(block_idx, axis)
         return False
 
-    def __swap(self, temparature: float) -> bool:
-        container_idx = self.rng.choice(
-            [
-                idx
-                for idx in range(self.request.n_containers)
-                if len(self.assigned_block_idxs[idx]) > 0
-            ]
-        )
+    def __swap(
+        self, temparature: float, container_idx: Optional[int] = None
+    ) -> bool:
+        if container_idx is None:
+            container_idx = self.__choice_container()
         block_idxs = self.assigned_block_idxs[container_idx]
-        idx1, idx2 = self.rng.choices(range(len(block_idxs)), k=2)
+        positions = self.table.choice_swap(block_idxs, self.rng)
+        if positions is None:
+            return False
+        idx1, idx2 = positions
         block_idxs[idx1], block_idxs[idx2] = block_idxs[idx2], block_idxs[idx1]
-        container = self.request.containers[container_idx]
-        score, corners = self.__calc_score_and_corners(container, block_idxs)
-        diff = score - self.assigned_scores[container_idx]
-        if math.log(self.rng.random()) * temparature <= -diff:
-            self.assigned_corners[container_idx] = corners
-            self.assigned_scores[container_idx] = score
-            self.total_score += diff
+        log_rnd = math.log(self.rng.random())
+        diff, scores = self.__calc_diff(
+            [(container_idx, min(idx1, idx2))], -log_rnd * temparature
+        )
+        if log_rnd * temparature <= -diff:
+            self.__accept_scores(scores, diff)
             return True
         block_idxs[idx1], block_idxs[idx2] = block_idxs[idx2], block_idxs[idx1]
         return False
 
     def __shift(self, temparature: float) -> bool:
         container_idx1, container_idx2 = self.rng.sample(
-            [
-                idx
-                for idx in range(self.request.n_containers)
-                if len(self.assigned_block_idxs[idx]) > 0
-            ],
-            k=2,
+            self.__used_containers(), k=2
         )
-        container1 = self.request.containers[container_idx1]
-        container2 = self.request.containers[container_idx2]
         block_idxs1 = self.assigned_block_idxs[container_idx1]
         block_idxs2 = self.assigned_block_idxs[container_idx2]
         insert_idx1 = self.rng.randint(0, len(block_idxs1) - 1)
@@ -280,34 +477,217 @@ class BinPackingSolver:
         insert_idx2 = self.rng.randint(0, len(block_idxs2))
         block_idxs1.remove(block_idx)
         block_idxs2.insert(insert_idx2, block_idx)
-        score1, corners1 = self.__calc_score_and_corners(
-            container1, block_idxs1
+        log_rnd = math.log(self.rng.random())
+        diff, scores = self.__calc_diff(
+            [(container_idx1, insert_idx1), (container_idx2, insert_idx2)],
+            -log_rnd * temparature,
         )
-        score2, corners2 = self.__calc_score_and_corners(
-            container2, block_idxs2
-        )
-        diff = 0.0
-        diff += score1 - self.assigned_scores[container_idx1]
-        diff += score2 - self.assigned_scores[container_idx2]
-        if math.log(self.rng.random()) * temparature <= -diff:
-            self.assigned_corners[container_idx1] = corners1
-            self.assigned_corners[container_idx2] = corners2
-            self.assigned_scores[container_idx1] = score1
-            self.assigned_scores[container_idx2] = score2
-            self.total_score += diff
+        if log_rnd * temparature <= -diff:
+            self.__accept_scores(scores, diff)
             return True
         block_idxs2.remove(block_idx)
         block_idxs1.insert(insert_idx1, block_idx)
         return False
 
+    def assign(self, container_idx: int, block_idxs: list[int]) -> None:
+        """Replace the packing order of a container and re-place it."""
+        self.assigned_block_idxs[container_idx] = block_idxs.copy()
+        score = self.__calc_score_and_corners(container_idx, block_idxs)
+        self.__accept(container_idx)
+        self.total_score += score - self.assigned_scores[container_idx]
+        self.assigned_scores[container_idx] = score
+
+    def __used_containers(self) -> list[int]:
+        return [
+            idx
+            for idx in range(self.request.n_containers)
+            if len(self.assigned_block_idxs[idx]) > 0
+        ]
+
+    def __choice_operator(self, allow_shift: bool = True) -> str:
+        # a shift needs two non-empty containers
+        if allow_shift and len(self.__used_containers()) >= 2:
+            return self.operators.choice(self.rng)
+        return self.operators.choice(self.rng, ["swap", "rotate"])
+
+    def __transit(
+        self,
+        operator: str,
+        temparature: float,
+        container_idx: Optional[int] = None,
+    ) -> bool:
+        with self.__stats.timer("bookkeeping"):
+            self.__stats.n_iterations += 1
+            total_score = self.total_score
+            n_placements = self.n_placements
+            if operator == "swap":
+                transit = self.__swap(temparature, container_idx)
+            elif operator == "rotate":
+                transit = self.__rotate(temparature, container_idx)
+            else:
+                transit = self.__shift(temparature)
+            self.operators.record(
+                operator,
+                transit,
+                self.total_score < total_score,
+                self.n_placements - n_placements,
+            )
+            return transit
+
+    def transit_container(
+        self, container_idx: int, temparature: float
+    ) -> bool:
+        """Swap or rotate within a single container."""
+        return self.__transit(
+            self.__choice_operator(allow_shift=False),
+            temparature,
+            container_idx,
+        )
+
+    def transit_shift(self, temparature: float) -> bool:
+        """Shift a block between two containers. Does nothing and returns
+        ``False`` if fewer than two containers are used."""
+        if len(self.__used_containers()) < 2:
+            return False
+        return self.__transit("shift", temparature)
+
     def transit(self, temparature: float) -> bool:
-        rnd = self.rng.random()
-        if rnd < 1 / 3:
-            return self.__swap(temparature)
-        elif rnd < 2 / 3:
-            return self.__rotate(temparature)
+        return self.__transit(self.__choice_operator(), temparature)
+
+    def __draw_move(self) -> Optional[Move]:
+        container_idxs = self.__used_containers()
+        operator = self.__choice_operator()
+        if operator == "shift":
+            if len(container_idxs) < 2:
+                return None
+            container_idx1, container_idx2 = self.rng.sample(
+                container_idxs, k=2
+            )
+            block_idxs1 = self.assigned_block_idxs[container_idx1]
+            block_idxs2 = self.assigned_block_idxs[container_idx2]
+            return (
+                "shift",
+                container_idx1,
+                self.rng.randint(0, len(block_idxs1) - 1),
+                container_idx2,
+                self.rng.randint(0, len(block_idxs2)),
+            )
+        container_idx = self.rng.choice(container_idxs)
+        block_idxs = self.assigned_block_idxs[container_idx]
+        if operator == "swap":
+            positions = self.table.choice_swap(block_idxs, self.rng)
+            if positions is None:
+                return None
+            idx1, idx2 = positions
+            return "swap", container_idx, idx1, idx2, 0
+        block_idx = self.rng.choice(block_idxs)
+        axis = self.table.choice_rotate_axis(block_idx, self.rng)
+        if axis is None:
+            return None
+        return "rotate", container_idx, block_idx, axis, 0
+
+    def __apply(self, move: Move) -> list[tuple[int, int]]:
+        """Apply ``move`` and return the touched containers together with
+        the first position each of them changes."""
+        kind, container_idx, i, j, k = move
+        block_idxs = self.assigned_block_idxs[container_idx]
+        if kind == "swap":
+            block_idxs[i], block_idxs[j] = block_idxs[j], block_idxs[i]
+            return [(container_idx, min(i, j))]
+        elif kind == "rotate":
+            self.table.rotate(i, j)
+            return [(container_idx, block_idxs.index(i))]
+        else:
+            self.assigned_block_idxs[j].insert(k, block_idxs.pop(i))
+            return [(container_idx, i), (j, k)]
+
+    def __undo(self, move: Move) -> None:
+        kind, container_idx, i, j, k = move
+        if kind == "shift":
+            block_idxs = self.assigned_block_idxs[container_idx]
+            block_idxs.insert(i, self.assigned_block_idxs[j].pop(k))
         else:
-            return self.__shift(temparature)
+            # swaps and rotations are their own inverse
+            self.__apply(move)
+
+    def transit_batch(
+        self,
+        temparature: float,
+        n_candidates: int,
+        acceptance: Acceptance = "best",
+    ) -> bool:
+        """Evaluate ``n_candidates`` moves from the current state and apply
+        at most one of them.
+
+        With ``"best"`` the best candidate is accepted by the Metropolis
+        criterion. With ``"metropolis"`` every candidate is tested with its
+        own random number and the best one passing is applied.
+
+        Candidates are placed one after another, each from the prefix it
+        shares with the current state and cut off once it cannot be
+        accepted; they are not evaluated as one stacked array pass, since
+        every placement depends on the blocks placed before it.
+        """
+        with self.__stats.timer("bookkeeping"):
+            self.__stats.n_iterations += 1
+            moves = [
+                move
+                for move in (self.__draw_move() for _ in range(n_candidates))
+                if move is not None
+            ]
+            rnds = 1e-9 + np.array([self.rng.random() for _ in moves]) * (
+                1 - 1e-9
+            )
+            if acceptance == "metropolis":
+                margins = -np.log(rnds) * temparature
+            else:
+                margins = np.full(len(moves), np.inf)
+            diffs = np.full(len(moves), np.inf)
+            costs = [0] * len(moves)
+            best = -1
+            best_scores: dict[int, float] = {}
+            for idx, move in enumerate(moves):
+                # candidates that cannot pass or beat the best one are cut off
+                allowance = margins[idx]
+                if best >= 0:
+                    allowance = min(allowance, diffs[best])
+                n_placements = self.n_placements
+                diffs[idx], scores = self.__calc_diff(
+                    self.__apply(move), allowance
+                )
+                costs[idx] = self.n_placements - n_placements
+                self.__undo(move)
+                if diffs[idx] > margins[idx]:
+                    continue
+                if best < 0 or diffs[idx] < diffs[best]:
+                    best = idx
+                    best_scores = scores
+                    for container_idx in scores:
+                        self.__keep_trial(container_idx)
+            transit = (
+                best >= 0
+                and math.log(rnds[best]) * temparature <= -diffs[best]
+            )
+            for idx, (move, cost) in enumerate(zip(moves, costs)):
+                self.operators.record(
+                    move[0],
+                    transit and idx == best,
+                    bool(diffs[idx] < 0),
+                    cost,
+                )
+            if not transit:
+                return False
+            self.__apply(moves[best])
+            for container_idx in best_scores:
+                self.__keep_trial(container_idx)
+            self.__accept_scores(best_scores, float(diffs[best]))
+            return True
+
+    def __keep_trial(self, container_idx: int) -> None:
+        self.trials[container_idx], self.best_trials[container_idx] = (
+            self.best_trials[container_idx],
+            self.trials[container_idx],
+        )
 
     def loop_render(
         self,
@@ -315,8 +695,114 @@ class BinPackingSolver:
         temparature: float,
         size: int,
         padding: int,
+        n_candidates: int = 1,
+        acceptance: Acceptance = "best",
+        max_fps: Optional[float] = None,
     ) -> Iterator[tuple[float, Image]]:
+        """Anneal ``max_iter`` iterations and yield scores with images.
+
+        Without ``max_fps`` the current score and solution are rendered
+        every 10 iterations. With ``max_fps`` the search runs at full speed
+        and the optimal solution is rendered on a background thread when it
+        improves, at most ``max_fps`` times per second.
+        """
+        if max_fps is not None:
+
+            def step() -> None:
+                if n_candidates > 1:
+                    self.transit_batch(temparature, n_candidates, acceptance)
+                else:
+                    self.transit(temparature)
+                self.update_opt()
+
+            with closing(
+                loop_frames(
+                    step,
+                    lambda: self.opt_snapshot,
+                    lambda snapshot: self.render_snapshot(
+                        snapshot, size, padding
+                    ),
+                    max_iter,
+                    max_fps,
+                )
+            ) as frames:
+                for snapshot, image in frames:
+                    yield snapshot.score, image
+            return
+        start = time.time()
         for n_iter in range(1, max_iter + 1):
             if n_iter % 10 == 0:
                 yield self.total_score, self.render(size, padding)
-            self.transit(temparature)
+            if n_candidates > 1:
+                self.transit_batch(temparature, n_candidates, acceptance)
+            else:
+                self.transit(temparature)
+            self.update_opt()
+            if n_iter % 100 == 0:
+                t = time.time() - start
+                self.logger.info(
+                    f"score: {self.total_score} "
+                    f"in {int(t * 100) / 100} seconds "
+                    f"({n_iter / t:.1f} iterations/sec, "
+                    f"{n_iter * n_candidates / t:.1f} evaluations/sec)."
+                )
+
+    def solve(
+        self,
+        max_iter: Optional[int],
+        temparature: float,
+        n_candidates: int = 1,
+        acceptance: Acceptance = "best",
+        time_limit: Optional[float] = None,
+        target_score: Optional[float] = None,
+    ) -> BinPackingResponse:
+        """Anneal until ``max_iter`` iterations, ``time_limit`` seconds or
+        a best total score of at most ``target_score``, whichever comes
+        first, and return the best solution."""
+        n_iter = 0
+        start = time.time()
+        deadline = None if time_limit is None else start + time_limit
+        try:
+            self.logger.info("start solving ...")
+            for n_iter in itertools.count(1):
+                if max_iter is not None and n_iter > max_iter:
+                    break
+                if deadline is not None and time.time() >= deadline:
+                    self.logger.info("time limit reached")
+                    break
+                if target_score is not None and self.opt_score <= target_score:
+                    break
+                if n_candidates > 1:
+                    self.transit_batch(temparature, n_candidates, acceptance)
+                else:
+                    self.transit(temparature)
+                self.update_opt()
+                if self.metrics_sink is not None and self.metrics_sink.due():
+                    self.metrics_sink.emit(
+                        self.stats, solver=self.__class__.__name__
+                    )
+                if n_iter % 100 == 0:
+                    t = time.time() - start
+                    self.logger.info(
+                        f"optimal score: {self.opt_score} "
+                        f"in {int(t * 100) / 100} seconds "
+                        f"({n_iter / t:.1f} iterations/sec)."
+                    )
+            n_iter -= 1
+            self.logger.info("finish solving !")
+        except KeyboardInterrupt:
+            self.logger.info("keyboard interrupted")
+        t = time.time() - start
+        self.logger.info(
+            f"{n_iter} iterations in {int(t * 100) / 100} seconds "
+            f"({n_iter / max(t, 1e-9):.1f} iterations/sec)."
+        )
+        self.logger.info(f"operators: {self.operators.summary()}")
+        n_hits, n_misses = self.memo_stats
+        self.logger.info(f"memo: {n_hits} hits, {n_misses} misses")
+        self.logger.info(f"seconds: {self.stats.summary()}")
+        if self.metrics_sink is not None:
+            self.metrics_sink.emit(
+                self.stats, solver=self.__class__.__name__, final=True
+            )
+        return self.best_response()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from src.interface import Block, Shape
+from src.utils import BoolArray, FloatArray, IntArray
+
+# orientations as permutations of the base dimensions
+ORIENTATIONS = (
+    (0, 1, 2),
+    (0, 2, 1),
+    (2, 1, 0),
+    (1, 0, 2),
+    (1, 2, 0),
+    (2, 0, 1),
+)
+
+
+def __rotated(orientation: tuple[int, ...], axis: int) -> int:
+    # rotating around an axis swaps the other two dimensions
+    i = (axis + 1) % 3
+    j = (axis + 2) % 3
+    permutation = list(orientation)
+    permutation[i], permutation[j] = permutation[j], permutation[i]
+    return ORIENTATIONS.index(tuple(permutation))
+
+
+# redraws of a swap of two interchangeable blocks before giving up
+MAX_SWAP_DRAWS = 10
+
+# ROTATIONS[orientation][axis] is the orientation after the rotation
+ROTATIONS = tuple(
+    tuple(__rotated(orientation, axis) for axis in range(3))
+    for orientation in ORIENTATIONS
+)
+
+
+def sku_types(blocks: list[Block]) -> list[int]:
+    """Type id of every block, numbered by first appearance.
+
+    Blocks are of the same type when they are interchangeable in a
+    packing: the same shape up to an allowed rotation, weight and flags.
+    """
+    types: dict[tuple[object, ...], int] = {}
+    type_ids = []
+    for block in blocks:
+        depth, width, height = block.shape
+        shape: tuple[float, ...]
+        if block.right_side_up:
+            shape = (min(depth, width), max(depth, width), height)
+        else:
+            shape = tuple(sorted(block.shape))
+        key = (shape, block.weight, block.stackable, block.right_side_up)
+        type_ids.append(types.setdefault(key, len(types)))
+    return type_ids
+
+
+class BlockTable:
+    """Blocks of a request as arrays, rotated by an orientation id each.
+
+    The shapes of all orientations are computed once, so a rotation only
+    updates one integer and a solution is saved by copying the orientation
+    array. ``Block`` objects are only materialized for responses.
+    """
+
+    def __init__(self, blocks: list[Block]) -> None:
+        self.blocks = blocks
+        self.base_shapes: FloatArray = np.array(
+            [block.shape for block in blocks], np.float64
+        ).reshape(-1, 3)
+        self.shapes: FloatArray = self.base_shapes[:, ORIENTATIONS]
+        self.orientations: IntArray = np.zeros(len(blocks), np.int8)
+        self.stackable: BoolArray = np.array(
+            [block.stackable for block in blocks], np.bool_
+        )
+        self.rotatable_axes = [block.rotatable_axes for block in blocks]
+        self.type_ids = sku_types(blocks)
+        # equal for blocks that are placed alike, keys of the memo tables
+        self.tokens: IntArray = np.array(
+            [
+                [hash((*shape, stackable)) for shape in block_shapes.tolist()]
+                for block_shapes, stackable in zip(
+                    self.shapes, self.stackable.tolist()
+                )
+            ],
+            np.int64,
+        ).reshape(-1, len(ORIENTATIONS))
+
+    @property
+    def n_blocks(self) -> int:
+        return len(self.blocks)
+
+    def shape(self, idx: int) -> Shape:
+        depth, width, height = self.shapes[idx, self.orientations[idx]]
+        return float(depth), float(width), float(height)
+
+    def current_shapes(self, idxs: list[int]) -> FloatArray:
+        """The shapes of ``idxs`` in their current orientations."""
+        return self.shapes[idxs, self.orientations[idxs]]
+
+    def equivalent(self, idx1: int, idx2: int) -> bool:
+        """Whether exchanging the two blocks leaves every placement as it
+        is: the same type in the same current shape."""
+        return self.type_ids[idx1] == self.type_ids[idx2] and bool(
+            np.all(
+                self.shapes[idx1, self.orientations[idx1]]
+                == self.shapes[idx2, self.orientations[idx2]]
+            )
+        )
+
+    def current_tokens(self, idxs: list[int]) -> IntArray:
+        return self.tokens[idxs, self.orientations[idxs]]
+
+    def choice_swap(
+        self, block_idxs: list[int], rng: random.Random
+    ) -> Optional[tuple[int, int]]:
+        """Two positions of ``block_idxs`` holding blocks that are not
+        interchangeable, so that swapping them is not a no-op. ``None`` if
+        none were drawn in ``MAX_SWAP_DRAWS`` tries."""
+        for _ in range(MAX_SWAP_DRAWS):
+            idx1, idx2 = rng.choices(range(len(block_idxs)), k=2)
+            if not self.equivalent(block_idxs[idx1], block_idxs[idx2]):
+                return idx1, idx2
+        return None
+
+    def choice_rotate_axis(
+        self, idx: int, rng: random.Random
+    ) -> Optional[int]:
+        """An allowed axis whose rotation changes the current shape, or
+        ``None`` if there is none, e.g. for a cube."""
+        shape = self.shapes[idx, self.orientations[idx]].tolist()
+        axes = [
+            axis
+            for axis in self.rotatable_axes[idx]
+            if shape[(axis + 1) % 3] != shape[(axis + 2) % 3]
+        ]
+        if not axes:
+            return None
+        return rng.choice(axes)
+
+    def rotate(self, idx: int, axis: int) -> None:
+        assert axis in self.rotatable_axes[idx]
+        self.orientations[idx] = ROTATIONS[self.orientations[idx]][axis]
+
+    def materialize(
+        self, orientations: Optional[IntArray] = None
+    ) -> list[Block]:
+        """Copies of the blocks in the given (default current)
+        orientations."""
+        if orientations is None:
+            orientations = self.orientations
+        shapes = self.shapes[np.arange(self.n_blocks), orientations].tolist()
+        blocks = [block.copy() for block in self.blocks]
+        for block, (depth, width, height) in zip(blocks, shapes):
+            block.shape = (depth, width, height)
+        return blocks
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """A solution as copies of the orientation and corner arrays, indexed
+    by block. Never modified, so it can be shared between threads."""
+
+    score: float
+    orientations: IntArray
+    corners: FloatArray
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar, Union, cast
+
+from src.interface import (
+    BinPackingRequest,
+    BinPackingResponse,
+    Block,
+    Corner,
+    Request,
+    StripPackingRequest,
+    StripPackingResponse,
+)
+
+# bump whenever a change of the solvers changes their results, so that
+# results cached by older versions are dropped
+SOLVER_VERSION = "1"
+
+Response = Union[StripPackingResponse, BinPackingResponse]
+RequestT = TypeVar("RequestT", bound=Request)
+ResponseT = TypeVar("ResponseT", StripPackingResponse, BinPackingResponse)
+
+
+def __block_key(block: Block) -> tuple[Any, ...]:
+    # name and color do not change a packing
+    return (
+        list(block.shape),
+        block.weight,
+        block.stackable,
+        block.right_side_up,
+    )
+
+
+def canonical_order(request: Request) -> list[int]:
+    """Block indices of the request in canonical order, which is the same
+    for every permutation of the blocks."""
+    keys = [__block_key(block) for block in request.blocks]
+    return sorted(range(request.n_blocks), key=lambda i: keys[i])
+
+
+def request_hash(
+    request: Request, params: Optional[dict[str, Any]] = None
+) -> str:
+    """Hash of the request, independent of the order of the blocks and of
+    their names and colors. ``params`` are the solver parameters, which
+    are part of the key since they change the result."""
+    canonical: dict[str, Any] = {
+        "blocks": [
+            __block_key(request.blocks[i]) for i in canonical_order(request)
+        ],
+        "params": params or {},
+    }
+    if isinstance(request, StripPackingRequest):
+        container = request.container
+        canonical["container"] = [
+            list(container.shape),
+            container.weight_capacity,
+        ]
+    elif isinstance(request, BinPackingRequest):
+        canonical["containers"] = [
+            [list(container.shape), container.weight_capacity]
+            for container in request.containers
+        ]
+    else:
+        raise NotImplementedError
+    payload = json.dumps(canonical, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """Responses of solved requests in an SQLite file.
+
+    Responses are stored in the canonical block order and remapped to the
+    block order of the request on a hit, so a permuted manifest hits the
+    entry of the original one. At most ``max_entries`` entries are kept,
+    the least recently used are evicted first. Entries of other solver
+    versions are dropped when the cache is opened.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_entries: int = 1024,
+        version: str = SOLVER_VERSION,
+    ) -> None:
+        self.max_entries = max_entries
+        self.version = version
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, version TEXT, payload TEXT, "
+                "last_used REAL)"
+            )
+            self.connection.execute(
+                "DELETE FROM results WHERE version != ?", (self.version,)
+            )
+
+    def __len__(self) -> int:
+        with self.lock:
+            (count,) = self.connection.execute(
+                "SELECT COUNT(*) FROM results"
+            ).fetchone()
+        return int(count)
+
+    def get(
+        self, request: Request, params: Optional[dict[str, Any]] = None
+    ) -> Optional[Response]:
+        """The cached response of the request, in its block order."""
+        key = request_hash(request, params)
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT payload FROM results WHERE key = ? AND version = ?",
+                (key, self.version),
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE results SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        payload = json.loads(row[0])
+        blocks = [block.copy() for block in request.blocks]
+        corners: list[Corner] = [(0.0, 0.0, 0.0)] * request.n_blocks
+        container_indexes = [-1] * request.n_blocks
+        for pos, idx in enumerate(canonical_order(request)):
+            depth, width, height = payload["shapes"][pos]
+            blocks[idx].shape = (depth, width, height)
+            back, left, bottom = payload["corners"][pos]
+            corners[idx] = (back, left, bottom)
+            if "container_indexes" in payload:
+                container_indexes[idx] = payload["container_indexes"][pos]
+        if isinstance(request, BinPackingRequest):
+            return BinPackingResponse(blocks, corners, container_indexes)
+        return StripPackingResponse(blocks, corners)
+
+    def put(
+        self,
+        request: Request,
+        response: Response,
+        params: Optional[dict[str, Any]] = None,
+    ) -> None:
+        order = canonical_order(request)
+        payload: dict[str, Any] = {
+            "shapes": [list(response.blocks[idx].shape) for idx in order],
+            "corners": [list(response.corners[idx]) for idx in order],
+        }
+        if isinstance(response, BinPackingResponse):
+            payload["container_indexes"] = [
+                response.container_indexes[idx] for idx in order
+            ]
+        key = request_hash(request, params)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, self.version, json.dumps(payload), time.time()),
+            )
+            self.connection.execute(
+                "DELETE FROM results WHERE key NOT IN (SELECT key FROM "
+                "results ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def get_or_solve(
+        self,
+        request: RequestT,
+        solve: Callable[[RequestT], ResponseT],
+        params: Optional[dict[str, Any]] = None,
+    ) -> ResponseT:
+        """The cached response of the request, or the response of
+        ``solve``, which is cached."""
+        response = cast(Optional[ResponseT], self.get(request, params))
+        if response is None:
+            response = solve(request)
+            self.put(request, response, params)
+        return response
+
+    def invalidate(self) -> None:
+        """Drop every entry."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM results")
+
+    def close(self) -> None:
+        self.connection.close()
@@ -1,10 +1,11 @@
 import json
 import os
-import random
 import sys
+from io import StringIO
 from pathlib import Path
-from typing import Any, TextIO
+from typing import IO, Any, Iterator, Literal, Optional, TextIO, Union
 
+import numpy as np
 import pandas as pd
 
 from src.interface import (
@@ -37,8 +38,18 @@ LEFT = "left"
 BOTTOM = "bottom"
 STACKABLE = "stackable"
 RIGHT_SIDE_UP = "right_side_up"
-# random seed
-RNG = random.Random(0)
+
+# keys of the rows of the compact JSON
+COMPACT_BLOCK_FIELDS = ["name", DEPTH, WIDTH, HEIGHT, WEIGHT, STACKABLE]
+COMPACT_PLACEMENT_FIELDS = ["block", BACK, LEFT, BOTTOM]
+# separators of json.dumps by default and in compact mode
+DEFAULT_SEPARATORS = (", ", ": ")
+COMPACT_SEPARATORS = (",", ":")
+
+# a path, or an open file such as an upload, whose name has the suffix
+# unless the format is given
+Source = Union[str, Path, IO[bytes]]
+TableFormat = Literal["excel", "csv", "parquet", "arrow", "feather"]
 
 
 def blocks_to_df(blocks: list[Block]) -> pd.DataFrame:
@@ -116,61 +127,165 @@ def request_to_excel(request: Request, path: Path) -> None:
         raise NotImplementedError
 
 
-def excel_to_request(path: Path) -> StripPackingRequest:
-    df_blocks = pd.read_excel(path, sheet_name=BLOCK_SHEET)
-    blocks: list[Block] = []
-    for idx, row in df_blocks.iterrows():
-        name = getattr(row, BLOCK_NAME)
-        depth = getattr(row, DEPTH)
-        width = getattr(row, WIDTH)
-        height = getattr(row, HEIGHT)
-        weight = getattr(row, WEIGHT)
-        shape = (depth, width, height)
-        # random color
-        color = (RNG.randint(0, 223), RNG.randint(0, 223), RNG.randint(0, 223))
-        stackable = getattr(row, STACKABLE)
-        right_side_up = getattr(row, RIGHT_SIDE_UP)
-        block = Block(name, shape, weight, color, stackable, right_side_up)
-        blocks.append(block)
-    df_container = pd.read_excel(path, sheet_name=CONTAINER_SHEET)
-    container_shape = (
-        df_container.loc[0, DEPTH],
-        df_container.loc[0, WIDTH],
-        df_container.loc[0, HEIGHT],
-    )
-    weight_capacity = df_container.loc[0, WEIGHT_CAPACITY]
-    container = Container("container", container_shape, weight_capacity)
-    return StripPackingRequest(blocks, container)
+def __suffix(source: Source, format: Optional[TableFormat]) -> str:
+    """Suffix of ``format`` if given, otherwise of the name of
+    ``source``, empty for files without a name such as ``BytesIO``."""
+    if format is not None:
+        return f".{format}"
+    if isinstance(source, (str, Path)):
+        name = str(source)
+    else:
+        name = getattr(source, "name", None) or ""
+    return Path(name).suffix.lower()
 
 
-def excel_to_bin_packing_request(path: Path) -> BinPackingRequest:
-    df_blocks = pd.read_excel(path, sheet_name=BLOCK_SHEET)
+def __require_pyarrow(suffix: str) -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            f"reading {suffix} files needs the optional pyarrow package, "
+            "install it with `pipenv install pyarrow`"
+        ) from e
+
+
+def read_frames(
+    source: Source,
+    sheet_name: str,
+    chunksize: Optional[int] = None,
+    format: Optional[TableFormat] = None,
+) -> Iterator[pd.DataFrame]:
+    """Read the table of ``source`` by ``format``, or by its suffix if
+    omitted: CSV, Parquet, Arrow (Feather) or otherwise Excel, where the
+    table is ``sheet_name``.
+
+    With ``chunksize``, CSV and Parquet tables are read in frames of at
+    most ``chunksize`` rows. Parquet and Arrow need the optional pyarrow
+    package, and raise ``ImportError`` without it.
+    """
+    suffix = __suffix(source, format)
+    if suffix == ".csv":
+        # the default parser may be off by one ulp, round trip is exact
+        yield from pd.read_csv(
+            source,
+            chunksize=chunksize or sys.maxsize,
+            float_precision="round_trip",
+        )
+    elif suffix == ".parquet":
+        __require_pyarrow(suffix)
+        if chunksize is None:
+            yield pd.read_parquet(source)
+        else:
+            from pyarrow.parquet import ParquetFile
+
+            for batch in ParquetFile(source).iter_batches(chunksize):
+                yield batch.to_pandas()
+    elif suffix in (".arrow", ".feather"):
+        __require_pyarrow(suffix)
+        yield pd.read_feather(source)
+    else:
+        yield pd.read_excel(source, sheet_name=sheet_name)
+
+
+def df_to_blocks(df: pd.DataFrame) -> list[Block]:
+    """Blocks of the rows of ``df``, read column by column."""
+    names = df[BLOCK_NAME].astype(str).tolist()
+    shapes = df[[DEPTH, WIDTH, HEIGHT]].to_numpy(np.float64).tolist()
+    weights = df[WEIGHT].to_numpy(np.float64).tolist()
+    stackables = df[STACKABLE].to_numpy(np.bool_).tolist()
+    if RIGHT_SIDE_UP in df:
+        right_side_ups = df[RIGHT_SIDE_UP].to_numpy(np.bool_).tolist()
+    else:
+        right_side_ups = [False] * len(df)
+    # colors are left to the visualizer
+    return [
+        Block(name, (depth, width, height), weight, None, stackable, upright)
+        for name, (depth, width, height), weight, stackable, upright in zip(
+            names, shapes, weights, stackables, right_side_ups
+        )
+    ]
+
+
+def df_to_containers(df: pd.DataFrame) -> list[Container]:
+    if CONTAINER_NAME in df:
+        names = df[CONTAINER_NAME].astype(str).tolist()
+    else:
+        names = [f"container{i + 1}" for i in range(len(df))]
+    shapes = df[[DEPTH, WIDTH, HEIGHT]].to_numpy(np.float64).tolist()
+    weight_capacities = df[WEIGHT_CAPACITY].to_numpy(np.float64).tolist()
+    return [
+        Container(name, (depth, width, height), weight_capacity)
+        for name, (depth, width, height), weight_capacity in zip(
+            names, shapes, weight_capacities
+        )
+    ]
+
+
+def read_blocks(
+    source: Source,
+    chunksize: Optional[int] = None,
+    format: Optional[TableFormat] = None,
+) -> list[Block]:
     blocks: list[Block] = []
-    for idx, row in df_blocks.iterrows():
-        name = getattr(row, BLOCK_NAME)
-        depth = getattr(row, DEPTH)
-        width = getattr(row, WIDTH)
-        height = getattr(row, HEIGHT)
-        weight = getattr(row, WEIGHT)
-        shape = (depth, width, height)
-        # random color
-        color = (RNG.randint(0, 223), RNG.randint(0, 223), RNG.randint(0, 223))
-        stackable = getattr(row, STACKABLE)
-        right_side_up = getattr(row, RIGHT_SIDE_UP)
-        block = Block(name, shape, weight, color, stackable, right_side_up)
-        blocks.append(block)
-    df_containers = pd.read_excel(path, sheet_name=CONTAINER_SHEET)
+    for df in read_frames(source, BLOCK_SHEET, chunksize, format):
+        blocks.extend(df_to_blocks(df))
+    return blocks
+
+
+def read_containers(
+    source: Source, format: Optional[TableFormat] = None
+) -> list[Container]:
     containers: list[Container] = []
-    for _, row in df_containers.iterrows():
-        name = getattr(row, CONTAINER_NAME)
-        depth = getattr(row, DEPTH)
-        width = getattr(row, WIDTH)
-        height = getattr(row, HEIGHT)
-        weight_capacity = getattr(row, WEIGHT_CAPACITY)
-        shape = (depth, width, height)
-        container = Container(name, shape, weight_capacity)
-        containers.append(container)
-    return BinPackingRequest(blocks, containers)
+    for df in read_frames(source, CONTAINER_SHEET, format=format):
+        containers.extend(df_to_containers(df))
+    return containers
+
+
+def read_request(
+    source: Source,
+    container_source: Optional[Source] = None,
+    chunksize: Optional[int] = None,
+    format: Optional[TableFormat] = None,
+    container_format: Optional[TableFormat] = None,
+) -> StripPackingRequest:
+    """Strip packing request of a blocks table and a container table.
+
+    ``container_source`` defaults to ``source``, for Excel files with both
+    sheets; CSV, Parquet and Arrow files hold a single table. The formats
+    default to the suffixes of the names of the sources, and to Excel for
+    sources without a name.
+    """
+    blocks = read_blocks(source, chunksize, format)
+    if container_source is None:
+        container_source, container_format = source, format
+    container = read_containers(container_source, container_format)[0]
+    container.name = "container"
+    return StripPackingRequest(blocks, container)
+
+
+def read_bin_packing_request(
+    source: Source,
+    containers_source: Optional[Source] = None,
+    chunksize: Optional[int] = None,
+    format: Optional[TableFormat] = None,
+    containers_format: Optional[TableFormat] = None,
+) -> BinPackingRequest:
+    """Bin packing request of a blocks table and a containers table, see
+    ``read_request``."""
+    blocks = read_blocks(source, chunksize, format)
+    if containers_source is None:
+        containers_source, containers_format = source, format
+    return BinPackingRequest(
+        blocks, read_containers(containers_source, containers_format)
+    )
+
+
+def excel_to_request(path: Source) -> StripPackingRequest:
+    return read_request(path)
+
+
+def excel_to_bin_packing_request(path: Source) -> BinPackingRequest:
+    return read_bin_packing_request(path)
 
 
 def corners_to_df(corners: list[Corner]) -> pd.DataFrame:
@@ -197,63 +312,225 @@ def response_to_excel(response: StripPackingResponse, path: Path) -> None:
         df.to_excel(writer, sheet_name=RESPONSE_SHEET, index=False)
 
 
-def bin_packing_to_json(
-    request: BinPackingRequest,
-    response: BinPackingResponse,
-    io: TextIO,
-) -> str:
-    container_idx_to_blocks: list[list[tuple[Block, Corner]]] = [
+def __container_dict(container: Container) -> dict[str, Any]:
+    return {
+        "name": container.name,
+        "depth": container.shape[0],
+        "width": container.shape[1],
+        "height": container.shape[2],
+        "weight_capacity": container.weight_capacity,
+    }
+
+
+def __block_dict(block: Block) -> dict[str, Any]:
+    return {
+        "name": block.name,
+        "depth": block.shape[0],
+        "width": block.shape[1],
+        "height": block.shape[2],
+        "weight": block.weight,
+        "stackable": block.stackable,
+    }
+
+
+def __dict_container(payload: dict[str, Any]) -> Container:
+    return Container(
+        str(payload.get("name", "container")),
+        (
+            float(payload[DEPTH]),
+            float(payload[WIDTH]),
+            float(payload[HEIGHT]),
+        ),
+        float(payload[WEIGHT_CAPACITY]),
+    )
+
+
+def json_to_request(payload: dict[str, Any]) -> Request:
+    """Request of a JSON object with ``blocks`` and either a ``container``
+    (strip packing) or ``containers`` (bin packing), in the layout of
+    ``bin_packing_to_json``. Raises ``KeyError``, ``TypeError`` or
+    ``ValueError`` on malformed payloads."""
+    blocks = [
+        Block(
+            str(block["name"]),
+            (
+                float(block[DEPTH]),
+                float(block[WIDTH]),
+                float(block[HEIGHT]),
+            ),
+            float(block[WEIGHT]),
+            None,
+            bool(block.get(STACKABLE, True)),
+            bool(block.get(RIGHT_SIDE_UP, False)),
+        )
+        for block in payload["blocks"]
+    ]
+    if "container" in payload:
+        return StripPackingRequest(
+            blocks, __dict_container(payload["container"])
+        )
+    containers = [
+        __dict_container(container) for container in payload["containers"]
+    ]
+    if not containers:
+        raise ValueError("no containers")
+    return BinPackingRequest(blocks, containers)
+
+
+def __write_items(
+    io: TextIO, items: Iterator[Any], separators: tuple[str, str]
+) -> None:
+    for idx, item in enumerate(items):
+        if idx > 0:
+            io.write(separators[0])
+        io.write(json.dumps(item, separators=separators))
+
+
+def __write_bin_packing(
+    request: BinPackingRequest, response: BinPackingResponse, io: TextIO
+) -> None:
+    container_idx_to_idxs: list[list[int]] = [
         [] for _ in range(request.n_containers)
     ]
-    unpacked_blocks: list[Block] = []
-    for block, corner, container_idx in zip(
-        response.blocks, response.corners, response.container_indexes
+    unpacked_idxs: list[int] = []
+    for idx, (corner, container_idx) in enumerate(
+        zip(response.corners, response.container_indexes)
     ):
         if corner[0] >= INF:
-            unpacked_blocks.append(block)
+            unpacked_idxs.append(idx)
         else:
-            container_idx_to_blocks[container_idx].append((block, corner))
-    containers_and_blocks: list[
-        tuple[Container, list[tuple[Block, Corner]]]
-    ] = list(zip(request.containers, container_idx_to_blocks))
-    packing_dict = {
-        "packings": [
-            {
-                "container": {
-                    "name": container.name,
-                    "depth": container.shape[0],
-                    "width": container.shape[1],
-                    "height": container.shape[2],
-                    "weight_capacity": container.weight_capacity,
-                },
-                "packed_blocks": [
-                    {
-                        "name": block.name,
-                        "depth": block.shape[0],
-                        "width": block.shape[1],
-                        "height": block.shape[2],
-                        "weight": block.weight,
-                        "stackable": block.stackable,
-                        "back": corner[0],
-                        "left": corner[1],
-                        "bottom": corner[2],
-                    }
-                    for block, corner in blocks
-                ],
-            }
-            for container, blocks in containers_and_blocks
-        ],
-        "unpacked_blocks": [
+            container_idx_to_idxs[container_idx].append(idx)
+    io.write('{"packings": [')
+    for container_idx, (container, idxs) in enumerate(
+        zip(request.containers, container_idx_to_idxs)
+    ):
+        if container_idx > 0:
+            io.write(", ")
+        io.write('{"container": ')
+        io.write(json.dumps(__container_dict(container)))
+        io.write(', "packed_blocks": [')
+        __write_items(
+            io,
+            (
+                {
+                    **__block_dict(response.blocks[idx]),
+                    "back": response.corners[idx][0],
+                    "left": response.corners[idx][1],
+                    "bottom": response.corners[idx][2],
+                }
+                for idx in idxs
+            ),
+            DEFAULT_SEPARATORS,
+        )
+        io.write("]}")
+    io.write('], "unpacked_blocks": [')
+    __write_items(
+        io,
+        (__block_dict(response.blocks[idx]) for idx in unpacked_idxs),
+        DEFAULT_SEPARATORS,
+    )
+    io.write("]}")
+
+
+def strip_packing_to_json(
+    request: StripPackingRequest, response: StripPackingResponse, io: TextIO
+) -> None:
+    """Write the packing to ``io`` in the layout of a single container of
+    ``bin_packing_to_json``."""
+    io.write('{"container": ')
+    io.write(json.dumps(__container_dict(request.container)))
+    io.write(', "packed_blocks": [')
+    __write_items(
+        io,
+        (
             {
-                "name": block.name,
-                "depth": block.shape[0],
-                "width": block.shape[1],
-                "height": block.shape[2],
-                "weight": block.weight,
-                "stackable": block.stackable,
+                **__block_dict(block),
+                "back": corner[0],
+                "left": corner[1],
+                "bottom": corner[2],
             }
-            for block in unpacked_blocks
-        ],
-    }
-    json.dump(packing_dict, io)
-    return json.dumps(packing_dict)
+            for block, corner in zip(response.blocks, response.corners)
+            if corner[0] < INF
+        ),
+        DEFAULT_SEPARATORS,
+    )
+    io.write('], "unpacked_blocks": [')
+    __write_items(
+        io,
+        (
+            __block_dict(block)
+            for block, corner in zip(response.blocks, response.corners)
+            if corner[0] >= INF
+        ),
+        DEFAULT_SEPARATORS,
+    )
+    io.write("]}")
+
+
+def __write_compact_bin_packing(
+    request: BinPackingRequest, response: BinPackingResponse, io: TextIO
+) -> None:
+    container_idx_to_rows: list[list[list[float]]] = [
+        [] for _ in range(request.n_containers)
+    ]
+    unpacked_idxs: list[int] = []
+    for idx, (corner, container_idx) in enumerate(
+        zip(response.corners, response.container_indexes)
+    ):
+        if corner[0] >= INF:
+            unpacked_idxs.append(idx)
+        else:
+            container_idx_to_rows[container_idx].append([idx, *corner])
+    io.write('{"containers":[')
+    __write_items(
+        io,
+        (__container_dict(c) for c in request.containers),
+        COMPACT_SEPARATORS,
+    )
+    io.write('],"block_fields":')
+    io.write(json.dumps(COMPACT_BLOCK_FIELDS, separators=COMPACT_SEPARATORS))
+    io.write(',"blocks":[')
+    __write_items(
+        io,
+        (
+            [block.name, *block.shape, block.weight, block.stackable]
+            for block in response.blocks
+        ),
+        COMPACT_SEPARATORS,
+    )
+    io.write('],"placement_fields":')
+    io.write(
+        json.dumps(COMPACT_PLACEMENT_FIELDS, separators=COMPACT_SEPARATORS)
+    )
+    io.write(',"packings":[')
+    __write_items(io, iter(container_idx_to_rows), COMPACT_SEPARATORS)
+    io.write('],"unpacked_blocks":')
+    io.write(json.dumps(unpacked_idxs, separators=COMPACT_SEPARATORS))
+    io.write("}")
+
+
+def bin_packing_to_json(
+    request: BinPackingRequest,
+    response: BinPackingResponse,
+    io: TextIO,
+    return_string: bool = True,
+    compact: bool = False,
+) -> Optional[str]:
+    """Write the packings container by container to ``io``, and return the
+    document too if ``return_string``.
+
+    Blocks are serialized one at a time, so the document is never held as
+    a whole unless it is returned. In ``compact`` mode every block is
+    listed once as ``[name, depth, width, height, weight, stackable]`` and
+    the packing of each container is a list of ``[block index, back,
+    left, bottom]`` rows, without whitespace.
+    """
+    write = __write_compact_bin_packing if compact else __write_bin_packing
+    if not return_string:
+        write(request, response, io)
+        return None
+    buffer = StringIO()
+    write(request, response, buffer)
+    json_str = buffer.getvalue()
+    io.write(json_str)
+    return json_str
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Generator, Generic, Optional, TypeVar
+
+from src.interface import Image
+
+SnapshotT = TypeVar("SnapshotT")
+
+
+class FrameRenderer(Generic[SnapshotT]):
+    """Renders snapshots of solutions on a background thread.
+
+    Only the latest submitted snapshot is kept, older ones that were not
+    rendered yet are dropped, and at most ``max_fps`` frames are rendered
+    per second. Snapshots must not be modified after they are submitted.
+    """
+
+    def __init__(
+        self, render: Callable[[SnapshotT], Image], max_fps: float
+    ) -> None:
+        assert max_fps > 0
+        self.render = render
+        self.min_interval = 1 / max_fps
+        self.condition = threading.Condition()
+        self.pending: Optional[SnapshotT] = None
+        self.frame: Optional[tuple[SnapshotT, Image]] = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def submit(self, snapshot: SnapshotT) -> None:
+        with self.condition:
+            self.pending = snapshot
+            self.condition.notify_all()
+
+    def poll(self) -> Optional[tuple[SnapshotT, Image]]:
+        """The frame rendered since the last poll, if any."""
+        with self.condition:
+            frame, self.frame = self.frame, None
+            return frame
+
+    def close(self) -> Optional[tuple[SnapshotT, Image]]:
+        """Render the pending snapshot without waiting for the frame rate,
+        stop the thread and return the last frame not polled yet."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        return self.poll()
+
+    def __run(self) -> None:
+        last_rendered = -float("inf")
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                # snapshots submitted while waiting replace the pending one
+                wait = last_rendered + self.min_interval - time.monotonic()
+                while wait > 0 and not self.closed:
+                    self.condition.wait(wait)
+                    wait = last_rendered + self.min_interval - time.monotonic()
+                snapshot, self.pending = self.pending, None
+            if snapshot is None:
+                return
+            image = self.render(snapshot)
+            last_rendered = time.monotonic()
+            with self.condition:
+                self.frame = (snapshot, image)
+
+
+def loop_frames(
+    step: Callable[[], object],
+    best: Callable[[], SnapshotT],
+    render: Callable[[SnapshotT], Image],
+    max_iter: int,
+    max_fps: float,
+) -> Generator[tuple[SnapshotT, Image], None, None]:
+    """Call ``step`` ``max_iter`` times at full speed and yield frames of
+    the best snapshot, rendered in the background whenever ``best``
+    returns a new one."""
+    renderer = FrameRenderer(render, max_fps)
+    submitted: Optional[SnapshotT] = None
+    try:
+        for _ in range(max_iter):
+            snapshot = best()
+            if snapshot is not submitted:
+                renderer.submit(snapshot)
+                submitted = snapshot
+            step()
+            frame = renderer.poll()
+            if frame is not None:
+                yield frame
+        if best() is not submitted:
+            renderer.submit(best())
+    finally:
+        last_frame = renderer.close()
+    if last_frame is not None:
+        yield last_frame
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict
+from typing import Any, TextIO
+
+from src.operators import OperatorStats
+
+# milp: initial assignment, placement: placing blocks, render: drawing
+# images, bookkeeping: the rest of the moves (drawing, accepting, copying)
+PHASES = ("milp", "placement", "render", "bookkeeping")
+
+
+class SolverStats:
+    """Timers and counters of a solver.
+
+    Phase times are exclusive: time spent placing blocks while evaluating a
+    move counts as placement, not as bookkeeping of the move. Timers may
+    run on several threads, e.g. rendering in the background. The operator
+    stats are shared with the operator selector of the solver.
+    """
+
+    def __init__(self, operators: dict[str, OperatorStats]) -> None:
+        self.start = time.time()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.operators = operators
+        self.n_iterations = 0
+        self.n_placements = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.opt_score = float("inf")
+        self.__lock = threading.Lock()
+        # time spent in nested phases, one entry per running timer of the
+        # thread
+        self.__local = threading.local()
+
+    @contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        nested: list[float] = self.__local.__dict__.setdefault("nested", [])
+        start = time.perf_counter()
+        nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.__lock:
+                self.seconds[phase] += elapsed - nested.pop()
+            if nested:
+                nested[-1] += elapsed
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{phase}: {seconds:.2f}"
+            for phase, seconds in self.seconds.items()
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "time": time.time(),
+            "elapsed": time.time() - self.start,
+            "n_iterations": self.n_iterations,
+            "n_placements": self.n_placements,
+            "opt_score": self.opt_score,
+            "seconds": dict(self.seconds),
+            "operators": {
+                operator: asdict(stats)
+                for operator, stats in self.operators.items()
+            },
+            "memo": {"hits": self.memo_hits, "misses": self.memo_misses},
+        }
+
+
+class JsonLinesSink:
+    """Writes snapshots of solver stats as JSON lines to ``stream``, at
+    most one every ``interval`` seconds."""
+
+    def __init__(self, stream: TextIO, interval: float = 1.0) -> None:
+        self.stream = stream
+        self.interval = interval
+        self.last_emitted = -float("inf")
+
+    def emit(self, stats: SolverStats, **fields: Any) -> None:
+        """Write a snapshot now, with extra ``fields``."""
+        self.stream.write(json.dumps({**stats.as_dict(), **fields}) + "\n")
+        self.stream.flush()
+        self.last_emitted = time.monotonic()
+
+    def due(self) -> bool:
+        return time.monotonic() - self.last_emitted >= self.interval
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import random
+import zlib
 from dataclasses import dataclass, replace
-from typing import TypeAlias
+from typing import Literal, Optional, TypeAlias
 
 import numpy as np
 import numpy.typing as npt
@@ -25,6 +26,9 @@ Box: TypeAlias = tuple[Back, Front, Left, Right, Bottom, Top]
 Image: TypeAlias = npt.NDArray[np.uint8]
 Color: TypeAlias = tuple[int, int, int]
 
+# how the best of a batch of candidate moves is accepted
+Acceptance: TypeAlias = Literal["best", "metropolis"]
+
 INF = 1e9
 
 
@@ -43,7 +47,8 @@ class Block:
     name: str
     shape: Shape
     weight: float
-    color: Color
+    # drawn from the name when rendered if not given
+    color: Optional[Color] = None
     stackable: bool = True
     right_side_up: bool = False
 
@@ -56,6 +61,19 @@ class Block:
     def copy(self) -> Block:
         return replace(self)
 
+    @property
+    def display_color(self) -> Color:
+        """The color, or a color seeded by the name if none is given, so
+        loading large requests does not draw colors nobody renders."""
+        if self.color is None:
+            rng = random.Random(zlib.crc32(self.name.encode()))
+            self.color = (
+                rng.randint(0, 223),
+                rng.randint(0, 223),
+                rng.randint(0, 223),
+            )
+        return self.color
+
     @property
     def volume(self) -> float:
         return volume(self.shape)
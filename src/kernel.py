@@ -0,0 +1,137 @@
+"""Placement kernel compiled by Numba, opt-in.
+
+The kernel is the stable corner search of ``src.utils`` written as plain
+loops over flat float arrays, which Numba compiles to machine code. It is
+used when Numba is installed and the environment variable
+``BP3D_USE_NUMBA`` is ``1``, and the NumPy implementation in
+``src.utils`` otherwise; both return identical corners, which
+``tests/test_kernel.py`` checks.
+"""
+
+import os
+from types import ModuleType
+from typing import Any, Callable, Optional, TypeVar, cast
+
+import numpy as np
+import numpy.typing as npt
+
+FloatArray = npt.NDArray[np.float64]
+IntArray = npt.NDArray[np.int64]
+BoolArray = npt.NDArray[np.bool_]
+F = TypeVar("F", bound=Callable[..., Any])
+
+numba: Optional[ModuleType]
+try:
+    import numba  # type: ignore[no-redef, unused-ignore]
+except ImportError:
+    numba = None
+
+HAS_NUMBA = numba is not None
+# read from the environment so worker processes inherit it; never without
+# Numba, since the kernel is slow uncompiled
+USE_NUMBA = HAS_NUMBA and os.environ.get("BP3D_USE_NUMBA") == "1"
+
+
+def jit(function: F) -> F:
+    """Compile ``function`` with Numba, or leave it as is without Numba."""
+    if numba is None:
+        return function
+    return cast(F, numba.njit(cache=True)(function))
+
+
+@jit
+def __event_orders(
+    starts: FloatArray, ends: FloatArray
+) -> tuple[FloatArray, IntArray, IntArray]:
+    # a stable sort of the ends followed by the starts orders the events
+    # by (coordinate, start flag, box index), like the NumPy path
+    n_boxes = len(starts)
+    coords = np.concatenate((ends, starts))
+    events = np.argsort(coords, kind="mergesort")
+    backs = np.empty(n_boxes, np.int64)
+    fronts = np.empty(n_boxes, np.int64)
+    for order in range(2 * n_boxes):
+        event = events[order]
+        if event < n_boxes:
+            fronts[event] = order
+        else:
+            backs[event - n_boxes] = order
+    return coords[events], backs, fronts
+
+
+@jit
+def __covered(
+    y_idx: int,
+    z_idx: int,
+    active: IntArray,
+    lefts: IntArray,
+    rights: IntArray,
+    bottoms: IntArray,
+    tops: IntArray,
+) -> bool:
+    for box in active:
+        if (
+            lefts[box] <= y_idx < rights[box]
+            and bottoms[box] <= z_idx < tops[box]
+        ):
+            return True
+    return False
+
+
+@jit
+def stable_corner_kernel(
+    new_shape: FloatArray,
+    new_block_is_stackable: bool,
+    shapes: FloatArray,
+    corners: FloatArray,
+    stackable: BoolArray,
+    ceil_idx: int,
+) -> tuple[bool, float, float, float]:
+    """Return whether a stable corner was found and the corner.
+
+    Same arguments as ``calc_stable_corner``, except that ``new_shape`` is
+    a float array and ``ceil_idx`` is ``-1`` without a ceiling.
+    """
+    n_boxes = len(shapes)
+    starts = corners - new_shape
+    ends = corners + shapes
+    xs, backs, fronts = __event_orders(starts[:, 0], ends[:, 0])
+    ys, lefts, rights = __event_orders(starts[:, 1], ends[:, 1])
+    zs, bottoms, tops = __event_orders(starts[:, 2], ends[:, 2])
+    if not new_block_is_stackable:
+        # nothing can be placed on the new block
+        ceil_bottom = bottoms[ceil_idx] if ceil_idx >= 0 else 0
+        bottoms[:] = 0
+        if ceil_idx >= 0:
+            bottoms[ceil_idx] = ceil_bottom
+    for box in range(n_boxes):
+        # nothing can be placed on unstackable boxes
+        if not stackable[box]:
+            tops[box] = 2 * n_boxes - 1
+    # a stable cell lies at the front, right and top of boxes, and exactly
+    # one box ends at every front, the only one that can cover the cell
+    # behind
+    for behind in np.argsort(fronts):
+        x_idx = fronts[behind]
+        active = np.flatnonzero((backs <= x_idx) & (x_idx < fronts))
+        z_idxs = np.unique(tops[active])
+        y_idxs = np.sort(rights[active])
+        for z_idx in z_idxs:
+            if not bottoms[behind] <= z_idx < tops[behind]:
+                continue
+            for y_idx in y_idxs:
+                if not lefts[behind] <= y_idx < rights[behind]:
+                    continue
+                if (
+                    not __covered(
+                        y_idx, z_idx, active, lefts, rights, bottoms, tops
+                    )
+                    and __covered(
+                        y_idx - 1, z_idx, active, lefts, rights, bottoms, tops
+                    )
+                    and __covered(
+                        y_idx, z_idx - 1, active, lefts, rights, bottoms, tops
+                    )
+                ):
+                    return True, xs[x_idx], ys[y_idx], zs[z_idx]
+    return False, 0.0, 0.0, 0.0
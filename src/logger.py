@@ -3,12 +3,19 @@ from typing import TextIO
 
 
 def get_logger(name: str, stream: TextIO) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    # loggers are shared by name, so every solver after the first would add
+    # another handler and print every line once more
+    if any(
+        isinstance(handler, logging.StreamHandler) and handler.stream is stream
+        for handler in logger.handlers
+    ):
+        return logger
     formatter = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
     handler = logging.StreamHandler(stream)
     handler.setFormatter(formatter)
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
     logger.addHandler(handler)
     return logger
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from typing import Optional, TypeAlias
+
+# running averages of the rewards and costs of the operators
+SelectorState: TypeAlias = tuple[dict[str, float], dict[str, float]]
+
+
+@dataclass
+class OperatorStats:
+    n_proposed: int = 0
+    n_accepted: int = 0
+    n_improved: int = 0
+    # blocks placed while evaluating the moves
+    cost: int = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.n_accepted / max(self.n_proposed, 1)
+
+    @property
+    def improvement_rate(self) -> float:
+        return self.n_improved / max(self.n_proposed, 1)
+
+
+class OperatorSelector:
+    """Roulette-wheel selection of move operators.
+
+    Every operator keeps running averages of its reward (1 for a move that
+    improves the score, 0 otherwise) and of its cost (blocks placed to
+    evaluate the move). With ``adaptive`` the selection probabilities are
+    proportional to reward per cost, each kept at least
+    ``min_probability``, so cheap operators that keep improving are drawn
+    more often. Costs are counted in placements instead of seconds, so
+    runs with the same seed stay reproducible. Without ``adaptive`` the
+    operators are drawn uniformly.
+    """
+
+    def __init__(
+        self,
+        operators: list[str],
+        adaptive: bool = True,
+        rate: float = 0.05,
+        min_probability: float = 0.1,
+    ) -> None:
+        assert min_probability * len(operators) <= 1
+        self.operators = operators
+        self.adaptive = adaptive
+        self.rate = rate
+        self.min_probability = min_probability
+        self.stats = {operator: OperatorStats() for operator in operators}
+        # optimistic start, so every operator is tried before it decays
+        self.rewards = {operator: 1.0 for operator in operators}
+        self.costs = {operator: 1.0 for operator in operators}
+
+    def probabilities(
+        self, operators: Optional[list[str]] = None
+    ) -> list[float]:
+        """Selection probabilities of ``operators`` (default all)."""
+        if operators is None:
+            operators = self.operators
+        n_operators = len(operators)
+        qualities = [
+            self.rewards[operator] / self.costs[operator]
+            for operator in operators
+        ]
+        total = sum(qualities)
+        if not self.adaptive or total <= 0:
+            return [1 / n_operators] * n_operators
+        min_probability = min(self.min_probability, 1 / n_operators)
+        return [
+            min_probability + (1 - n_operators * min_probability) * q / total
+            for q in qualities
+        ]
+
+    def choice(
+        self, rng: random.Random, operators: Optional[list[str]] = None
+    ) -> str:
+        """Draw one of ``operators`` (default all) with a single random
+        number."""
+        if operators is None:
+            operators = self.operators
+        rnd = rng.random()
+        cumulative = 0.0
+        for operator, probability in zip(
+            operators, self.probabilities(operators)
+        ):
+            cumulative += probability
+            if rnd < cumulative:
+                return operator
+        return operators[-1]
+
+    def record(
+        self, operator: str, accepted: bool, improved: bool, cost: int
+    ) -> None:
+        stats = self.stats[operator]
+        stats.n_proposed += 1
+        stats.n_accepted += accepted
+        stats.n_improved += improved
+        stats.cost += cost
+        self.rewards[operator] += self.rate * (
+            float(improved) - self.rewards[operator]
+        )
+        # one more than the placements, since drawing a move costs too
+        self.costs[operator] += self.rate * (cost + 1 - self.costs[operator])
+
+    def getstate(self) -> SelectorState:
+        """The running averages that drive the selection. Like a random
+        state, they belong to an annealing chain, so a chain moved to
+        another solver must take them along to stay reproducible."""
+        return dict(self.rewards), dict(self.costs)
+
+    def setstate(self, state: SelectorState) -> None:
+        rewards, costs = state
+        self.rewards = dict(rewards)
+        self.costs = dict(costs)
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{operator}: {stats.n_improved}/{stats.n_accepted}/"
+            f"{stats.n_proposed} improved/accepted/proposed"
+            for operator, stats in self.stats.items()
+        )
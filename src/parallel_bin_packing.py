@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from src.bin_packing_solver import BinPackingSolver
+from src.interface import (
+    BinPackingRequest,
+    BinPackingResponse,
+    Block,
+    Container,
+)
+from src.logger import get_logger
+from src.operators import SelectorState
+from src.placement import PlacementMode
+from src.utils import IntArray
+
+# columns of the flag table
+STACKABLE_COLUMN = 0
+RIGHT_SIDE_UP_COLUMN = 1
+
+
+@dataclass
+class SharedBlockTable:
+    """Block shapes, weights, flags and orientations in shared memory.
+
+    Only the segment names are pickled to the workers. The orientations
+    are written back by the workers, which is safe because every container,
+    and therefore every block, is optimized by a single worker per round.
+    """
+
+    shapes_name: str
+    weights_name: str
+    flags_name: str
+    orientations_name: str
+    n_blocks: int
+
+
+class SharedArrays:
+    def __init__(self, table: SharedBlockTable, create: bool) -> None:
+        size = max(table.n_blocks, 1)
+        self.segments = [
+            (
+                SharedMemory(name, create=create, size=nbytes)
+                if create
+                else SharedMemory(name)
+            )
+            for name, nbytes in [
+                (table.shapes_name, 3 * 8 * size),
+                (table.weights_name, 8 * size),
+                (table.flags_name, 2 * size),
+                (table.orientations_name, size),
+            ]
+        ]
+        shapes, weights, flags, orientations = self.segments
+        self.shapes: npt.NDArray[np.float64] = np.ndarray(
+            (table.n_blocks, 3), np.float64, shapes.buf
+        )
+        self.weights: npt.NDArray[np.float64] = np.ndarray(
+            (table.n_blocks,), np.float64, weights.buf
+        )
+        self.flags: npt.NDArray[np.bool_] = np.ndarray(
+            (table.n_blocks, 2), np.bool_, flags.buf
+        )
+        self.orientations: IntArray = np.ndarray(
+            (table.n_blocks,), np.int8, orientations.buf
+        )
+
+    def close(self) -> None:
+        # drop the views before the buffers are released
+        del self.shapes, self.weights, self.flags, self.orientations
+        for segment in self.segments:
+            segment.close()
+
+    def unlink(self) -> None:
+        for segment in self.segments:
+            segment.unlink()
+
+
+def __create_table(
+    blocks: list[Block], prefix: str
+) -> tuple[SharedBlockTable, SharedArrays]:
+    table = SharedBlockTable(
+        f"{prefix}_shapes",
+        f"{prefix}_weights",
+        f"{prefix}_flags",
+        f"{prefix}_orientations",
+        len(blocks),
+    )
+    arrays = SharedArrays(table, create=True)
+    for idx, block in enumerate(blocks):
+        arrays.shapes[idx] = block.shape
+        arrays.weights[idx] = block.weight
+        arrays.flags[idx, STACKABLE_COLUMN] = block.stackable
+        arrays.flags[idx, RIGHT_SIDE_UP_COLUMN] = block.right_side_up
+    arrays.orientations[:] = 0
+    return table, arrays
+
+
+# shared arrays and solver of the worker process
+__ARRAYS: Optional[SharedArrays] = None
+__SOLVER: Optional[BinPackingSolver] = None
+
+
+def __init_worker(
+    table: SharedBlockTable,
+    containers: list[Container],
+    placement: PlacementMode,
+) -> None:
+    global __ARRAYS, __SOLVER
+    __ARRAYS = SharedArrays(table, create=False)
+    blocks = [
+        Block(
+            str(idx),
+            (shape[0], shape[1], shape[2]),
+            weight,
+            (0, 0, 0),
+            bool(flags[STACKABLE_COLUMN]),
+            bool(flags[RIGHT_SIDE_UP_COLUMN]),
+        )
+        for idx, (shape, weight, flags) in enumerate(
+            zip(
+                __ARRAYS.shapes.tolist(),
+                __ARRAYS.weights.tolist(),
+                __ARRAYS.flags.tolist(),
+            )
+        )
+    ]
+    request = BinPackingRequest(blocks, containers)
+    assignment: list[list[int]] = [[] for _ in containers]
+    __SOLVER = BinPackingSolver(
+        request, random.Random(0), placement, assignment
+    )
+
+
+def __optimize_container(
+    container_idx: int,
+    block_idxs: list[int],
+    rng_state: tuple[Any, ...],
+    selector_state: SelectorState,
+    n_steps: int,
+    temparature: float,
+) -> tuple[list[int], tuple[Any, ...], SelectorState]:
+    arrays, solver = __ARRAYS, __SOLVER
+    assert arrays is not None and solver is not None
+    solver.table.orientations[block_idxs] = arrays.orientations[block_idxs]
+    solver.assign(container_idx, block_idxs)
+    solver.rng.setstate(rng_state)
+    # the random stream and the operator selection belong to the
+    # container, not to the worker that happens to optimize it
+    solver.operators.setstate(selector_state)
+    for _ in range(n_steps):
+        solver.transit_container(container_idx, temparature)
+    block_idxs = solver.assigned_block_idxs[container_idx]
+    arrays.orientations[block_idxs] = solver.table.orientations[block_idxs]
+    return block_idxs, solver.rng.getstate(), solver.operators.getstate()
+
+
+def solve_parallel_containers(
+    request: BinPackingRequest,
+    n_rounds: int,
+    n_steps: int,
+    n_shift_steps: int,
+    temparature: float,
+    seed: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    placement: PlacementMode = "exact",
+) -> BinPackingResponse:
+    """Optimize the containers of a bin packing in parallel processes.
+
+    Every round, each non-empty container is optimized by swaps and
+    rotations for ``n_steps`` moves in a worker process. The round ends
+    with a synchronization in which ``n_shift_steps`` shifts between
+    containers are made in this process. The best solution after any
+    synchronization or shift is returned.
+    """
+    logger = get_logger("ParallelContainers", sys.stdout)
+    start = time.time()
+    seed_sequence = np.random.SeedSequence(seed)
+    rng = random.Random(int(seed_sequence.generate_state(1)[0]))
+    rng_states = [
+        random.Random(int(child.generate_state(1)[0])).getstate()
+        for child in seed_sequence.spawn(request.n_containers)
+    ]
+    solver = BinPackingSolver(request, rng, placement)
+    selector_states = [
+        solver.operators.getstate() for _ in range(request.n_containers)
+    ]
+    prefix = f"bp3d_{id(solver):x}_{rng.getrandbits(32):08x}"
+    table, arrays = __create_table(request.blocks, prefix)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=__init_worker,
+            initargs=(table, request.containers, placement),
+        ) as executor:
+            for n_round in range(n_rounds):
+                container_idxs = [
+                    idx
+                    for idx, block_idxs in enumerate(
+                        solver.assigned_block_idxs
+                    )
+                    if len(block_idxs) > 0
+                ]
+                futures = [
+                    executor.submit(
+                        __optimize_container,
+                        idx,
+                        solver.assigned_block_idxs[idx],
+                        rng_states[idx],
+                        selector_states[idx],
+                        n_steps,
+                        temparature,
+                    )
+                    for idx in container_idxs
+                ]
+                for idx, future in zip(container_idxs, futures):
+                    (
+                        block_idxs,
+                        rng_states[idx],
+                        selector_states[idx],
+                    ) = future.result()
+                    solver.table.orientations[block_idxs] = (
+                        arrays.orientations[block_idxs]
+                    )
+                    solver.assign(idx, block_idxs)
+                solver.update_opt()
+                # a shift may empty a container, so the used containers are
+                # checked by every shift
+                for _ in range(n_shift_steps):
+                    solver.transit_shift(temparature)
+                    solver.update_opt()
+                t = time.time() - start
+                logger.info(
+                    f"round {n_round + 1}: score: {solver.total_score}, "
+                    f"optimal score: {solver.opt_score} "
+                    f"in {int(t * 100) / 100} seconds."
+                )
+    finally:
+        arrays.close()
+        arrays.unlink()
+    return solver.best_response()
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+from src.interface import StripPackingRequest, StripPackingResponse
+from src.logger import get_logger
+from src.operators import SelectorState
+from src.placement import PlacementMode
+from src.solver import StripPackingSolver
+
+
+@dataclass
+class Replica:
+    """Configuration of one replica, passed between processes."""
+
+    temparature: float
+    packing_order: list[int]
+    orientations: list[int]
+    score: float
+    rng_state: tuple[Any, ...]
+    selector_state: SelectorState
+    opt_score: float
+    opt_orientations: list[int]
+    opt_corners: list[list[float]]
+
+
+# solver of the worker process, reconfigured for every segment
+__SOLVER: Optional[StripPackingSolver] = None
+
+
+def __init_worker(
+    request: StripPackingRequest, placement: PlacementMode
+) -> None:
+    global __SOLVER
+    __SOLVER = StripPackingSolver(request, random.Random(0), placement)
+
+
+def __run_segment(
+    replica: Replica, n_steps: int, allow_rotate: bool
+) -> Replica:
+    solver = __SOLVER
+    assert solver is not None
+    solver.set_configuration(replica.packing_order, replica.orientations)
+    solver.rng.setstate(replica.rng_state)
+    solver.operators.setstate(replica.selector_state)
+    for _ in range(n_steps):
+        solver.transit(allow_rotate, replica.temparature)
+    packing_order, orientations = solver.configuration
+    return Replica(
+        replica.temparature,
+        packing_order,
+        orientations,
+        solver.score,
+        solver.rng.getstate(),
+        solver.operators.getstate(),
+        solver.opt_score,
+        solver.opt_snapshot.orientations.tolist(),
+        solver.opt_snapshot.corners.tolist(),
+    )
+
+
+def temparature_ladder(
+    min_temparature: float, max_temparature: float, n_replicas: int
+) -> list[float]:
+    """Geometrically spaced temparatures from min to max."""
+    if n_replicas == 1:
+        return [min_temparature]
+    ratio = (max_temparature / min_temparature) ** (1 / (n_replicas - 1))
+    return [min_temparature * ratio**idx for idx in range(n_replicas)]
+
+
+def solve_parallel_tempering(
+    request: StripPackingRequest,
+    temparatures: list[float],
+    n_rounds: int,
+    n_steps: int,
+    allow_rotate: bool,
+    seed: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    placement: PlacementMode = "exact",
+) -> StripPackingResponse:
+    """Run one annealing chain per temparature in a process pool.
+
+    Every round, each replica makes ``n_steps`` moves at its temparature,
+    then configurations are exchanged between neighbouring temparatures
+    by the Metropolis criterion. Each replica has its own random stream
+    spawned from ``seed``, so runs with the same seed are reproducible.
+    The best solution found by any replica is returned.
+    """
+    if any(temparature <= 0 for temparature in temparatures):
+        raise ValueError("temparatures must be positive")
+    logger = get_logger("ParallelTempering", sys.stdout)
+    start = time.time()
+    seed_sequence = np.random.SeedSequence(seed)
+    rng = random.Random(int(seed_sequence.generate_state(1)[0]))
+    solver = StripPackingSolver(request, random.Random(0), placement)
+    packing_order, orientations = solver.configuration
+    replicas: list[Replica] = []
+    for temparature, child in zip(
+        sorted(temparatures), seed_sequence.spawn(len(temparatures))
+    ):
+        replica_rng = random.Random(int(child.generate_state(1)[0]))
+        replicas.append(
+            Replica(
+                temparature,
+                packing_order,
+                orientations,
+                solver.score,
+                replica_rng.getstate(),
+                solver.operators.getstate(),
+                solver.opt_score,
+                orientations,
+                solver.opt_snapshot.corners.tolist(),
+            )
+        )
+    opt = replicas[0]
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=__init_worker,
+        initargs=(request, placement),
+    ) as executor:
+        for n_round in range(n_rounds):
+            replicas = list(
+                executor.map(
+                    __run_segment,
+                    replicas,
+                    [n_steps] * len(replicas),
+                    [allow_rotate] * len(replicas),
+                )
+            )
+            for replica in replicas:
+                if replica.opt_score < opt.opt_score:
+                    opt = replica
+            # exchange between even or odd neighbours alternately
+            for idx in range(n_round % 2, len(replicas) - 1, 2):
+                replica1, replica2 = replicas[idx], replicas[idx + 1]
+                delta = (
+                    1 / replica1.temparature - 1 / replica2.temparature
+                ) * (replica1.score - replica2.score)
+                if delta >= 0 or math.log(1e-300 + rng.random()) < delta:
+                    replicas[idx], replicas[idx + 1] = (
+                        __exchanged(replica1, replica2),
+                        __exchanged(replica2, replica1),
+                    )
+            t = time.time() - start
+            logger.info(
+                f"round {n_round + 1}: optimal score: {opt.opt_score} "
+                f"in {int(t * 100) / 100} seconds."
+            )
+    blocks = solver.table.materialize(np.asarray(opt.opt_orientations))
+    corners = [(back, left, bottom) for back, left, bottom in opt.opt_corners]
+    return StripPackingResponse(blocks, corners)
+
+
+def __exchanged(replica: Replica, other: Replica) -> Replica:
+    """``replica`` with the configuration of ``other``; the temparature,
+    the random stream and the operator selection stay with the replica."""
+    return Replica(
+        replica.temparature,
+        other.packing_order,
+        other.orientations,
+        other.score,
+        replica.rng_state,
+        replica.selector_state,
+        replica.opt_score,
+        replica.opt_orientations,
+        replica.opt_corners,
+    )
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import math
+from typing import Literal, Optional
+
+import numpy as np
+
+from src.error import NoStablePointFound
+from src.interface import INF, Block, Corner, Shape
+from src.transposition import TranspositionTable, extend_hash
+from src.utils import (
+    BoolArray,
+    FloatArray,
+    IntArray,
+    calc_height_map_corner,
+    calc_stable_corner,
+    grid_shape,
+)
+
+PlacementMode = Literal["exact", "height_map"]
+WALL_SHAPE = (3 * INF, 3 * INF, 3 * INF)
+
+
+def wall_blocks(n_walls: int) -> list[Block]:
+    return [
+        Block(f"wall{i + 1}", WALL_SHAPE, 0.0, (0, 0, 0), stackable=True)
+        for i in range(n_walls)
+    ]
+
+
+def wall_corners(
+    container_shape: tuple[float, float, float], n_walls: int
+) -> list[Corner]:
+    container_depth, container_width, container_height = container_shape
+    corners: list[Corner] = [
+        (-3 * INF, -INF, -INF),
+        (-INF, -3 * INF, -INF),
+        (-INF, -INF, -3 * INF),
+        (container_depth, -INF, -INF),
+        (-INF, container_width, -INF),
+        (-INF, -INF, container_height),
+    ]
+    return corners[:n_walls]
+
+
+class PlacementState:
+    """Placed boxes of one container along a packing order.
+
+    The walls come first, followed by the blocks in packing order. For every
+    prefix of the order the running max score and the number of unstacked
+    blocks are kept as checkpoints, so that a move which leaves the first
+    ``start`` blocks untouched only has to replay the suffix.
+
+    The score of a placed block is the far end of its corner along
+    ``score_axis`` (front depth for ``0``, top height for ``2``). The score
+    of the state is the max score plus ``unstacked_penalty`` per block that
+    could not be placed. Both terms only grow along the order, so the score
+    of a prefix is a lower bound of the score of the whole order.
+    """
+
+    def __init__(
+        self,
+        walls: list[Block],
+        corners: list[Corner],
+        capacity: int,
+        score_axis: int,
+        unstacked_penalty: float,
+        ceil_idx: Optional[int] = None,
+        memo: Optional[TranspositionTable] = None,
+    ) -> None:
+        self.n_walls = len(walls)
+        self.score_axis = score_axis
+        self.unstacked_penalty = unstacked_penalty
+        self.ceil_idx = ceil_idx
+        # shared by the states of a container, which place the same boxes
+        self.memo = memo
+        size = self.n_walls + capacity
+        self.shapes: FloatArray = np.zeros((size, 3), np.float64)
+        self.placed_corners: FloatArray = np.zeros((size, 3), np.float64)
+        self.stackable: BoolArray = np.ones(size, np.bool_)
+        self.max_scores: FloatArray = np.zeros(capacity + 1, np.float64)
+        self.n_unstackeds: IntArray = np.zeros(capacity + 1, np.int64)
+        # rolling hashes of the prefixes, the keys of the memo
+        self.prefix_hashes: IntArray = np.zeros(capacity + 1, np.int64)
+        self.n_placed = 0
+        for idx, (wall, corner) in enumerate(zip(walls, corners)):
+            self.shapes[idx] = wall.shape
+            self.placed_corners[idx] = corner
+            self.stackable[idx] = wall.stackable
+
+    @property
+    def max_score(self) -> float:
+        return float(self.max_scores[self.n_placed])
+
+    @property
+    def n_unstacked(self) -> int:
+        return int(self.n_unstackeds[self.n_placed])
+
+    @property
+    def score(self) -> float:
+        return self.prefix_score(self.n_placed)
+
+    def prefix_score(self, n_placed: int) -> float:
+        return float(
+            self.max_scores[n_placed]
+            + self.unstacked_penalty * self.n_unstackeds[n_placed]
+        )
+
+    @property
+    def corners(self) -> list[Corner]:
+        end = self.n_walls + self.n_placed
+        return [
+            (back, left, bottom)
+            for back, left, bottom in self.placed_corners[
+                self.n_walls : end
+            ].tolist()
+        ]
+
+    def copy_prefix(self, checkpoint: PlacementState, start: int) -> None:
+        """Copy the first ``start`` placements of ``checkpoint``."""
+        if checkpoint is self:
+            return
+        end = self.n_walls + start
+        self.shapes[:end] = checkpoint.shapes[:end]
+        self.placed_corners[:end] = checkpoint.placed_corners[:end]
+        self.stackable[:end] = checkpoint.stackable[:end]
+        self.max_scores[: start + 1] = checkpoint.max_scores[: start + 1]
+        self.n_unstackeds[: start + 1] = checkpoint.n_unstackeds[: start + 1]
+        self.prefix_hashes[: start + 1] = checkpoint.prefix_hashes[: start + 1]
+
+    @property
+    def corner_array(self) -> FloatArray:
+        """The corners of the placed blocks, a view into the state."""
+        return self.placed_corners[self.n_walls : self.n_walls + self.n_placed]
+
+    def rebuild(self, start: int) -> None:
+        """Prepare placing after the first ``start`` blocks."""
+
+    def locate(self, shape: Shape, stackable: bool, n_boxes: int) -> Corner:
+        """The corner of a new block among the first ``n_boxes`` boxes,
+        walls included. Raises ``NoStablePointFound``."""
+        return calc_stable_corner(
+            shape,
+            stackable,
+            self.shapes[:n_boxes],
+            self.placed_corners[:n_boxes],
+            self.stackable[:n_boxes],
+            self.ceil_idx,
+        )
+
+    def mark(self, corner: Corner, shape: Shape, stackable: bool) -> None:
+        """Record a block placed at ``corner`` after ``locate``."""
+
+    def replay(
+        self,
+        start: int,
+        shapes: FloatArray,
+        stackable: BoolArray,
+        checkpoint: Optional[PlacementState] = None,
+        cutoff: float = math.inf,
+        tokens: Optional[IntArray] = None,
+    ) -> bool:
+        """Place blocks of ``shapes`` after the first ``start`` blocks of
+        the order.
+
+        The first ``start`` placements are taken from ``checkpoint`` (from
+        ``self`` if omitted), so the checkpoint itself is left untouched and
+        a rejected move is rolled back by simply discarding this state.
+        Placement stops as soon as the score exceeds ``cutoff``, in which
+        case ``False`` is returned and only a prefix is placed.
+
+        With a memo, ``tokens`` identify the shape and flag of every block,
+        and corners of prefixes placed before are taken from the memo.
+        """
+        if checkpoint is not None:
+            self.copy_prefix(checkpoint, start)
+        end = self.n_walls + start
+        self.shapes[end : end + len(shapes)] = shapes
+        self.stackable[end : end + len(shapes)] = stackable
+        self.rebuild(start)
+        memo = self.memo if tokens is not None else None
+        token_list = [] if tokens is None else tokens.tolist()
+        prefix_hash = int(self.prefix_hashes[start])
+        max_score = self.max_scores[start]
+        n_unstacked = self.n_unstackeds[start]
+        for pos, (shape, block_stackable) in enumerate(
+            zip(shapes.tolist(), stackable.tolist()), start + 1
+        ):
+            corner: Optional[Corner] = None
+            if memo is not None:
+                prefix_hash = extend_hash(
+                    prefix_hash, token_list[pos - start - 1]
+                )
+                self.prefix_hashes[pos] = prefix_hash
+                corner = memo.get(prefix_hash)
+            if corner is None:
+                try:
+                    corner = self.locate(shape, block_stackable, end)
+                except NoStablePointFound:
+                    corner = (INF, INF, INF)
+                if memo is not None:
+                    memo.put(prefix_hash, corner)
+            # blocks resting on a wall are as unstacked as blocks without
+            # any stable point
+            score = corner[self.score_axis] + shape[self.score_axis]
+            if score < INF:
+                self.mark(corner, shape, block_stackable)
+                max_score = max(max_score, score)
+            else:
+                n_unstacked += 1
+            self.placed_corners[end] = corner
+            self.max_scores[pos] = max_score
+            self.n_unstackeds[pos] = n_unstacked
+            end += 1
+            if max_score + self.unstacked_penalty * n_unstacked > cutoff:
+                self.n_placed = pos
+                return False
+        self.n_placed = start + len(shapes)
+        return True
+
+
+class HeightMapState(PlacementState):
+    """Placement on an integer height map of the container floor.
+
+    Shapes are rounded up to whole grid cells, so placements are valid but
+    approximate. The cost of a placement is proportional to the floor area
+    instead of the number of placed boxes. The height map of a prefix is
+    rebuilt from the cached corners, which is much cheaper than placing.
+    """
+
+    def __init__(
+        self,
+        container_shape: Shape,
+        capacity: int,
+        score_axis: int,
+        unstacked_penalty: float,
+        has_ceiling: bool,
+        memo: Optional[TranspositionTable] = None,
+    ) -> None:
+        super().__init__(
+            [], [], capacity, score_axis, unstacked_penalty, memo=memo
+        )
+        depth, width, height = np.floor(
+            np.asarray(container_shape, np.float64) + 1e-9
+        )
+        self.max_height = int(height) if has_ceiling else None
+        self.height_map: IntArray = np.zeros(
+            (int(depth), int(width)), np.int64
+        )
+        self.blocked: BoolArray = np.zeros((int(depth), int(width)), np.bool_)
+
+    def __paint(
+        self, corner: tuple[int, int, int], shape: Shape, stackable: bool
+    ) -> None:
+        back, left, bottom = corner
+        depth, width, height = grid_shape(shape)
+        footprint = (
+            slice(back, back + depth),
+            slice(left, left + width),
+        )
+        self.height_map[footprint] = bottom + height
+        if not stackable:
+            self.blocked[footprint] = True
+
+    def rebuild(self, start: int) -> None:
+        self.height_map.fill(0)
+        self.blocked.fill(False)
+        for placed, shape, stackable in zip(
+            self.placed_corners[:start].tolist(),
+            self.shapes[:start].tolist(),
+            self.stackable[:start].tolist(),
+        ):
+            if placed[0] < INF:
+                self.mark(placed, shape, stackable)
+
+    def locate(self, shape: Shape, stackable: bool, n_boxes: int) -> Corner:
+        back, left, bottom = calc_height_map_corner(
+            self.height_map,
+            self.blocked,
+            grid_shape(shape),
+            self.max_height,
+        )
+        return float(back), float(left), float(bottom)
+
+    def mark(self, corner: Corner, shape: Shape, stackable: bool) -> None:
+        back, left, bottom = corner
+        self.__paint((int(back), int(left), int(bottom)), shape, stackable)
+
+
+def new_placement_state(
+    placement: PlacementMode,
+    container_shape: Shape,
+    capacity: int,
+    score_axis: int,
+    unstacked_penalty: float,
+    has_ceiling: bool,
+    memo: Optional[TranspositionTable] = None,
+) -> PlacementState:
+    if placement == "exact":
+        n_walls = 6 if has_ceiling else 5
+        return PlacementState(
+            wall_blocks(n_walls),
+            wall_corners(container_shape, n_walls),
+            capacity,
+            score_axis,
+            unstacked_penalty,
+            ceil_idx=n_walls - 1 if has_ceiling else None,
+            memo=memo,
+        )
+    elif placement == "height_map":
+        return HeightMapState(
+            container_shape,
+            capacity,
+            score_axis,
+            unstacked_penalty,
+            has_ceiling,
+            memo,
+        )
+    else:
+        raise NotImplementedError
@@ -0,0 +1,594 @@
+"""HTTP solve service on localhost, with the standard library only.
+
+    python -m src.service --port 8000 --workers 4 --max-queued 64
+
+Endpoints, all JSON:
+
+- ``POST /jobs`` queues a job. The body is ``{"request": ..., "deadline":
+  seconds, "max_iter": ..., "temparature": ..., "placement": ...,
+  "seed": ...}`` where the request is in the layout of
+  ``converter.json_to_request``. Answers ``202`` with the job, or ``503``
+  with ``Retry-After`` when the queue is full.
+- ``GET /jobs/<id>`` is the status and progress (best score so far,
+  iterations) of the job.
+- ``GET /jobs/<id>/result`` is the response of a finished job, ``409``
+  while it is queued or running.
+- ``DELETE /jobs/<id>`` cancels a job. A running job stops within the
+  progress interval and keeps the best solution found so far.
+- ``GET /health`` counts the jobs by status.
+
+A worker process that dies, e.g. out of memory, is replaced by a new one,
+and the job it was solving fails.
+
+The deadline of a job counts from its submission: a job still queued at
+its deadline expires, a running job stops annealing at it and returns its
+best solution.
+
+With ``--cache``, jobs whose request was solved before with the same
+parameters, in any block order, are done at submission with the cached
+result, and the results of done jobs are cached.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import multiprocessing as mp
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from multiprocessing.process import BaseProcess
+from multiprocessing.synchronize import Event
+from pathlib import Path
+from typing import Any, Literal, Optional, Union
+
+from src.bin_packing_solver import BinPackingSolver
+from src.cache import Response, ResultCache
+from src.converter import (
+    bin_packing_to_json,
+    json_to_request,
+    strip_packing_to_json,
+)
+from src.interface import (
+    BinPackingRequest,
+    BinPackingResponse,
+    Request,
+    StripPackingRequest,
+    StripPackingResponse,
+)
+from src.logger import get_logger
+from src.placement import PlacementMode
+from src.solver import StripPackingSolver
+
+JobStatus = Literal[
+    "queued", "running", "done", "cancelled", "expired", "failed"
+]
+FINISHED: tuple[JobStatus, ...] = ("done", "cancelled", "expired", "failed")
+
+DEFAULT_DEADLINE = 60.0
+# seconds between progress reports of a running job
+PROGRESS_INTERVAL = 0.5
+RETRY_AFTER = 1
+# workers are started from a process running the server threads, forking
+# it could copy locks held by those threads into the workers
+CONTEXT = mp.get_context("spawn")
+
+
+@dataclass
+class JobSpec:
+    """What a worker needs to solve a job."""
+
+    id: str
+    request: Request
+    deadline: float
+    # seconds from the submission to the deadline
+    time_limit: float
+    max_iter: Optional[int]
+    temparature: float
+    placement: PlacementMode
+    seed: int
+
+
+@dataclass
+class Job:
+    spec: JobSpec
+    status: JobStatus = "queued"
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    opt_score: Optional[float] = None
+    n_iterations: int = 0
+    worker_idx: Optional[int] = None
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.spec.id,
+            "status": self.status,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "deadline": self.spec.deadline,
+            "opt_score": self.opt_score,
+            "n_iterations": self.n_iterations,
+            "error": self.error,
+        }
+
+
+def cache_params(spec: JobSpec) -> dict[str, Any]:
+    """Parameters of the job that change its result, part of the key of
+    the result cache."""
+    return {
+        "time_limit": spec.time_limit,
+        "max_iter": spec.max_iter,
+        "temparature": spec.temparature,
+        "placement": spec.placement,
+        "seed": spec.seed,
+    }
+
+
+def response_json(request: Request, response: Response) -> str:
+    result = StringIO()
+    if isinstance(request, StripPackingRequest):
+        assert isinstance(response, StripPackingResponse)
+        strip_packing_to_json(request, response, result)
+    else:
+        assert isinstance(request, BinPackingRequest)
+        assert isinstance(response, BinPackingResponse)
+        bin_packing_to_json(request, response, result, return_string=False)
+    return result.getvalue()
+
+
+def __solve(
+    spec: JobSpec,
+    events: mp.Queue[Any],
+    cancel: Event,
+    cache: Optional[ResultCache],
+) -> None:
+    solver: Union[StripPackingSolver, BinPackingSolver]
+    rng = random.Random(spec.seed)
+    if isinstance(spec.request, StripPackingRequest):
+        solver = StripPackingSolver(spec.request, rng, spec.placement)
+    elif isinstance(spec.request, BinPackingRequest):
+        solver = BinPackingSolver(spec.request, rng, spec.placement)
+    else:
+        raise NotImplementedError
+    # solved in slices of the progress interval, between which progress is
+    # reported and cancellation is checked
+    while not cancel.is_set():
+        n_iterations = solver.stats.n_iterations
+        remaining = spec.deadline - time.time()
+        max_iter = None
+        if spec.max_iter is not None:
+            max_iter = spec.max_iter - n_iterations
+        if remaining <= 0 or max_iter == 0:
+            break
+        time_limit = min(remaining, PROGRESS_INTERVAL)
+        if isinstance(solver, StripPackingSolver):
+            solver.solve(
+                max_iter, True, spec.temparature, time_limit=time_limit
+            )
+        else:
+            solver.solve(max_iter, spec.temparature, time_limit=time_limit)
+        if solver.stats.n_iterations == n_iterations:
+            # the strip packing solver stops once the blocks fit
+            break
+        events.put(
+            ("progress", spec.id, solver.opt_score, solver.stats.n_iterations)
+        )
+    response = solver.best_response()
+    status = "cancelled" if cancel.is_set() else "done"
+    if cache is not None and status == "done":
+        cache.put(spec.request, response, cache_params(spec))
+    events.put(
+        (
+            "finished",
+            spec.id,
+            status,
+            solver.opt_score,
+            solver.stats.n_iterations,
+            response_json(spec.request, response),
+        )
+    )
+
+
+def run_worker(
+    worker_idx: int,
+    generation: int,
+    tasks: mp.Queue[Optional[JobSpec]],
+    events: mp.Queue[Any],
+    cancel: Event,
+    cache_path: Optional[Path] = None,
+) -> None:
+    # the solvers log every hundred iterations
+    logging.disable(logging.INFO)
+    cache = None if cache_path is None else ResultCache(cache_path)
+    while True:
+        spec = tasks.get()
+        if spec is None:
+            return
+        events.put(("started", spec.id, worker_idx))
+        try:
+            __solve(spec, events, cancel, cache)
+        except Exception as e:
+            events.put(("failed", spec.id, f"{type(e).__name__}: {e}"))
+        events.put(("idle", worker_idx, generation))
+
+
+class SolveService:
+    """Jobs queued in this process and solved by worker processes.
+
+    At most ``max_queued`` jobs wait for a worker; submitting more raises
+    ``queue.Full``. The last ``max_finished`` finished jobs are kept for
+    their results. Dead workers are replaced when jobs are submitted or
+    looked up, and at least every progress interval. With ``cache_path``,
+    results are looked up in and stored to the result cache in that file.
+    """
+
+    def __init__(
+        self,
+        n_workers: int,
+        max_queued: int,
+        max_finished: int = 1024,
+        cache_path: Optional[Path] = None,
+    ) -> None:
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.cache_path = cache_path
+        # looked up here, the workers store the results
+        self.cache = None if cache_path is None else ResultCache(cache_path)
+        self.logger = get_logger(self.__class__.__name__, sys.stderr)
+        self.lock = threading.Lock()
+        self.jobs: dict[str, Job] = {}
+        self.queued: deque[str] = deque()
+        self.finished: OrderedDict[str, None] = OrderedDict()
+        self.events: mp.Queue[Any] = CONTEXT.Queue()
+        self.tasks: list[mp.Queue[Optional[JobSpec]]] = []
+        self.cancels: list[Event] = []
+        self.workers: list[BaseProcess] = []
+        # incremented when a worker is replaced, events of the dead worker
+        # that arrive later are ignored
+        self.generations: list[int] = []
+        self.idle: list[int] = []
+        self.closed = False
+        for worker_idx in range(n_workers):
+            self.tasks.append(CONTEXT.Queue())
+            self.cancels.append(CONTEXT.Event())
+            self.workers.append(self.__start_worker(worker_idx, 0))
+            self.generations.append(0)
+            self.idle.append(worker_idx)
+        self.collector = threading.Thread(target=self.__collect, daemon=True)
+        self.collector.start()
+
+    def submit(self, spec: JobSpec) -> Job:
+        """Queue a job, or finish it at once with a cached result."""
+        cached = None
+        if self.cache is not None:
+            cached = self.cache.get(spec.request, cache_params(spec))
+        with self.lock:
+            if cached is not None:
+                job = Job(spec)
+                job.result = response_json(spec.request, cached)
+                self.jobs[spec.id] = job
+                self.__finish(job, "done")
+                return job
+            if len(self.queued) >= self.max_queued:
+                raise queue.Full
+            self.__replace_dead_workers()
+            job = Job(spec)
+            self.jobs[spec.id] = job
+            self.queued.append(spec.id)
+            self.__dispatch()
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            self.__replace_dead_workers()
+            self.__expire()
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == "queued":
+                self.queued.remove(job_id)
+                self.__finish(job, "cancelled")
+            elif job.status == "running" and job.worker_idx is not None:
+                self.cancels[job.worker_idx].set()
+            return job
+
+    def counts(self) -> dict[str, int]:
+        with self.lock:
+            self.__expire()
+            counts: dict[str, int] = dict.fromkeys(
+                ("queued", "running", *FINISHED), 0
+            )
+            for job in self.jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+        for tasks, cancel in zip(self.tasks, self.cancels):
+            cancel.set()
+            tasks.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        if self.cache is not None:
+            self.cache.close()
+
+    def __start_worker(self, worker_idx: int, generation: int) -> BaseProcess:
+        worker = CONTEXT.Process(
+            target=run_worker,
+            args=(
+                worker_idx,
+                generation,
+                self.tasks[worker_idx],
+                self.events,
+                self.cancels[worker_idx],
+                self.cache_path,
+            ),
+            daemon=True,
+        )
+        worker.start()
+        return worker
+
+    def __replace_dead_workers(self) -> None:
+        """Start a new worker in place of each dead one and fail the job
+        it was solving."""
+        if self.closed:
+            return
+        for worker_idx, worker in enumerate(self.workers):
+            if worker.is_alive():
+                continue
+            self.logger.warning(
+                f"worker {worker_idx} died with exit code {worker.exitcode}"
+            )
+            for job in self.jobs.values():
+                if job.status == "running" and job.worker_idx == worker_idx:
+                    job.error = f"worker died with exit code {worker.exitcode}"
+                    self.__finish(job, "failed")
+            # the dead worker may have left the queue locked
+            self.tasks[worker_idx] = CONTEXT.Queue()
+            self.cancels[worker_idx] = CONTEXT.Event()
+            self.generations[worker_idx] += 1
+            self.workers[worker_idx] = self.__start_worker(
+                worker_idx, self.generations[worker_idx]
+            )
+            if worker_idx not in self.idle:
+                self.idle.append(worker_idx)
+        self.__dispatch()
+
+    def __finish(self, job: Job, status: JobStatus) -> None:
+        job.status = status
+        job.finished = time.time()
+        self.finished[job.spec.id] = None
+        while len(self.finished) > self.max_finished:
+            job_id, _ = self.finished.popitem(last=False)
+            del self.jobs[job_id]
+
+    def __expire(self) -> None:
+        now = time.time()
+        for job_id in [
+            job_id
+            for job_id in self.queued
+            if self.jobs[job_id].spec.deadline <= now
+        ]:
+            self.queued.remove(job_id)
+            self.__finish(self.jobs[job_id], "expired")
+
+    def __dispatch(self) -> None:
+        self.__expire()
+        while self.idle and self.queued:
+            worker_idx = self.idle.pop()
+            job = self.jobs[self.queued.popleft()]
+            job.status = "running"
+            job.worker_idx = worker_idx
+            self.cancels[worker_idx].clear()
+            self.tasks[worker_idx].put(job.spec)
+
+    def __collect(self) -> None:
+        while True:
+            try:
+                event = self.events.get(timeout=PROGRESS_INTERVAL)
+            except queue.Empty:
+                with self.lock:
+                    self.__replace_dead_workers()
+                continue
+            with self.lock:
+                self.__handle(event)
+
+    def __handle(self, event: tuple[Any, ...]) -> None:
+        kind = event[0]
+        if kind == "idle":
+            worker_idx, generation = event[1:]
+            if generation == self.generations[worker_idx]:
+                self.idle.append(worker_idx)
+                self.__dispatch()
+            return
+        job = self.jobs.get(event[1])
+        if job is None or job.status in FINISHED:
+            # failed with its dead worker
+            return
+        if kind == "started":
+            job.started = time.time()
+        elif kind == "progress":
+            job.opt_score, job.n_iterations = event[2], event[3]
+        elif kind == "finished":
+            status, job.opt_score, job.n_iterations, job.result = event[2:]
+            self.__finish(job, status)
+        elif kind == "failed":
+            job.error = event[2]
+            self.__finish(job, "failed")
+
+
+def parse_job(payload: dict[str, Any], default_deadline: float) -> JobSpec:
+    """Job of a ``POST /jobs`` body. Raises ``KeyError``, ``TypeError`` or
+    ``ValueError`` on malformed bodies."""
+    deadline = float(payload.get("deadline", default_deadline))
+    if not 0 < deadline < math.inf:
+        raise ValueError("deadline must be a positive number of seconds")
+    placement = payload.get("placement", "exact")
+    if placement not in ("exact", "height_map"):
+        raise ValueError(f"unknown placement {placement}")
+    max_iter = payload.get("max_iter")
+    return JobSpec(
+        uuid.uuid4().hex,
+        json_to_request(payload["request"]),
+        time.time() + deadline,
+        deadline,
+        None if max_iter is None else int(max_iter),
+        float(payload.get("temparature", 0.0)),
+        placement,
+        int(payload.get("seed", 0)),
+    )
+
+
+class SolveServer(ThreadingHTTPServer):
+    def __init__(
+        self,
+        address: tuple[str, int],
+        service: SolveService,
+        default_deadline: float = DEFAULT_DEADLINE,
+    ) -> None:
+        super().__init__(address, SolveHandler)
+        self.service = service
+        self.default_deadline = default_deadline
+
+
+class SolveHandler(BaseHTTPRequestHandler):
+    server: SolveServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        self.server.service.logger.debug(format % args)
+
+    def send_json(
+        self,
+        status: HTTPStatus,
+        payload: Union[dict[str, Any], str],
+        headers: Optional[dict[str, str]] = None,
+    ) -> None:
+        body = (
+            payload if isinstance(payload, str) else json.dumps(payload)
+        ).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: HTTPStatus, message: str) -> None:
+        self.send_json(status, {"error": message})
+
+    def job_path(self) -> tuple[Optional[str], bool]:
+        """Job id of the path, and whether the result is asked."""
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "jobs":
+            return parts[1], False
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+            return parts[1], True
+        return None, False
+
+    def do_POST(self) -> None:
+        if self.path.rstrip("/") != "/jobs":
+            self.send_error_json(HTTPStatus.NOT_FOUND, "not found")
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            spec = parse_job(
+                json.loads(self.rfile.read(length)),
+                self.server.default_deadline,
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, f"invalid job: {e!r}")
+            return
+        try:
+            job = self.server.service.submit(spec)
+        except queue.Full:
+            self.send_json(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                {"error": "queue is full"},
+                {"Retry-After": str(RETRY_AFTER)},
+            )
+            return
+        self.send_json(HTTPStatus.ACCEPTED, job.as_dict())
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/health":
+            self.send_json(HTTPStatus.OK, self.server.service.counts())
+            return
+        job_id, result = self.job_path()
+        job = None if job_id is None else self.server.service.get(job_id)
+        if job is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, "no such job")
+        elif not result:
+            self.send_json(HTTPStatus.OK, job.as_dict())
+        elif job.result is not None:
+            self.send_json(HTTPStatus.OK, job.result)
+        elif job.status in FINISHED:
+            self.send_error_json(
+                HTTPStatus.GONE, f"job {job.status} without a result"
+            )
+        else:
+            self.send_error_json(HTTPStatus.CONFLICT, f"job {job.status}")
+
+    def do_DELETE(self) -> None:
+        job_id, result = self.job_path()
+        job = (
+            None
+            if job_id is None or result
+            else self.server.service.cancel(job_id)
+        )
+        if job is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, "no such job")
+        else:
+            self.send_json(HTTPStatus.OK, job.as_dict())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--max-queued", type=int, default=64)
+    parser.add_argument(
+        "--cache", type=Path, help="SQLite file of the result cache"
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=DEFAULT_DEADLINE,
+        help="seconds per job unless the job sets its own",
+    )
+    args = parser.parse_args()
+
+    service = SolveService(
+        args.workers, args.max_queued, cache_path=args.cache
+    )
+    server = SolveServer((args.host, args.port), service, args.deadline)
+    service.logger.info(f"listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
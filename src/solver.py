@@ -1,14 +1,20 @@
 import copy
+import itertools
 import math
 import random
 import sys
 import time
-from typing import Iterator, TextIO
+from contextlib import closing
+from typing import Iterator, Optional, TextIO, TypeAlias
 
 import numpy as np
 
+from src.block_table import BlockTable, Snapshot
+from src.frames import loop_frames
+from src.instrumentation import JsonLinesSink, SolverStats
 from src.interface import (
     INF,
+    Acceptance,
     BinPackingRequest,
     Block,
     Corner,
@@ -18,30 +24,56 @@ from src.interface import (
     StripPackingResponse,
 )
 from src.logger import get_logger
-from src.utils import calc_top_height_and_corner
+from src.operators import OperatorSelector
+from src.placement import PlacementMode, PlacementState, new_placement_state
+from src.transposition import TranspositionTable
 from src.visualizer import Visulalizer
 
+# ("swap", position, position) or ("rotate", block index, axis)
+Move: TypeAlias = tuple[str, int, int]
+
 
 class StripPackingSolver:
     def __init__(
         self,
         request: StripPackingRequest,
-        rng: random.Random = random.Random(),
+        rng: Optional[random.Random] = None,
+        placement: PlacementMode = "exact",
+        adaptive_operators: bool = True,
+        memo_size: int = 1 << 16,
+        metrics_sink: Optional[JsonLinesSink] = None,
     ) -> None:
         start = time.time()
         self.request = request
-        self.rng = rng
+        # a fresh stream per solver unless one is given
+        self.rng = rng if rng is not None else random.Random()
+        self.placement = placement
+        self.operators = OperatorSelector(
+            ["swap", "rotate"], adaptive_operators
+        )
+        self.__stats = SolverStats(self.operators.stats)
+        # periodic snapshots of the stats while solving, if given
+        self.metrics_sink = metrics_sink
+        # blocks placed in all evaluations, the cost of the operators
+        self.n_placements = 0
+        # corners of placed order prefixes, disabled with a size of 0
+        self.memo = TranspositionTable(memo_size) if memo_size > 0 else None
         self.logger = get_logger(self.__class__.__name__, sys.stdout)
-        self.blocks = [block.copy() for block in self.request.blocks]
+        self.table = BlockTable(self.request.blocks)
         self.packing_order = self.__initialized_order()
 
-        score, corners = self.__calc_score_and_corners()
-        self.score: float = score
-        self.corners: list[Corner] = corners
+        self.state = self.__init_state()
+        self.trial = self.__init_state()
+        self.best_trial = self.__init_state()
+        self.score: float = self.__calc_score_and_corners()
+        self.__accept(self.score)
 
-        self.opt_score: float = score
-        self.opt_blocks: list[Block] = [block.copy() for block in self.blocks]
-        self.opt_corners: list[Corner] = corners
+        self.opt_score: float = self.score
+        self.opt_snapshot = self.__snapshot()
+        self.__materialized = (
+            self.opt_snapshot,
+            self.__materialize(self.opt_snapshot),
+        )
 
         self.visualizer = Visulalizer(self.request.container_shape)
         self.logger.info(
@@ -52,100 +84,118 @@ class StripPackingSolver:
         return [
             idx
             for idx, _ in sorted(
-                enumerate(self.blocks),
+                enumerate(self.request.blocks),
                 key=lambda t: (t[1].stackable, t[1].volume),
                 reverse=True,
             )
         ]
 
-    def __calc_score_and_corners(self) -> tuple[float, list[Corner]]:
-        (
-            container_depth,
-            container_width,
-            container_height,
-        ) = self.request.container_shape
-        blocks = [
-            Block(
-                "wall1",
-                (3 * INF, 3 * INF, 3 * INF),
-                0.0,
-                (0, 0, 0),
-                stackable=True,
-            ),
-            Block(
-                "wall2",
-                (3 * INF, 3 * INF, 3 * INF),
-                0.0,
-                (0, 0, 0),
-                stackable=True,
-            ),
-            Block(
-                "wall3",
-                (3 * INF, 3 * INF, 3 * INF),
-                0.0,
-                (0, 0, 0),
-                stackable=True,
-            ),
-            Block(
-                "wall4",
-                (3 * INF, 3 * INF, 3 * INF),
-                0.0,
-                (0, 0, 0),
-                stackable=True,
-            ),
-            Block(
-                "wall5",
-                (3 * INF, 3 * INF, 3 * INF),
-                0.0,
-                (0, 0, 0),
-                stackable=True,
-            ),
-            # Block(f"wall6", (3 * INF, 3 * INF, 3 * INF),
-            # (0, 0, 0), 0.0, stackable=True),
-        ]
-        n_walls = len(blocks)
-        _corners: list[Corner] = [
-            (-3 * INF, -INF, -INF),
-            (-INF, -3 * INF, -INF),
-            (-INF, -INF, -3 * INF),
-            (container_depth, -INF, -INF),
-            (-INF, container_width, -INF),
-            (-INF, -INF, container_height),
-        ][:n_walls]
-        max_height = 0.0
-        n_unstacked = 0
-        for order in self.packing_order:
-            block = self.blocks[order]
-            top_height, corner = calc_top_height_and_corner(
-                block, blocks, _corners
+    @property
+    def blocks(self) -> list[Block]:
+        """Copies of the blocks in their current orientations."""
+        return self.table.materialize()
+
+    @property
+    def configuration(self) -> tuple[list[int], list[int]]:
+        """The packing order and the current block orientations."""
+        return self.packing_order.copy(), self.table.orientations.tolist()
+
+    def set_configuration(
+        self, packing_order: list[int], orientations: list[int]
+    ) -> None:
+        """Replace the current solution and restart the best solution
+        tracking from it."""
+        self.packing_order = list(packing_order)
+        self.table.orientations[:] = orientations
+        self.score = self.__calc_score_and_corners()
+        self.__accept(self.score)
+        self.__save_opt()
+
+    def __init_state(self) -> PlacementState:
+        # no ceiling, the height is minimized
+        return new_placement_state(
+            self.placement,
+            self.request.container_shape,
+            self.request.n_blocks,
+            score_axis=2,
+            unstacked_penalty=INF,
+            has_ceiling=False,
+            memo=self.memo,
+        )
+
+    @property
+    def stats(self) -> SolverStats:
+        """Timers and counters, up to date."""
+        self.__stats.n_placements = self.n_placements
+        self.__stats.memo_hits, self.__stats.memo_misses = self.memo_stats
+        self.__stats.opt_score = self.opt_score
+        return self.__stats
+
+    @property
+    def memo_stats(self) -> tuple[int, int]:
+        """Hits and misses of the memo table."""
+        if self.memo is None:
+            return 0, 0
+        return self.memo.n_hits, self.memo.n_misses
+
+    def __calc_score_and_corners(
+        self, start: int = 0, cutoff: float = math.inf
+    ) -> float:
+        """Replay the packing order from position ``start`` into the trial
+        state, reusing the placements of the current state before it.
+
+        Returns ``math.inf`` as soon as the score is known to exceed
+        ``cutoff``.
+        """
+        orders = self.packing_order[start:]
+        with self.__stats.timer("placement"):
+            placed = self.trial.replay(
+                start,
+                self.table.current_shapes(orders),
+                self.table.stackable[orders],
+                self.state,
+                cutoff,
+                self.table.current_tokens(orders),
             )
-            if top_height >= INF:
-                n_unstacked += 1
-            else:
-                max_height = max(max_height, top_height)
-            blocks.append(block)
-            _corners.append(corner)
-        corners: list[Corner] = [(0.0, 0.0, 0.0)] * len(self.blocks)
-        for idx, order in enumerate(self.packing_order):
-            corners[order] = _corners[idx + n_walls]
-        score = max_height + n_unstacked * INF
-        return score, corners
+        self.n_placements += self.trial.n_placed - start
+        if not placed:
+            return math.inf
+        return self.trial.score
+
+    def __calc_cutoff(self, rnd: float, temparature: float) -> float:
+        """The highest score accepted with the random number ``rnd``."""
+        return self.score - math.log(rnd) * temparature
+
+    def __accept(self, score: float) -> None:
+        self.state, self.trial = self.trial, self.state
+        self.score = score
+
+    @property
+    def corners(self) -> list[Corner]:
+        corners: list[Corner] = [(0.0, 0.0, 0.0)] * self.request.n_blocks
+        for order, corner in zip(self.packing_order, self.state.corners):
+            corners[order] = corner
+        return corners
 
     def __swap(self, temparature: float) -> bool:
-        idx1, idx2 = self.rng.choices(range(self.request.n_blocks), k=2)
+        positions = self.table.choice_swap(self.packing_order, self.rng)
+        if positions is None:
+            return False
+        idx1, idx2 = positions
         # swap
         self.packing_order[idx1], self.packing_order[idx2] = (
             self.packing_order[idx2],
             self.packing_order[idx1],
         )
-        score, corners = self.__calc_score_and_corners()
-        diff = score - self.score
         rnd = 1e-9 + self.rng.random() * (1 - 1e-9)
+        score = self.__calc_score_and_corners(
+            min(idx1, idx2), self.__calc_cutoff(rnd, temparature)
+        )
+        diff = score - self.score
         transit = math.log(rnd) * temparature <= -diff
         if transit:
             # update
-            self.corners = corners
-            self.score = score
+            self.__accept(score)
         else:
             # rollback
             self.packing_order[idx1], self.packing_order[idx2] = (
@@ -156,32 +206,194 @@ class StripPackingSolver:
 
     def __rotate(self, temparature: float) -> bool:
         idx = self.rng.choice(range(self.request.n_blocks))
-        axis = self.blocks[idx].choice_rotate_axis(self.rng)
+        axis = self.table.choice_rotate_axis(idx, self.rng)
+        if axis is None:
+            return False
         # rotate
-        self.blocks[idx].rotate(axis)
-        score, corners = self.__calc_score_and_corners()
-        diff = score - self.score
+        self.table.rotate(idx, axis)
         rnd = 1e-9 + self.rng.random() * (1 - 1e-9)
+        score = self.__calc_score_and_corners(
+            self.packing_order.index(idx),
+            self.__calc_cutoff(rnd, temparature),
+        )
+        diff = score - self.score
         transit = math.log(rnd) * temparature <= -diff
         if transit:
             # update
-            self.corners = corners
-            self.score = score
+            self.__accept(score)
         else:
             # rollback
-            self.blocks[idx].rotate(axis)
+            self.table.rotate(idx, axis)
         return transit
 
+    def __snapshot(self) -> Snapshot:
+        corners = np.zeros((self.request.n_blocks, 3), np.float64)
+        corners[self.packing_order] = self.state.corner_array
+        return Snapshot(self.score, self.table.orientations.copy(), corners)
+
+    def __materialize(self, snapshot: Snapshot) -> StripPackingResponse:
+        return StripPackingResponse(
+            self.table.materialize(snapshot.orientations),
+            [
+                (back, left, bottom)
+                for back, left, bottom in snapshot.corners.tolist()
+            ],
+        )
+
+    def __save_opt(self) -> None:
+        self.opt_score = self.score
+        # replaced as a whole, so readers on other threads never see a
+        # partially updated solution
+        self.opt_snapshot = self.__snapshot()
+
+    def __update_opt(self) -> None:
+        if self.score <= self.opt_score:
+            self.__save_opt()
+
+    def best_response(self) -> StripPackingResponse:
+        """The best solution so far. Safe to call while solving.
+
+        Blocks are only materialized when the best solution has changed
+        since the last call.
+        """
+        snapshot = self.opt_snapshot
+        materialized_snapshot, response = self.__materialized
+        if materialized_snapshot is not snapshot:
+            response = self.__materialize(snapshot)
+            self.__materialized = (snapshot, response)
+        return response
+
+    @property
+    def opt_blocks(self) -> list[Block]:
+        return self.best_response().blocks
+
+    @property
+    def opt_corners(self) -> list[Corner]:
+        return self.best_response().corners
+
+    def __choice_operator(self, allow_rotate: bool) -> str:
+        return self.operators.choice(
+            self.rng, None if allow_rotate else ["swap"]
+        )
+
     def transit(self, allow_rotate: bool, temparature: float) -> bool:
-        if self.rng.random() < 0.5 or not allow_rotate:
-            transit = self.__swap(temparature)
-        else:
-            transit = self.__rotate(temparature)
-        if transit and self.score <= self.opt_score:
-            self.opt_score = self.score
-            self.opt_blocks = [block.copy() for block in self.blocks]
-            self.opt_corners = self.corners.copy()
-        return transit
+        with self.__stats.timer("bookkeeping"):
+            self.__stats.n_iterations += 1
+            score = self.score
+            n_placements = self.n_placements
+            operator = self.__choice_operator(allow_rotate)
+            if operator == "swap":
+                transit = self.__swap(temparature)
+            else:
+                transit = self.__rotate(temparature)
+            self.operators.record(
+                operator,
+                transit,
+                self.score < score,
+                self.n_placements - n_placements,
+            )
+            if transit:
+                self.__update_opt()
+            return transit
+
+    def __draw_move(self, allow_rotate: bool) -> Optional[Move]:
+        if self.__choice_operator(allow_rotate) == "swap":
+            positions = self.table.choice_swap(self.packing_order, self.rng)
+            if positions is None:
+                return None
+            return "swap", *positions
+        idx = self.rng.choice(range(self.request.n_blocks))
+        axis = self.table.choice_rotate_axis(idx, self.rng)
+        if axis is None:
+            return None
+        return "rotate", idx, axis
+
+    def __apply(self, move: Move) -> int:
+        """Apply ``move`` and return the first position of the order it
+        changes. Every move is its own inverse."""
+        kind, i, j = move
+        if kind == "swap":
+            self.packing_order[i], self.packing_order[j] = (
+                self.packing_order[j],
+                self.packing_order[i],
+            )
+            return min(i, j)
+        self.table.rotate(i, j)
+        return self.packing_order.index(i)
+
+    def transit_batch(
+        self,
+        allow_rotate: bool,
+        temparature: float,
+        n_candidates: int,
+        acceptance: Acceptance = "best",
+    ) -> bool:
+        """Evaluate ``n_candidates`` moves from the current state and apply
+        at most one of them.
+
+        With ``"best"`` the best candidate is accepted by the Metropolis
+        criterion. With ``"metropolis"`` every candidate is tested with its
+        own random number and the best one passing is applied.
+
+        Candidates are placed one after another, each from the prefix it
+        shares with the current state and cut off once it cannot be
+        accepted; they are not evaluated as one stacked array pass, since
+        every placement depends on the blocks placed before it.
+        """
+        with self.__stats.timer("bookkeeping"):
+            self.__stats.n_iterations += 1
+            moves = [
+                move
+                for move in (
+                    self.__draw_move(allow_rotate) for _ in range(n_candidates)
+                )
+                if move is not None
+            ]
+            rnds = 1e-9 + np.array([self.rng.random() for _ in moves]) * (
+                1 - 1e-9
+            )
+            if acceptance == "metropolis":
+                margins = -np.log(rnds) * temparature
+            else:
+                margins = np.full(len(moves), np.inf)
+            scores = np.full(len(moves), np.inf)
+            costs = [0] * len(moves)
+            best = -1
+            for idx, move in enumerate(moves):
+                # candidates that cannot pass or beat the best one are cut off
+                cutoff = self.score + margins[idx]
+                if best >= 0:
+                    cutoff = min(cutoff, scores[best])
+                n_placements = self.n_placements
+                scores[idx] = self.__calc_score_and_corners(
+                    self.__apply(move), cutoff
+                )
+                costs[idx] = self.n_placements - n_placements
+                self.__apply(move)
+                if scores[idx] - self.score > margins[idx]:
+                    continue
+                if best < 0 or scores[idx] < scores[best]:
+                    best = idx
+                    self.trial, self.best_trial = self.best_trial, self.trial
+            transit = (
+                best >= 0
+                and math.log(rnds[best]) * temparature
+                <= self.score - scores[best]
+            )
+            for idx, (move, cost) in enumerate(zip(moves, costs)):
+                self.operators.record(
+                    move[0],
+                    transit and idx == best,
+                    bool(scores[idx] < self.score),
+                    cost,
+                )
+            if not transit:
+                return False
+            self.__apply(moves[best])
+            self.trial, self.best_trial = self.best_trial, self.trial
+            self.__accept(float(scores[best]))
+            self.__update_opt()
+            return True
 
     def loop_render(
         self,
@@ -190,38 +402,128 @@ class StripPackingSolver:
         temparature: float,
         size: int,
         padding: int,
+        n_candidates: int = 1,
+        acceptance: Acceptance = "best",
+        max_fps: Optional[float] = None,
     ) -> Iterator[tuple[float, Image]]:
+        """Anneal ``max_iter`` iterations and yield the optimal score with
+        an image of the optimal solution. With ``n_candidates`` above 1
+        every iteration is a ``transit_batch``.
+
+        Without ``max_fps`` an image is rendered every 10 iterations. With
+        ``max_fps`` the search runs at full speed and images are rendered
+        on a background thread when the optimal solution improves, at most
+        ``max_fps`` per second.
+        """
+
+        def step() -> None:
+            if n_candidates > 1:
+                self.transit_batch(
+                    allow_rotate, temparature, n_candidates, acceptance
+                )
+            else:
+                self.transit(allow_rotate, temparature)
+
+        if max_fps is not None:
+            with closing(
+                loop_frames(
+                    step,
+                    lambda: self.opt_snapshot,
+                    lambda snapshot: self.render_snapshot(
+                        snapshot, size, padding
+                    ),
+                    max_iter,
+                    max_fps,
+                )
+            ) as frames:
+                for snapshot, image in frames:
+                    yield snapshot.score, image
+            return
         for n_iter in range(1, max_iter + 1):
             if n_iter % 10 == 0:
                 yield self.opt_score, self.render(size, padding)
-            self.transit(allow_rotate, temparature)
+            step()
 
     def render(self, size: int, padding: int) -> Image:
-        return self.visualizer.render(
-            self.opt_blocks, self.opt_corners, size, padding
-        )
+        with self.__stats.timer("render"):
+            response = self.best_response()
+            return self.visualizer.render(
+                response.blocks, response.corners, size, padding
+            )
+
+    def render_snapshot(
+        self, snapshot: Snapshot, size: int, padding: int
+    ) -> Image:
+        """Render a solution. Safe to call from other threads, since
+        snapshots are never modified."""
+        with self.__stats.timer("render"):
+            response = self.__materialize(snapshot)
+            return self.visualizer.render(
+                response.blocks, response.corners, size, padding
+            )
 
     def solve(
         self,
-        max_iter: int,
+        max_iter: Optional[int],
         allow_rotate: bool,
         temparature: float,
+        n_candidates: int = 1,
+        acceptance: Acceptance = "best",
+        time_limit: Optional[float] = None,
+        target_score: Optional[float] = None,
     ) -> StripPackingResponse:
+        """Anneal until ``max_iter`` iterations, ``time_limit`` seconds or
+        an optimal score of at most ``target_score``, whichever comes
+        first, and return the best solution."""
+        n_iter = 0
+        start = time.time()
+        deadline = None if time_limit is None else start + time_limit
         try:
             self.logger.info("start solving ...")
-            start = time.time()
-            for n_iter in range(max_iter):
+            for n_iter in itertools.count(1):
+                if max_iter is not None and n_iter > max_iter:
+                    break
+                if deadline is not None and time.time() >= deadline:
+                    self.logger.info("time limit reached")
+                    break
                 if self.opt_score <= self.request.container_shape[2]:
                     break
-                self.transit(allow_rotate, temparature)
+                if target_score is not None and self.opt_score <= target_score:
+                    break
+                if n_candidates > 1:
+                    self.transit_batch(
+                        allow_rotate, temparature, n_candidates, acceptance
+                    )
+                else:
+                    self.transit(allow_rotate, temparature)
+                if self.metrics_sink is not None and self.metrics_sink.due():
+                    self.metrics_sink.emit(
+                        self.stats, solver=self.__class__.__name__
+                    )
                 if n_iter % 100 == 0:
                     t = time.time() - start
                     self.logger.info(
-                        f"optimal score: {self.opt_score}"
-                        f"in {int(t * 100) / 100} seconds."
+                        f"optimal score: {self.opt_score} "
+                        f"in {int(t * 100) / 100} seconds "
+                        f"({n_iter / t:.1f} iterations/sec)."
                     )
+            n_iter -= 1
             self.logger.info("finish solving !")
         except KeyboardInterrupt:
             self.logger.info("keyboard interrupted")
-        response = StripPackingResponse(self.blocks, self.opt_corners)
-        return response
+        t = time.time() - start
+        self.logger.info(
+            f"{n_iter} iterations of {n_candidates} candidates "
+            f"in {int(t * 100) / 100} seconds "
+            f"({n_iter / max(t, 1e-9):.1f} iterations/sec, "
+            f"{n_iter * n_candidates / max(t, 1e-9):.1f} evaluations/sec)."
+        )
+        self.logger.info(f"operators: {self.operators.summary()}")
+        n_hits, n_misses = self.memo_stats
+        self.logger.info(f"memo: {n_hits} hits, {n_misses} misses")
+        self.logger.info(f"seconds: {self.stats.summary()}")
+        if self.metrics_sink is not None:
+            self.metrics_sink.emit(
+                self.stats, solver=self.__class__.__name__, final=True
+            )
+        return self.best_response()
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Optional
+
+from src.interface import Corner
+
+# modulus and multiplier of the rolling hash of an order prefix
+HASH_MODULUS = (1 << 61) - 1
+HASH_MULTIPLIER = 1_000_003
+
+
+def extend_hash(prefix_hash: int, token: int) -> int:
+    """Rolling hash of a prefix extended by one block."""
+    return (prefix_hash * HASH_MULTIPLIER + token) % HASH_MODULUS
+
+
+class TranspositionTable:
+    """LRU map from the rolling hash of a packing order prefix to the corner
+    of the last block of the prefix.
+
+    The corner of a block only depends on the blocks before it, so a
+    prefix that was placed before is replayed from the table without a
+    placement. At most ``max_entries`` corners are kept, roughly 200
+    bytes each. Two different prefixes share a key with a probability of
+    about one in 2**61 per pair.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.corners: OrderedDict[int, Corner] = OrderedDict()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def __len__(self) -> int:
+        return len(self.corners)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.n_hits / max(self.n_hits + self.n_misses, 1)
+
+    def get(self, key: int) -> Optional[Corner]:
+        corner = self.corners.get(key)
+        if corner is None:
+            self.n_misses += 1
+            return None
+        self.n_hits += 1
+        self.corners.move_to_end(key)
+        return corner
+
+    def put(self, key: int, corner: Corner) -> None:
+        self.corners[key] = corner
+        if len(self.corners) > self.max_entries:
+            self.corners.popitem(last=False)
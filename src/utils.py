@@ -1,118 +1,236 @@
-from typing import Optional
+from typing import Any, Optional
 
 import numpy as np
 import numpy.typing as npt
 
-from src.error import NoStablePointFound, NoStackablePointFound
-from src.interface import INF, Block, Box, Corner, Shape
+from src import kernel
+from src.error import NoStablePointFound
+from src.interface import INF, Block, Corner, Shape
 
-Length = float
-Flag = int
-Order = int
-Event = tuple[Length, Flag, Order]
+FloatArray = npt.NDArray[np.float64]
+IntArray = npt.NDArray[np.int64]
+BoolArray = npt.NDArray[np.bool_]
+Index = tuple[int, int, int]
 
 
 def __calc_no_fit_poly(
-    new_shape: Shape, shapes: list[Shape], corners: list[Corner]
-) -> list[Box]:
-    nfps: list[Box] = []
-    new_depth, new_width, new_height = new_shape
-    for shape, corner in zip(shapes, corners):
-        depth, width, height = shape
-        back, left, bottom = corner
-        box_back = back - new_depth
-        box_left = left - new_width
-        box_height = bottom - new_height
-        box_front = back + depth
-        box_right = left + width
-        box_top = bottom + height
-        nfps.append(
-            (box_back, box_front, box_left, box_right, box_height, box_top)
-        )
-    return nfps
+    new_shape: Shape, shapes: FloatArray, corners: FloatArray
+) -> tuple[FloatArray, FloatArray]:
+    """Return the no-fit boxes as start and end coordinates per axis.
 
+    The i-th no-fit box is the region of corners at which the new block
+    would overlap the i-th placed box.
+    """
+    starts = corners - np.asarray(new_shape, np.float64)
+    ends = corners + shapes
+    return starts, ends
 
-def __calc_events(
-    nfps: list[Box],
-) -> tuple[list[Event], list[Event], list[Event]]:
-    xs = sorted(
-        [(box[0], 1, idx) for idx, box in enumerate(nfps)]
-        + [(box[1], -1, idx) for idx, box in enumerate(nfps)]
-    )
-    ys = sorted(
-        [(box[2], 1, idx) for idx, box in enumerate(nfps)]
-        + [(box[3], -1, idx) for idx, box in enumerate(nfps)]
-    )
-    zs = sorted(
-        [(box[4], 1, idx) for idx, box in enumerate(nfps)]
-        + [(box[5], -1, idx) for idx, box in enumerate(nfps)]
-    )
-    return xs, ys, zs
+
+def __calc_event_orders(
+    starts: FloatArray, ends: FloatArray
+) -> tuple[FloatArray, IntArray, IntArray]:
+    """Sort the start/end events of one axis.
+
+    Events are ordered by ``(coordinate, flag, box index)`` where the flag
+    is ``1`` for starts and ``-1`` for ends, so that an end precedes a start
+    at the same coordinate. Returns the sorted coordinates together with the
+    position of every start and end event in that order.
+    """
+    n_boxes = len(starts)
+    coords = np.concatenate((starts, ends))
+    flags = np.repeat(np.array([1, -1], np.int64), n_boxes)
+    idxs = np.tile(np.arange(n_boxes, dtype=np.int64), 2)
+    events = np.lexsort((idxs, flags, coords))
+    orders = np.empty(2 * n_boxes, np.int64)
+    orders[events] = np.arange(2 * n_boxes, dtype=np.int64)
+    return coords[events], orders[:n_boxes], orders[n_boxes:]
+
+
+def __calc_coverage(
+    y_idxs: IntArray,
+    z_idxs: IntArray,
+    lefts: IntArray,
+    rights: IntArray,
+    bottoms: IntArray,
+    tops: IntArray,
+) -> FloatArray:
+    """Count the boxes covering every cell of the ``z_idxs x y_idxs`` grid."""
+    in_z = (bottoms <= z_idxs[:, np.newaxis]) & (z_idxs[:, np.newaxis] < tops)
+    in_y = (lefts <= y_idxs[:, np.newaxis]) & (y_idxs[:, np.newaxis] < rights)
+    coverage: FloatArray = in_z.astype(np.float64) @ in_y.T.astype(np.float64)
+    return coverage
 
 
 def __calc_stable_index(
-    n_boxes: int,
-    xs: list[Event],
-    ys: list[Event],
-    zs: list[Event],
-    stackable: list[bool],
+    backs: IntArray,
+    fronts: IntArray,
+    lefts: IntArray,
+    rights: IntArray,
+    bottoms: IntArray,
+    tops: IntArray,
+) -> Index:
+    """Find the first stable cell in (back, bottom, left) order.
+
+    Arguments are the no-fit boxes as half-open intervals of event orders.
+    A cell is stable if no box covers it while the neighbouring cells
+    behind, to the left and below are all covered. Such a cell is always
+    located at the front of a box in the x direction, at the right of a box
+    in the y direction and at the top of a box in the z direction, so only
+    those candidates are tested, slab by slab.
+    """
+    for x_idx in np.sort(fronts):
+        active = (backs <= x_idx) & (x_idx < fronts)
+        # the event orders are distinct, so exactly one box ends at x_idx
+        # and it is the only one that can cover the cell behind
+        (behind,) = np.flatnonzero(fronts == x_idx)
+        slab_lefts, slab_rights = lefts[active], rights[active]
+        slab_bottoms, slab_tops = bottoms[active], tops[active]
+        z_idxs = np.unique(slab_tops)
+        z_idxs = z_idxs[(bottoms[behind] <= z_idxs) & (z_idxs < tops[behind])]
+        y_idxs = np.sort(slab_rights)
+        y_idxs = y_idxs[(lefts[behind] <= y_idxs) & (y_idxs < rights[behind])]
+        if len(z_idxs) == 0 or len(y_idxs) == 0:
+            continue
+        slab = (slab_lefts, slab_rights, slab_bottoms, slab_tops)
+        here = __calc_coverage(y_idxs, z_idxs, *slab)
+        left = __calc_coverage(y_idxs - 1, z_idxs, *slab)
+        below = __calc_coverage(y_idxs, z_idxs - 1, *slab)
+        stable = (here == 0) & (left > 0) & (below > 0)
+        if stable.any():
+            z_pos, y_pos = np.unravel_index(np.argmax(stable), stable.shape)
+            return int(x_idx), int(y_idxs[y_pos]), int(z_idxs[z_pos])
+    raise NoStablePointFound
+
+
+def calc_stable_corner(
+    new_shape: Shape,
     new_block_is_stackable: bool,
-    ceil_idx: Optional[int],
-) -> tuple[int, ...]:
-    x_idx_flag_to_order = {
-        (idx, flag): order for order, (_, flag, idx) in enumerate(xs)
-    }
-    y_idx_flag_to_order = {
-        (idx, flag): order for order, (_, flag, idx) in enumerate(ys)
-    }
-    z_idx_flag_to_order = {
-        (idx, flag): order for order, (_, flag, idx) in enumerate(zs)
-    }
-    size = 2 * n_boxes
-    overlaps = np.zeros((size, size, size), np.int32)
-    for idx in range(n_boxes):
-        back_order = x_idx_flag_to_order[idx, 1]
-        front_order = x_idx_flag_to_order[idx, -1]
-        left_order = y_idx_flag_to_order[idx, 1]
-        right_order = y_idx_flag_to_order[idx, -1]
-        if new_block_is_stackable or idx == ceil_idx:
-            bottom_order = z_idx_flag_to_order[idx, 1]
-        else:
-            bottom_order = 0
-        if stackable[idx]:
-            top_order = z_idx_flag_to_order[idx, -1]
-        else:
-            top_order = size - 1
-
-        overlaps[back_order, left_order, bottom_order] += 1
-        overlaps[front_order, left_order, bottom_order] -= 1
-        overlaps[back_order, right_order, bottom_order] -= 1
-        overlaps[back_order, left_order, top_order] -= 1
-        overlaps[back_order, right_order, top_order] += 1
-        overlaps[front_order, left_order, top_order] += 1
-        overlaps[front_order, right_order, bottom_order] += 1
-        overlaps[front_order, right_order, top_order] -= 1
-    overlaps = np.cumsum(
-        np.cumsum(np.cumsum(overlaps, axis=2), axis=1), axis=0
+    shapes: FloatArray,
+    corners: FloatArray,
+    stackable: BoolArray,
+    ceil_idx: Optional[int] = None,
+) -> Corner:
+    """Return the first stable corner in (back, bottom, left) order.
+
+    ``shapes`` and ``corners`` are ``(n, 3)`` arrays of the placed boxes and
+    ``stackable`` is their ``(n,)`` flag array. The box at ``ceil_idx`` may
+    be placed under even if the new block is not stackable.
+    Raises ``NoStablePointFound`` if there is no stable corner.
+
+    Uses the Numba kernel of ``src.kernel`` if it is enabled.
+    """
+    if kernel.USE_NUMBA:
+        found, back, left, bottom = kernel.stable_corner_kernel(
+            np.asarray(new_shape, np.float64),
+            new_block_is_stackable,
+            shapes,
+            corners,
+            stackable,
+            -1 if ceil_idx is None else ceil_idx,
+        )
+        if not found:
+            raise NoStablePointFound
+        return back, left, bottom
+    starts, ends = __calc_no_fit_poly(new_shape, shapes, corners)
+    n_boxes = len(starts)
+    xs, backs, fronts = __calc_event_orders(starts[:, 0], ends[:, 0])
+    ys, lefts, rights = __calc_event_orders(starts[:, 1], ends[:, 1])
+    zs, bottoms, tops = __calc_event_orders(starts[:, 2], ends[:, 2])
+    if not new_block_is_stackable:
+        # nothing can be placed on the new block
+        ceil_bottom = bottoms[ceil_idx] if ceil_idx is not None else None
+        bottoms = np.zeros(n_boxes, np.int64)
+        if ceil_bottom is not None:
+            bottoms[ceil_idx] = ceil_bottom
+    # nothing can be placed on unstackable boxes
+    tops = np.where(stackable, tops, 2 * n_boxes - 1)
+    x_idx, y_idx, z_idx = __calc_stable_index(
+        backs, fronts, lefts, rights, bottoms, tops
     )
-    shifted_back = np.roll(overlaps, shift=1, axis=0)
-    shifted_left = np.roll(overlaps, shift=1, axis=1)
-    shifted_down = np.roll(overlaps, shift=1, axis=2)
-    stable: npt.NDArray[np.int32] = (
-        (overlaps == 0)
-        & (shifted_back > 0)
-        & (shifted_left > 0)
-        & (shifted_down > 0)
+    return float(xs[x_idx]), float(ys[y_idx]), float(zs[z_idx])
+
+
+def __calc_window_max(
+    values: npt.NDArray[Any], size: int, axis: int
+) -> npt.NDArray[Any]:
+    """Max over every window of ``size`` along ``axis`` by doubling spans."""
+    values = np.moveaxis(values, axis, 0)
+    span = 1
+    while 2 * span <= size:
+        values = np.maximum(values[:-span], values[span:])
+        span *= 2
+    if span < size:
+        values = np.maximum(values[: span - size], values[size - span :])
+    return np.moveaxis(values, 0, axis)
+
+
+def __calc_sliding_max(
+    values: npt.NDArray[Any], depth: int, width: int
+) -> npt.NDArray[Any]:
+    """Max over every ``depth x width`` window, computed axis by axis."""
+    rows = __calc_window_max(values, depth, axis=0)
+    return __calc_window_max(rows, width, axis=1)
+
+
+def grid_shape(shape: Shape) -> tuple[int, int, int]:
+    """Round a shape up to whole grid cells."""
+    depth, width, height = np.ceil(np.asarray(shape, np.float64) - 1e-9)
+    return int(depth), int(width), int(height)
+
+
+def calc_height_map_corner(
+    height_map: IntArray,
+    blocked: BoolArray,
+    shape: tuple[int, int, int],
+    max_height: Optional[int] = None,
+) -> tuple[int, int, int]:
+    """Return the first (back, bottom, left) grid corner on a height map.
+
+    ``height_map`` holds the top height of every floor cell and ``blocked``
+    marks the cells under an unstackable block. The block rests on the
+    highest cell of its footprint, so every corner found is stable, but
+    space under overhangs is never used.
+    Raises ``NoStablePointFound`` if the block does not fit anywhere.
+    """
+    depth, width, height = shape
+    n_rows, n_cols = height_map.shape
+    if depth > n_rows or width > n_cols:
+        raise NoStablePointFound
+    bottoms = __calc_sliding_max(height_map, depth, width)
+    valid = ~__calc_sliding_max(blocked, depth, width)
+    if max_height is not None:
+        valid &= bottoms + height <= max_height
+    rows = np.flatnonzero(valid.any(axis=1))
+    if len(rows) == 0:
+        raise NoStablePointFound
+    x_idx = int(rows[0])
+    row_bottoms = np.where(
+        valid[x_idx], bottoms[x_idx], np.iinfo(np.int64).max
     )
-    stable_indices: list[tuple[int, ...]] = list(zip(*np.where(stable)))
-    stable_indices.sort(key=lambda t: (t[0], t[2], t[1]))
-    if len(stable_indices) > 0:
-        return stable_indices[0]
-    else:
-        if np.sum(stable) > 0:
-            raise NoStackablePointFound
-        else:
-            raise NoStablePointFound
+    y_idx = int(np.argmin(row_bottoms))
+    return x_idx, y_idx, int(bottoms[x_idx, y_idx])
+
+
+def __place(
+    block: Block,
+    blocks: list[Block],
+    corners: list[Corner],
+    ceil_idx: Optional[int],
+) -> Optional[Corner]:
+    shapes = np.array([block.shape for block in blocks], np.float64)
+    _corners = np.array(corners, np.float64)
+    stackable = np.array([block.stackable for block in blocks], np.bool_)
+    try:
+        return calc_stable_corner(
+            block.shape,
+            block.stackable,
+            shapes,
+            _corners,
+            stackable,
+            ceil_idx,
+        )
+    except NoStablePointFound:
+        return None
 
 
 def calc_container_score_and_corner(
@@ -121,22 +239,21 @@ def calc_container_score_and_corner(
     corners: list[Corner],
     ceil_idx: Optional[int] = None,
 ) -> tuple[float, Corner]:
-    new_shape = block.shape
-    shapes = [block.shape for block in blocks]
-    nfps = __calc_no_fit_poly(new_shape, shapes, corners)
-    n_boxes = len(nfps)
-    xs, ys, zs = __calc_events(nfps)
-    stackable = [block.stackable for block in blocks]
-    try:
-        x_idx, y_idx, z_idx = __calc_stable_index(
-            n_boxes, xs, ys, zs, stackable, block.stackable, ceil_idx
-        )
-    except NoStackablePointFound:
+    corner = __place(block, blocks, corners, ceil_idx)
+    if corner is None:
         return INF, (INF, INF, INF)
-    except NoStablePointFound:
+    front_depth = corner[0] + block.shape[0]
+    return front_depth, corner
+
+
+def calc_top_height_and_corner(
+    block: Block,
+    blocks: list[Block],
+    corners: list[Corner],
+    ceil_idx: Optional[int] = None,
+) -> tuple[float, Corner]:
+    corner = __place(block, blocks, corners, ceil_idx)
+    if corner is None:
         return INF, (INF, INF, INF)
-    x_coord = xs[x_idx][0]
-    y_coord = ys[y_idx][0]
-    z_coord = zs[z_idx][0]
-    front_depth = x_coord + new_shape[0]
-    return front_depth, (x_coord, y_coord, z_coord)
+    top_height = corner[2] + block.shape[2]
+    return top_height, corner
@@ -1,10 +1,35 @@
 import math
-from typing import Literal
+from typing import Literal, Optional
 
 import cv2
 import numpy as np
+import numpy.typing as npt
 
 from src.interface import INF, Block, Color, Corner, Image, Shape
+from src.utils import BoolArray, FloatArray
+
+PixelArray = npt.NDArray[np.int32]
+
+# vertices of a box relative to its corner, in units of its shape, in the
+# order d, w, h, wh, dh, dw, dwh
+BOX_VERTICES = np.array(
+    [
+        [1, 0, 0],
+        [0, 1, 0],
+        [0, 0, 1],
+        [0, 1, 1],
+        [1, 0, 1],
+        [1, 1, 0],
+        [1, 1, 1],
+    ],
+    np.float64,
+)
+# the visible faces, front, right and top, as indexes of BOX_VERTICES and
+# how much each one is whitened
+BOX_FACES = np.array([[0, 4, 6, 5], [1, 5, 6, 3], [2, 3, 6, 4]])
+FACE_WHITENING = (0.0, 0.25, 0.5)
+# the crosses drawn on the faces of unstackable blocks, two lines per face
+BOX_CROSSES = np.array([[[0, 6], [5, 4]], [[1, 6], [3, 5]], [[2, 6], [3, 4]]])
 
 
 class Visulalizer:
@@ -26,34 +51,60 @@ class Visulalizer:
         self.depth_vector = (cos15 * container_depth, sin15 * container_depth)
         self.width_vector = (-cos15 * container_width, sin15 * container_width)
         self.height_vecotr = (0.0, -container_height)
+        # maps positions in the container to positions in the image
+        self.projection = (
+            np.array(
+                (self.depth_vector, self.width_vector, self.height_vecotr)
+            )
+            / np.array(self.container_shape)[:, np.newaxis]
+        )
         self.container_depth = container_depth
         self.container_width = container_width
         self.container_height = container_height
+        # white images with the back of the container, per size and padding
+        self.__backgrounds: dict[tuple[int, int], Image] = {}
 
     def rescale(self, x: float, size: int, padding: int) -> int:
         return int(size * x / self.image_size) + padding
 
+    def image_shape(self, size: int, padding: int) -> tuple[int, int, int]:
+        return (
+            self.rescale(self.image_height, size, padding) + padding,
+            self.rescale(self.image_width, size, padding) + padding,
+            3,
+        )
+
+    def background(self, size: int, padding: int) -> Image:
+        """The image without blocks, drawn once per size and padding. Must
+        not be modified."""
+        if (size, padding) not in self.__backgrounds:
+            image = np.full(
+                self.image_shape(size, padding), (255, 255, 255), np.uint8
+            )
+            self.__backgrounds[size, padding] = self.draw_container(
+                image,
+                (0.0, 0.0, 0.0),
+                self.container_shape,
+                size,
+                padding,
+                "back",
+            )
+        return self.__backgrounds[size, padding]
+
+    def project(
+        self, points: FloatArray, size: int, padding: int
+    ) -> PixelArray:
+        """Image positions, of shape (..., 2), of points in the container,
+        of shape (..., 3)."""
+        xy = points @ self.projection + self.origin_pos
+        pixels: PixelArray = (size * xy / self.image_size).astype(np.int32)
+        return pixels + padding
+
     def corner_to_pos(
         self, corner: Corner, size: int, padding: int
     ) -> tuple[int, int]:
-        back, left, bottom = corner
-        ox, oy = self.origin_pos
-        vdx, vdy = self.depth_vector
-        vwx, vwy = self.width_vector
-        vhx, vhy = self.height_vecotr
-        x = (
-            ox
-            + back * vdx / self.container_depth
-            + left * vwx / self.container_width
-            + bottom * vhx / self.container_height
-        )
-        y = (
-            oy
-            + back * vdy / self.container_depth
-            + left * vwy / self.container_width
-            + bottom * vhy / self.container_height
-        )
-        return self.rescale(x, size, padding), self.rescale(y, size, padding)
+        x, y = self.project(np.array(corner), size, padding).tolist()
+        return x, y
 
     def draw_container(
         self,
@@ -100,97 +151,128 @@ class Visulalizer:
             raise NotImplementedError
         return image
 
-    def draw_box(
+    def covered_faces(
+        self, corners: FloatArray, shapes: FloatArray
+    ) -> BoolArray:
+        """Which faces of boxes, front, right and top, are covered by an
+        adjacent box with the same corner on the other axes.
+
+        The covering box comes later in the drawing order and paints over
+        the whole face, so covered faces do not need to be drawn. In dense
+        packings most faces are covered.
+        """
+        n = len(corners)
+        # corners of the boxes adjacent to the front, right and top faces
+        neighbor_corners = corners[np.newaxis].repeat(3, axis=0)
+        neighbor_corners[[0, 1, 2], :, [0, 1, 2]] += shapes.T
+        points = np.concatenate([corners, neighbor_corners.reshape(-1, 3)])
+        # ids of distinct points, from a lexicographic sort
+        by_point = np.lexsort(points.T[::-1])
+        sorted_points = points[by_point]
+        is_new = np.ones(len(points), np.bool_)
+        is_new[1:] = (sorted_points[1:] != sorted_points[:-1]).any(axis=1)
+        ids = np.empty(len(points), np.int64)
+        ids[by_point] = np.cumsum(is_new) - 1
+        boxes = np.full(ids.max(initial=-1) + 1, -1)
+        boxes[ids[:n]] = np.arange(n)
+        neighbors = boxes[ids[n:]].reshape(3, n).T
+        covered: BoolArray = neighbors >= 0
+        for axis in range(3):
+            found = covered[:, axis]
+            others = [other for other in range(3) if other != axis]
+            covered[found, axis] = np.all(
+                shapes[neighbors[found, axis]][:, others]
+                >= shapes[found][:, others],
+                axis=1,
+            )
+        return covered
+
+    def draw_boxes(
         self,
         image: Image,
-        corner: Corner,
-        block: Block,
+        blocks: list[Block],
+        corners: list[Corner],
         size: int,
         padding: int,
     ) -> Image:
-        def whiten(color: Color, beta: float) -> Color:
-            return (
-                int(color[0] + beta * (255 - color[0])),
-                int(color[1] + beta * (255 - color[1])),
-                int(color[2] + beta * (255 - color[2])),
-            )
+        """Draw packed blocks back to front, sorted by corner."""
+        shades: dict[Color, list[Color]] = {}
 
-        back, left, bottom = corner
-        depth, width, height = block.shape
-        d = self.corner_to_pos((back + depth, left, bottom), size, padding)
-        w = self.corner_to_pos((back, left + width, bottom), size, padding)
-        h = self.corner_to_pos((back, left, bottom + height), size, padding)
-        wh = self.corner_to_pos(
-            (back, left + width, bottom + height), size, padding
-        )
-        dh = self.corner_to_pos(
-            (back + depth, left, bottom + height), size, padding
-        )
-        dw = self.corner_to_pos(
-            (back + depth, left + width, bottom), size, padding
-        )
-        dwh = self.corner_to_pos(
-            (back + depth, left + width, bottom + height), size, padding
-        )
-        cv2.fillPoly(
-            image,
-            [np.array((d, dh, dwh, dw)).reshape((-1, 1, 2)).astype(np.int32)],
-            whiten(block.color, 0.0),
-            cv2.LINE_AA,
-        )
-        cv2.fillPoly(
-            image,
-            [np.array((w, dw, dwh, wh)).reshape((-1, 1, 2)).astype(np.int32)],
-            whiten(block.color, 0.25),
-            cv2.LINE_AA,
-        )
-        cv2.fillPoly(
-            image,
-            [np.array((h, wh, dwh, dh)).reshape((-1, 1, 2)).astype(np.int32)],
-            whiten(block.color, 0.5),
-            cv2.LINE_AA,
+        def whiten(color: Color) -> list[Color]:
+            if color not in shades:
+                shades[color] = [
+                    (
+                        int(color[0] + beta * (255 - color[0])),
+                        int(color[1] + beta * (255 - color[1])),
+                        int(color[2] + beta * (255 - color[2])),
+                    )
+                    for beta in FACE_WHITENING
+                ]
+            return shades[color]
+
+        corner_array = np.array(corners, np.float64).reshape(-1, 3)
+        order = np.lexsort(corner_array.T[::-1])
+        order = order[corner_array[order, 2] < INF]
+        corner_array = corner_array[order]
+        shapes = np.array(
+            [blocks[idx].shape for idx in order.tolist()], np.float64
+        ).reshape(-1, 3)
+        vertices = self.project(
+            corner_array[:, np.newaxis] + BOX_VERTICES * shapes[:, np.newaxis],
+            size,
+            padding,
         )
-        if not block.stackable:
-            cv2.line(image, d, dwh, (0, 0, 0), 1, cv2.LINE_AA)
-            cv2.line(image, dw, dh, (0, 0, 0), 1, cv2.LINE_AA)
-            cv2.line(image, w, dwh, (0, 0, 0), 1, cv2.LINE_AA)
-            cv2.line(image, wh, dw, (0, 0, 0), 1, cv2.LINE_AA)
-            cv2.line(image, h, dwh, (0, 0, 0), 1, cv2.LINE_AA)
-            cv2.line(image, wh, dh, (0, 0, 0), 1, cv2.LINE_AA)
+        faces = np.ascontiguousarray(vertices[:, BOX_FACES])
+        crosses = np.ascontiguousarray(vertices[:, BOX_CROSSES])
+        visible = ~self.covered_faces(corner_array, shapes)
+        blocks_order = order.tolist()
+        visible_faces = visible.tolist()
+        for i in np.flatnonzero(visible.any(axis=1)).tolist():
+            block = blocks[blocks_order[i]]
+            colors = whiten(block.display_color)
+            for face, face_visible in enumerate(visible_faces[i]):
+                if face_visible:
+                    cv2.fillPoly(
+                        image, [faces[i, face]], colors[face], cv2.LINE_AA
+                    )
+            if not block.stackable:
+                cv2.polylines(
+                    image,
+                    list(crosses[i, visible[i]].reshape(-1, 2, 2)),
+                    False,
+                    (0, 0, 0),
+                    1,
+                    cv2.LINE_AA,
+                )
         return image
 
+    def draw_box(
+        self,
+        image: Image,
+        corner: Corner,
+        block: Block,
+        size: int,
+        padding: int,
+    ) -> Image:
+        return self.draw_boxes(image, [block], [corner], size, padding)
+
     def render(
         self,
         blocks: list[Block],
         corners: list[Corner],
         size: int,
         padding: int,
+        out: Optional[Image] = None,
     ) -> Image:
-        image = np.full(
-            (
-                self.rescale(self.image_height, size, padding) + padding,
-                self.rescale(self.image_width, size, padding) + padding,
-                3,
-            ),
-            (255, 255, 255),
-            np.uint8,
-        )
-        image = self.draw_container(
-            image,
-            (0.0, 0.0, 0.0),
-            self.container_shape,
-            size,
-            padding,
-            "back",
-        )
-
-        def key(t: tuple[Block, Corner]) -> Corner:
-            return t[1]
-
-        for block, corner in sorted(zip(blocks, corners), key=key):
-            bottom = corner[2]
-            if bottom < INF:
-                image = self.draw_box(image, corner, block, size, padding)
+        """Draw the blocks in the container, into ``out`` if given, which
+        must have the image shape."""
+        background = self.background(size, padding)
+        if out is None:
+            image = background.copy()
+        else:
+            image = out
+            np.copyto(image, background)
+        image = self.draw_boxes(image, blocks, corners, size, padding)
         image = self.draw_container(
             image,
             (0.0, 0.0, 0.0),
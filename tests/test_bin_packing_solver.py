@@ -0,0 +1,37 @@
+import logging
+import random
+import unittest
+
+from src.bin_packing_solver import BinPackingSolver
+from src.data_generator import generate_bin_packing_request
+
+
+def setUpModule() -> None:
+    logging.disable(logging.INFO)
+
+
+def tearDownModule() -> None:
+    logging.disable(logging.NOTSET)
+
+
+class TestShift(unittest.TestCase):
+    def test_shift_into_one_container(self) -> None:
+        request = generate_bin_packing_request(10, 40, 3, 0, 2, 0)
+        for seed in range(10):
+            solver = BinPackingSolver(
+                request, random.Random(seed), assignment=[[0], [1, 2]]
+            )
+            for _ in range(50):
+                solver.transit_shift(1e9)
+                solver.transit_batch(1e9, 4)
+            self.assertEqual(
+                sorted(sum(solver.assigned_block_idxs, [])), [0, 1, 2]
+            )
+            solver.assign(0, [0, 1, 2])
+            solver.assign(1, [])
+            self.assertFalse(solver.transit_shift(1e9))
+            self.assertEqual(solver.assigned_block_idxs, [[0, 1, 2], []])
+
+
+if __name__ == "__main__":
+    unittest.main()
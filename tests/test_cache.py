@@ -0,0 +1,122 @@
+import json
+import logging
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.batch import solve_file
+from src.bin_packing_solver import BinPackingSolver
+from src.cache import ResultCache
+from src.converter import request_to_excel
+from src.data_generator import generate_bin_packing_request
+from src.interface import BinPackingRequest, BinPackingResponse
+
+
+def setUpModule() -> None:
+    logging.disable(logging.INFO)
+
+
+def tearDownModule() -> None:
+    logging.disable(logging.NOTSET)
+
+
+def solve(request: BinPackingRequest) -> BinPackingResponse:
+    return BinPackingSolver(request, random.Random(0)).solve(20, 1.0)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / "cache.sqlite"
+        self.request = generate_bin_packing_request(20, 60, 8, 2, 2, 0)
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_hit_under_permutation(self) -> None:
+        cache = ResultCache(self.path)
+        response = cache.get_or_solve(self.request, solve)
+        permutation = list(range(self.request.n_blocks))
+        random.Random(1).shuffle(permutation)
+        permuted = BinPackingRequest(
+            [self.request.blocks[i].copy() for i in permutation],
+            self.request.containers,
+        )
+        for block in permuted.blocks:
+            block.name = f"renamed {block.name}"
+        cached = cache.get(permuted)
+        assert isinstance(cached, BinPackingResponse)
+        # the stored response is remapped to the indices of the caller
+        for pos, idx in enumerate(permutation):
+            self.assertEqual(
+                cached.blocks[pos].name, permuted.blocks[pos].name
+            )
+            self.assertEqual(
+                cached.blocks[pos].shape, response.blocks[idx].shape
+            )
+            self.assertEqual(cached.corners[pos], response.corners[idx])
+            self.assertEqual(
+                cached.container_indexes[pos], response.container_indexes[idx]
+            )
+        self.assertIsNone(cache.get(self.request, {"seed": 1}))
+        cache.close()
+
+    def test_lru_eviction(self) -> None:
+        cache = ResultCache(self.path, max_entries=2)
+        requests = [
+            generate_bin_packing_request(20, 60, 4, 0, 1, seed)
+            for seed in range(3)
+        ]
+        cache.put(requests[0], solve(requests[0]))
+        cache.put(requests[1], solve(requests[1]))
+        # used last, so the second request is evicted instead
+        self.assertIsNotNone(cache.get(requests[0]))
+        cache.put(requests[2], solve(requests[2]))
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get(requests[0]))
+        self.assertIsNone(cache.get(requests[1]))
+        self.assertIsNotNone(cache.get(requests[2]))
+        cache.close()
+
+    def test_solver_version(self) -> None:
+        cache = ResultCache(self.path, version="1")
+        cache.put(self.request, solve(self.request))
+        cache.close()
+        cache = ResultCache(self.path, version="1")
+        self.assertIsNotNone(cache.get(self.request))
+        cache.close()
+        cache = ResultCache(self.path, version="2")
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get(self.request))
+        cache.close()
+
+    def test_batch(self) -> None:
+        request_path = Path(self.dir.name) / "request.xlsx"
+        request_to_excel(self.request, request_path)
+        results, outputs = [], []
+        for name in ["first.json", "second.json"]:
+            output = Path(self.dir.name) / name
+            results.append(
+                solve_file(
+                    request_path,
+                    output,
+                    "bin",
+                    None,
+                    20,
+                    1.0,
+                    "exact",
+                    0,
+                    self.path,
+                )
+            )
+            with open(output) as f:
+                outputs.append(json.load(f))
+        self.assertIsNone(results[0].error)
+        self.assertFalse(results[0].cached)
+        self.assertTrue(results[1].cached)
+        self.assertEqual(outputs[0], outputs[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,224 @@
+import importlib.util
+import io
+import json
+import logging
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+
+from src.bin_packing_solver import BinPackingSolver
+from src.converter import (
+    bin_packing_to_json,
+    blocks_to_df,
+    containers_to_df,
+    json_to_request,
+    read_bin_packing_request,
+    request_to_excel,
+)
+from src.data_generator import generate_bin_packing_request
+from src.interface import (
+    INF,
+    BinPackingRequest,
+    BinPackingResponse,
+    Block,
+    Container,
+)
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def setUpModule() -> None:
+    logging.disable(logging.INFO)
+
+
+def tearDownModule() -> None:
+    logging.disable(logging.NOTSET)
+
+
+def key(block: Block) -> tuple[Any, ...]:
+    return block.name, block.shape, block.weight, block.stackable
+
+
+def previous_bin_packing_to_json(
+    request: BinPackingRequest, response: BinPackingResponse
+) -> str:
+    """The writer before streaming, which dumped the document at once."""
+
+    def container_dict(container: Container) -> dict[str, Any]:
+        return {
+            "name": container.name,
+            "depth": container.shape[0],
+            "width": container.shape[1],
+            "height": container.shape[2],
+            "weight_capacity": container.weight_capacity,
+        }
+
+    def block_dict(block: Block) -> dict[str, Any]:
+        return {
+            "name": block.name,
+            "depth": block.shape[0],
+            "width": block.shape[1],
+            "height": block.shape[2],
+            "weight": block.weight,
+            "stackable": block.stackable,
+        }
+
+    packed: list[list[dict[str, Any]]] = [[] for _ in request.containers]
+    unpacked = []
+    for block, corner, container_idx in zip(
+        response.blocks, response.corners, response.container_indexes
+    ):
+        if corner[0] >= INF:
+            unpacked.append(block_dict(block))
+        else:
+            back, left, bottom = corner
+            packed[container_idx].append(
+                {
+                    **block_dict(block),
+                    "back": back,
+                    "left": left,
+                    "bottom": bottom,
+                }
+            )
+    return json.dumps(
+        {
+            "packings": [
+                {"container": container_dict(container), "packed_blocks": b}
+                for container, b in zip(request.containers, packed)
+            ],
+            "unpacked_blocks": unpacked,
+        }
+    )
+
+
+class TestReaders(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.request = generate_bin_packing_request(20, 60, 12, 4, 3, 0)
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def assertSameRequest(self, request: BinPackingRequest) -> None:
+        self.assertEqual(
+            [key(block) for block in request.blocks],
+            [key(block) for block in self.request.blocks],
+        )
+        self.assertEqual(request.containers, self.request.containers)
+
+    def test_csv(self) -> None:
+        blocks = Path(self.dir.name) / "blocks.csv"
+        containers = Path(self.dir.name) / "containers.csv"
+        blocks_to_df(self.request.blocks).to_csv(blocks, index=False)
+        containers_to_df(self.request.containers).to_csv(
+            containers, index=False
+        )
+        self.assertSameRequest(read_bin_packing_request(blocks, containers))
+        self.assertSameRequest(
+            read_bin_packing_request(blocks, containers, chunksize=5)
+        )
+        # files without a name need the format
+        self.assertSameRequest(
+            read_bin_packing_request(
+                io.BytesIO(blocks.read_bytes()),
+                io.BytesIO(containers.read_bytes()),
+                format="csv",
+                containers_format="csv",
+            )
+        )
+
+    def test_excel(self) -> None:
+        path = Path(self.dir.name) / "request.xlsx"
+        request_to_excel(self.request, path)
+        request = read_bin_packing_request(path)
+        # Excel keeps 15 significant digits
+        self.assertEqual(
+            [block.name for block in request.blocks],
+            [block.name for block in self.request.blocks],
+        )
+        for block, expected in zip(request.blocks, self.request.blocks):
+            for value, expected_value in zip(block.shape, expected.shape):
+                self.assertAlmostEqual(value, expected_value)
+        unnamed = read_bin_packing_request(io.BytesIO(path.read_bytes()))
+        self.assertEqual(
+            [key(block) for block in unnamed.blocks],
+            [key(block) for block in request.blocks],
+        )
+
+    @unittest.skipIf(HAS_PYARROW, "pyarrow is installed")
+    def test_parquet_without_pyarrow(self) -> None:
+        with self.assertRaisesRegex(ImportError, "pyarrow"):
+            read_bin_packing_request(Path(self.dir.name) / "blocks.parquet")
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet(self) -> None:
+        blocks = Path(self.dir.name) / "blocks.parquet"
+        containers = Path(self.dir.name) / "containers.parquet"
+        blocks_to_df(self.request.blocks).to_parquet(blocks)
+        containers_to_df(self.request.containers).to_parquet(containers)
+        self.assertSameRequest(read_bin_packing_request(blocks, containers))
+        self.assertSameRequest(
+            read_bin_packing_request(blocks, containers, chunksize=5)
+        )
+
+
+class TestBinPackingJson(unittest.TestCase):
+    def setUp(self) -> None:
+        # small containers, so some blocks are unpacked
+        self.request = generate_bin_packing_request(20, 45, 15, 5, 3, 0)
+        solver = BinPackingSolver(self.request, random.Random(0))
+        self.response = solver.solve(50, 1.0)
+        self.assertIn(INF, [corner[0] for corner in self.response.corners])
+
+    def test_same_as_previous_writer(self) -> None:
+        expected = previous_bin_packing_to_json(self.request, self.response)
+        streamed = io.StringIO()
+        returned = bin_packing_to_json(self.request, self.response, streamed)
+        self.assertEqual(streamed.getvalue(), expected)
+        self.assertEqual(returned, expected)
+
+    def test_round_trip(self) -> None:
+        for compact in [False, True]:
+            output = io.StringIO()
+            bin_packing_to_json(
+                self.request,
+                self.response,
+                output,
+                return_string=False,
+                compact=compact,
+            )
+            document = json.loads(output.getvalue())
+            if compact:
+                fields = document["block_fields"]
+                payload = {
+                    "containers": document["containers"],
+                    "blocks": [
+                        dict(zip(fields, row)) for row in document["blocks"]
+                    ],
+                }
+            else:
+                payload = {
+                    "containers": [
+                        packing["container"]
+                        for packing in document["packings"]
+                    ],
+                    "blocks": [
+                        block
+                        for packing in document["packings"]
+                        for block in packing["packed_blocks"]
+                    ]
+                    + document["unpacked_blocks"],
+                }
+            request = json_to_request(payload)
+            assert isinstance(request, BinPackingRequest)
+            self.assertEqual(
+                sorted(key(block) for block in request.blocks),
+                sorted(key(block) for block in self.response.blocks),
+            )
+            self.assertEqual(request.containers, self.request.containers)
+
+
+if __name__ == "__main__":
+    unittest.main()
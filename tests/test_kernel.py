@@ -0,0 +1,83 @@
+import logging
+import random
+import unittest
+from typing import Optional
+from unittest import mock
+
+import numpy as np
+
+from src import kernel, placement
+from src.bin_packing_solver import BinPackingSolver
+from src.data_generator import generate_bin_packing_request
+from src.error import NoStablePointFound
+from src.interface import Corner, Shape
+from src.utils import BoolArray, FloatArray, calc_stable_corner
+
+
+@unittest.skipUnless(kernel.HAS_NUMBA, "Numba is not installed")
+class TestStableCornerKernel(unittest.TestCase):
+    def test_matches_numpy(self) -> None:
+        """Every corner searched while annealing generated instances is
+        the same with the kernel and the NumPy slab sweep."""
+        n_calls = 0
+
+        def checked(
+            new_shape: Shape,
+            new_block_is_stackable: bool,
+            shapes: FloatArray,
+            corners: FloatArray,
+            stackable: BoolArray,
+            ceil_idx: Optional[int] = None,
+        ) -> Corner:
+            nonlocal n_calls
+            n_calls += 1
+            expected: Optional[Corner]
+            try:
+                expected = calc_stable_corner(
+                    new_shape,
+                    new_block_is_stackable,
+                    shapes,
+                    corners,
+                    stackable,
+                    ceil_idx,
+                )
+            except NoStablePointFound:
+                expected = None
+            found, back, left, bottom = kernel.stable_corner_kernel(
+                np.asarray(new_shape, np.float64),
+                new_block_is_stackable,
+                shapes,
+                corners,
+                stackable,
+                -1 if ceil_idx is None else ceil_idx,
+            )
+            self.assertEqual(found, expected is not None)
+            if expected is None:
+                raise NoStablePointFound
+            self.assertEqual((back, left, bottom), expected)
+            return expected
+
+        logging.disable(logging.INFO)
+        try:
+            with mock.patch.object(
+                kernel, "USE_NUMBA", False
+            ), mock.patch.object(placement, "calc_stable_corner", checked):
+                for seed in range(8):
+                    request = generate_bin_packing_request(
+                        random.Random(seed).choice([20, 40]),
+                        100,
+                        30,
+                        8,
+                        4,
+                        seed,
+                    )
+                    solver = BinPackingSolver(request, random.Random(seed))
+                    for _ in range(30):
+                        solver.transit(1e3)
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertGreater(n_calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
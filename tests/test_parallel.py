@@ -0,0 +1,64 @@
+import logging
+import unittest
+
+from src.data_generator import (
+    generate_bin_packing_request,
+    generate_strip_packing_request,
+)
+from src.parallel_bin_packing import solve_parallel_containers
+from src.parallel_tempering import solve_parallel_tempering
+
+
+def setUpModule() -> None:
+    logging.disable(logging.INFO)
+
+
+def tearDownModule() -> None:
+    logging.disable(logging.NOTSET)
+
+
+class TestParallelTempering(unittest.TestCase):
+    def test_independent_of_workers(self) -> None:
+        request = generate_strip_packing_request(20, 15, 3, (100, 60, 100), 0)
+        responses = [
+            solve_parallel_tempering(
+                request,
+                [1.0, 2.0, 4.0, 8.0],
+                n_rounds=4,
+                n_steps=20,
+                allow_rotate=True,
+                seed=0,
+                max_workers=max_workers,
+            )
+            for max_workers in [1, 4]
+        ]
+        self.assertEqual(responses[0].corners, responses[1].corners)
+        self.assertEqual(
+            [block.shape for block in responses[0].blocks],
+            [block.shape for block in responses[1].blocks],
+        )
+
+
+class TestParallelContainers(unittest.TestCase):
+    def test_independent_of_workers(self) -> None:
+        request = generate_bin_packing_request(40, 100, 30, 6, 4, 0)
+        responses = [
+            solve_parallel_containers(
+                request,
+                n_rounds=3,
+                n_steps=20,
+                n_shift_steps=10,
+                temparature=1.0,
+                seed=0,
+                max_workers=max_workers,
+            )
+            for max_workers in [1, 4]
+        ]
+        self.assertEqual(
+            responses[0].container_indexes, responses[1].container_indexes
+        )
+        self.assertEqual(responses[0].corners, responses[1].corners)
+
+
+if __name__ == "__main__":
+    unittest.main()
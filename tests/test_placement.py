@@ -0,0 +1,83 @@
+import logging
+import random
+import unittest
+
+import numpy as np
+
+from src.data_generator import generate_strip_packing_request
+from src.error import NoStablePointFound
+from src.interface import INF
+from src.placement import wall_blocks, wall_corners
+from src.solver import StripPackingSolver
+from src.utils import calc_stable_corner
+
+
+def setUpModule() -> None:
+    logging.disable(logging.INFO)
+
+
+def tearDownModule() -> None:
+    logging.disable(logging.NOTSET)
+
+
+def full_score(solver: StripPackingSolver) -> float:
+    """Score of the current order and orientations placed from scratch,
+    block by block. Blocks without a stable point or on top of a wall are
+    unstacked."""
+    order = solver.packing_order
+    walls = wall_blocks(5)
+    shapes = [wall.shape for wall in walls]
+    corners = wall_corners(solver.request.container_shape, 5)
+    stackable = [wall.stackable for wall in walls]
+    max_height, n_unstacked = 0.0, 0
+    for shape, block_stackable in zip(
+        solver.table.current_shapes(order).tolist(),
+        solver.table.stackable[order].tolist(),
+    ):
+        try:
+            corner = calc_stable_corner(
+                shape,
+                block_stackable,
+                np.array(shapes, np.float64),
+                np.array(corners, np.float64),
+                np.array(stackable, np.bool_),
+            )
+        except NoStablePointFound:
+            corner = (INF, INF, INF)
+        top_height = corner[2] + shape[2]
+        if top_height >= INF:
+            n_unstacked += 1
+        else:
+            max_height = max(max_height, top_height)
+        shapes.append(shape)
+        corners.append(corner)
+        stackable.append(block_stackable)
+    return max_height + n_unstacked * INF
+
+
+class TestReplay(unittest.TestCase):
+    def check(self, n_candidates: int) -> None:
+        for seed in range(3):
+            # many unstackable blocks on a narrow floor, so some blocks
+            # have no stable point or rest on the walls
+            request = generate_strip_packing_request(
+                20, 10, 8, (60, 40, 200), seed
+            )
+            solver = StripPackingSolver(request, random.Random(seed))
+            self.assertEqual(solver.score, full_score(solver))
+            for _ in range(50):
+                if n_candidates > 1:
+                    solver.transit_batch(True, 1e9, n_candidates)
+                else:
+                    solver.transit(True, 1e9)
+                self.assertEqual(solver.score, full_score(solver))
+
+    def test_incremental_matches_full(self) -> None:
+        self.check(1)
+
+    def test_batch_matches_full(self) -> None:
+        self.check(4)
+
+
+if __name__ == "__main__":
+    unittest.main()
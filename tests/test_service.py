@@ -0,0 +1,79 @@
+import logging
+import tempfile
+import time
+import unittest
+import uuid
+from pathlib import Path
+
+from src.data_generator import generate_strip_packing_request
+from src.service import FINISHED, Job, JobSpec, SolveService
+
+
+def setUpModule() -> None:
+    logging.disable(logging.WARNING)
+
+
+def tearDownModule() -> None:
+    logging.disable(logging.NOTSET)
+
+
+def spec(deadline: float, max_iter: int) -> JobSpec:
+    request = generate_strip_packing_request(20, 15, 3, (100, 60, 20), 0)
+    return JobSpec(
+        uuid.uuid4().hex,
+        request,
+        time.time() + deadline,
+        deadline,
+        max_iter,
+        1.0,
+        "exact",
+        0,
+    )
+
+
+class TestSolveService(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.service = SolveService(
+            n_workers=1,
+            max_queued=4,
+            cache_path=Path(self.dir.name) / "cache.sqlite",
+        )
+
+    def tearDown(self) -> None:
+        self.service.close()
+        self.dir.cleanup()
+
+    def wait(self, job_id: str, timeout: float = 30) -> Job:
+        end = time.time() + timeout
+        while time.time() < end:
+            job = self.service.get(job_id)
+            assert job is not None
+            if job.status in FINISHED:
+                return job
+            time.sleep(0.1)
+        self.fail(f"job {job_id} did not finish")
+
+    def test_dead_worker_is_replaced(self) -> None:
+        running = self.service.submit(spec(60, 10**9))
+        queued = self.service.submit(spec(60, 10))
+        while running.started is None:
+            time.sleep(0.1)
+        self.service.workers[0].kill()
+        self.assertEqual(self.wait(running.spec.id).status, "failed")
+        self.assertIn("worker died", running.error or "")
+        self.assertEqual(self.wait(queued.spec.id).status, "done")
+        self.assertEqual(self.service.counts()["failed"], 1)
+
+    def test_cached_result(self) -> None:
+        solved = self.service.submit(spec(60, 10))
+        self.assertEqual(self.wait(solved.spec.id).status, "done")
+        cached = self.service.submit(spec(60, 10))
+        # done at submission, without a worker
+        self.assertEqual(cached.status, "done")
+        self.assertIsNone(cached.started)
+        self.assertEqual(cached.result, solved.result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import logging
+import random
+import unittest
+from typing import Any, Callable, Optional
+
+from src.bin_packing_solver import BinPackingSolver
+from src.data_generator import (
+    generate_bin_packing_request,
+    generate_strip_packing_request,
+)
+from src.solver import StripPackingSolver
+
+
+def setUpModule() -> None:
+    logging.disable(logging.INFO)
+
+
+def tearDownModule() -> None:
+    logging.disable(logging.NOTSET)
+
+
+def record_moves(solver: Any, name: str) -> list[Any]:
+    """Record the candidates drawn by the private ``__draw_move``."""
+    moves: list[Any] = []
+    draw_move: Callable[..., Optional[Any]] = getattr(solver, name)
+
+    def recorded(*args: Any) -> Optional[Any]:
+        move = draw_move(*args)
+        if move is not None:
+            moves.append(move)
+        return move
+
+    setattr(solver, name, recorded)
+    return moves
+
+
+def argmin(scores: list[float], tolerance: float = 0.0) -> int:
+    """The first of the lowest scores, up to the rounding of sums."""
+    lowest = min(scores)
+    return next(
+        idx for idx, score in enumerate(scores) if score - lowest <= tolerance
+    )
+
+
+class TestStripPacking(unittest.TestCase):
+    def test_same_as_one_by_one(self) -> None:
+        request = generate_strip_packing_request(20, 12, 6, (60, 40, 200), 0)
+        solver = StripPackingSolver(request, random.Random(0))
+        # scores every candidate from scratch
+        reference = StripPackingSolver(request, memo_size=0)
+        moves = record_moves(solver, "_StripPackingSolver__draw_move")
+        for _ in range(30):
+            order, orientations = solver.configuration
+            score = solver.score
+            moves.clear()
+            transit = solver.transit_batch(True, 0.0, 6)
+            scores = []
+            for kind, i, j in moves:
+                reference.set_configuration(order, orientations)
+                if kind == "swap":
+                    reference.packing_order[i], reference.packing_order[j] = (
+                        reference.packing_order[j],
+                        reference.packing_order[i],
+                    )
+                else:
+                    reference.table.rotate(i, j)
+                reference.set_configuration(*reference.configuration)
+                scores.append(reference.score)
+            best = argmin(scores)
+            self.assertEqual(transit, scores[best] <= score)
+            if not transit:
+                self.assertEqual(solver.configuration, (order, orientations))
+                continue
+            kind, i, j = moves[best]
+            reference.set_configuration(order, orientations)
+            if kind == "swap":
+                reference.packing_order[i], reference.packing_order[j] = (
+                    reference.packing_order[j],
+                    reference.packing_order[i],
+                )
+            else:
+                reference.table.rotate(i, j)
+            self.assertEqual(solver.configuration, reference.configuration)
+            self.assertEqual(solver.score, scores[best])
+
+
+class TestBinPacking(unittest.TestCase):
+    def test_same_as_one_by_one(self) -> None:
+        request = generate_bin_packing_request(20, 50, 15, 5, 3, 0)
+        solver = BinPackingSolver(request, random.Random(0))
+        # scores every candidate from scratch
+        reference = BinPackingSolver(request, memo_size=0)
+        moves = record_moves(solver, "_BinPackingSolver__draw_move")
+        max_total_score = 0.0
+        for _ in range(30):
+            assignment = [idxs.copy() for idxs in solver.assigned_block_idxs]
+            orientations = solver.table.orientations.copy()
+            total_score = solver.total_score
+            moves.clear()
+            transit = solver.transit_batch(0.0, 6)
+
+            def place(move: Optional[Any]) -> float:
+                reference.table.orientations[:] = orientations
+                block_idxs = [idxs.copy() for idxs in assignment]
+                if move is not None:
+                    kind, container_idx, i, j, k = move
+                    idxs = block_idxs[container_idx]
+                    if kind == "swap":
+                        idxs[i], idxs[j] = idxs[j], idxs[i]
+                    elif kind == "rotate":
+                        reference.table.rotate(i, j)
+                    else:
+                        block_idxs[j].insert(k, idxs.pop(i))
+                for container_idx, idxs in enumerate(block_idxs):
+                    reference.assign(container_idx, idxs)
+                return reference.total_score
+
+            # totals of about 1e10 are summed in another order than the
+            # scores of the touched containers are, and the rounding of
+            # such totals stays in the running total of the solver
+            max_total_score = max(max_total_score, total_score)
+            tolerance = 1e-12 * max_total_score
+            scores = [place(move) for move in moves]
+            best = argmin(scores, tolerance)
+            self.assertEqual(transit, scores[best] - total_score <= tolerance)
+            place(moves[best] if transit else None)
+            self.assertEqual(
+                solver.assigned_block_idxs, reference.assigned_block_idxs
+            )
+            self.assertEqual(
+                solver.table.orientations.tolist(),
+                reference.table.orientations.tolist(),
+            )
+            self.assertAlmostEqual(
+                solver.total_score, reference.total_score, delta=tolerance
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()